@@ -1,15 +1,64 @@
 #!/usr/bin/env python3
 
 import os 
-from flask import jsonify, make_response, request, session, g, current_app, redirect, abort
+from flask import jsonify, make_response, request, session, g, current_app, redirect, abort, Response, stream_with_context
 from flask_restful import Resource
 import json
+from sqlalchemy import inspect
 from sqlalchemy.exc import IntegrityError
 from config import app,db,api
 from models import User, Project, Task, File, Calendar, Team, Chat_Message
+from validation import integrity_error_message
+from listing import collection_page, stream_records, record_by_id
+from bulk import BulkResource
+from conversations import conversations, thread_page, mark_read
+from chat_events import TooManyStreams, event_response, publish_created
+from sync import changes_since, current_cursor
+from search import IndexMissing, search
+from stats import stats
+from schedule import tasks_due, calendar_week
+import dates    # registers `flask migrate-dates`
+from conditional import conditional
+from cache import cached, response_cache
+from current_user import current_user
+from passwords import Overloaded, hash_password
 from flask_cors import CORS
 CORS(app)
 
+def error_messages(e):
+    # Unique index violations that slipped past the @validates probe (two
+    # writers racing) come back with the same message the validator would give.
+    if isinstance(e, IntegrityError):
+        db.session.rollback()
+        return [integrity_error_message(e)]
+    return [e.__str__()]
+
+def wants_stream():
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def collection_response(model):
+    # Shared by every collection GET: one keyset page, with the cursor for the
+    # next page in X-Next-After-Id. See listing.py for the query parameters.
+    if wants_stream():
+        try:
+            records = stream_records(model, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        return Response(stream_with_context(records), mimetype='application/x-ndjson')
+    try:
+        dict_list, next_after_id = collection_page(model, request.args)
+    except ValueError as e:
+        return make_response(jsonify({"errors": error_messages(e)}), 422)
+    if dict_list != [] or request.args:
+        response = make_response(jsonify(dict_list), 200)
+        if next_after_id is not None:
+            response.headers['X-Next-After-Id'] = str(next_after_id)
+        return response
+    return_obj = {"valid": False, "Reason": f"Can't query {model.__name__} data"}
+    return make_response(jsonify(return_obj),500)
+
     ###########################################
     ##                Home API               ##
     ###########################################
@@ -46,8 +95,14 @@ class Signup(Resource):
         password = request.get_json()['password']
         email = request.get_json()['email']
         if username and password:
-            new_user = User(username=username, email=email, is_active=True, is_admin=False)
-            new_user.password_hash = password
+            # Hash before the username check opens a transaction, so no pooled
+            # connection is held through bcrypt.
+            try:
+                password_hash = hash_password(password)
+            except Overloaded as e:
+                return e.data, 503, {'Retry-After': str(e.retry_after)}
+            new_user = User(username=username, email=email, is_active=True, is_admin=False,
+                            _password_hash=password_hash)
             try:
                 db.session.add(new_user)
                 db.session.commit()
@@ -60,11 +115,10 @@ api.add_resource(Signup, '/signup', endpoint='signup')
 
 class CheckSession(Resource):
     def get(self):
-        print(session)
-        if session.get('user_id'):
-            print(session['user_id'])
-            user = User.query.filter(User.id == session.get('user_id')).first()
-            return user.to_dict(), 200 
+        app.logger.debug('check_session for user %s', session.get('user_id'))
+        user_dict = current_user()
+        if user_dict:
+            return user_dict, 200 
         return {'message': '401 Unauthorized'}, 401 
 api.add_resource(CheckSession, '/check_session', endpoint='check_session')
 
@@ -74,8 +128,16 @@ class Login(Resource):
         password = request.get_json()['password']
         user = User.query.filter(User.username == username).first()
         if user:
-            if user.authenticate(password):
+            db.session.close()      # hand the connection back to the pool during bcrypt
+            try:
+                authenticated = user.authenticate(password)
+            except Overloaded as e:
+                return e.data, 503, {'Retry-After': str(e.retry_after)}
+            if authenticated:
                 session['user_id'] = user.id
+                if inspect(user).modified:      # re-hashed with the current work factor
+                    db.session.add(user)
+                    db.session.commit()
                 return user.to_dict(), 200 
         return {'error': '401 Unauthorized'}, 401
 api.add_resource(Login, '/login', endpoint='login')
@@ -97,19 +159,9 @@ api.add_resource(Logout, '/logout', endpoint='logout')
 ##########
 
 class Users(Resource):          
+    @conditional(User)
     def get(self):
-        try:
-            user_dict_list = []
-            for user in User.query.all(): 
-                user_dict_list.append(user.to_dict())
-            if user_dict_list != []:
-                response = make_response(jsonify(user_dict_list), 200)
-                return response
-            else:
-                return_obj = {"valid": False, "Reason": "Can't query User data"}                 
-                return make_response(jsonify(return_obj),500)  
-        except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+        return collection_response(User)
 
     def post(self):
         data=request.get_json()
@@ -120,11 +172,13 @@ class Users(Resource):
                 is_active=True,
                 is_admin=False
                 )
-            new_user.password_hash = data['password'],
+            new_user.password_hash = data['password']
             db.session.add(new_user)
             db.session.commit()
+        except Overloaded as e:
+            return make_response(jsonify(e.data), 503, {'Retry-After': str(e.retry_after)})
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
         user_dict = new_user.to_dict()
         response = make_response(jsonify(user_dict), 201) 
         return response 
@@ -132,16 +186,16 @@ class Users(Resource):
 api.add_resource(Users, '/users', endpoint='user')
 
 class UserById(Resource):
+    @conditional(User)
     def get(self, id):
         try:
-            user = User.query.filter(User.id == id).first()
-            if user:
-                user_dict = user.to_dict()
+            user_dict = record_by_id(User, id, request.args)
+            if user_dict:
                 response = make_response(jsonify(user_dict, 200))
                 return response
             return make_response(jsonify({"error": "User Record not found"}), 404)
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
 
     def patch(self, id):
         try:
@@ -153,14 +207,16 @@ class UserById(Resource):
                         setattr(user, attr, data[attr]) 
                     db.session.add(user) 
                     db.session.commit() 
+                except Overloaded as e:
+                    return make_response(jsonify(e.data), 503, {'Retry-After': str(e.retry_after)})
                 except Exception as e:
-                    return make_response({"errors": [e.__str__()]}, 422)
+                    return make_response({"errors": error_messages(e)}, 422)
                 user_dict = user.to_dict()
                 response = make_response(jsonify(user_dict), 201)
                 return response 
             return make_response(jsonify({"error": "User Record not found"}), 404)
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
 
     def delete(self, id):
         try:
@@ -172,25 +228,24 @@ class UserById(Resource):
                 return make_response(user_dict, 200)
             return make_response(jsonify({"error": "User Record not found"}), 404)
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
 
 api.add_resource(UserById, '/users/<int:id>', endpoint='userbyid')
 
+class UsersBulk(BulkResource):
+    model = User
+
+api.add_resource(UsersBulk, '/users/bulk', endpoint='userbulk')
+
 #############
 ## PROJECT ##
 #############
 
 class Projects(Resource):
+    @cached(Project)
+    @conditional(Project)
     def get(self):
-        project_dict_list = []
-        for project in Project.query.all():
-            project_dict_list.append(project.to_dict())
-        if project_dict_list != []:
-            response = make_response(jsonify(project_dict_list), 200)
-            return response
-        else:
-            return_obj = {"valid": False, "Reason": "Can't query Project data"}                 
-            return make_response(jsonify(return_obj),500)  
+        return collection_response(Project)
 
     def post(self):
         data=request.get_json() 
@@ -206,7 +261,7 @@ class Projects(Resource):
             db.session.add(new_project)
             db.session.commit()
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
         project_dict = new_project.to_dict()
         response = make_response(jsonify(project_dict), 201) 
         return response 
@@ -214,10 +269,14 @@ class Projects(Resource):
 api.add_resource(Projects, '/projects', endpoint='project')
 
 class ProjectById(Resource):
+    @cached(Project)
+    @conditional(Project)
     def get(self, id): 
-        project = Project.query.filter(Project.id == id).first()
-        if project:
-            project_dict = project.to_dict()
+        try:
+            project_dict = record_by_id(Project, id, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        if project_dict:
             response = make_response(jsonify(project_dict, 200))
             return response
         return make_response(jsonify({"error": "Project Record not found"}), 404)
@@ -232,7 +291,7 @@ class ProjectById(Resource):
                 db.session.add(project) 
                 db.session.commit() 
             except Exception as e:
-                return make_response({"errors": [e.__str__()]}, 422)
+                return make_response({"errors": error_messages(e)}, 422)
             project_dict = project.to_dict()
             response = make_response(jsonify(project_dict), 201)
             return response 
@@ -249,21 +308,19 @@ class ProjectById(Resource):
 
 api.add_resource(ProjectById, '/projects/<int:id>', endpoint='projectbyid')
 
+class ProjectsBulk(BulkResource):
+    model = Project
+
+api.add_resource(ProjectsBulk, '/projects/bulk', endpoint='projectbulk')
+
 ##########
 ## FILE ##
 ##########
 
 class Files(Resource):
+    @conditional(File)
     def get(self):
-        file_dict = []
-        for file in File.query.all():
-            file_dict.append(file.to_dict())
-        if file_dict != []:
-            response = make_response(jsonify(file_dict), 200)
-            return response
-        else:
-            return_obj = {"valid": False, "Reason": "Can't query File data"}                 
-            return make_response(jsonify(return_obj),500)  
+        return collection_response(File)
 
     def post(self):
         data=request.get_json()
@@ -279,7 +336,7 @@ class Files(Resource):
             db.session.add(new_file)
             db.session.commit()
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
         file_dict = new_file.to_dict()
         response = make_response(jsonify(file_dict), 201) 
         return response 
@@ -287,10 +344,13 @@ class Files(Resource):
 api.add_resource(Files, '/files', endpoint='file')
 
 class FileById(Resource):
+    @conditional(File)
     def get(self, id):
-        file = File.query.filter(File.id == id).first()
-        if file:
-            file_dict = file.to_dict()
+        try:
+            file_dict = record_by_id(File, id, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        if file_dict:
             response = make_response(jsonify(file_dict, 200))
             return response
         return make_response(jsonify({"error": "File Record not found"}), 404)
@@ -305,7 +365,7 @@ class FileById(Resource):
                 db.session.add(file)
                 db.session.commit() 
             except Exception as e:
-                return make_response({"errors": [e.__str__()]}, 422)
+                return make_response({"errors": error_messages(e)}, 422)
             file_dict = file.to_dict()
             response = make_response(jsonify(file_dict), 201)
             return response 
@@ -322,21 +382,19 @@ class FileById(Resource):
 
 api.add_resource(FileById, '/files/<int:id>', endpoint='filebyid')
 
+class FilesBulk(BulkResource):
+    model = File
+
+api.add_resource(FilesBulk, '/files/bulk', endpoint='filebulk')
+
 ##########
 ## TASK ##
 ##########
 
 class Tasks(Resource):
+    @conditional(Task)
     def get(self):
-        task_dict_list = []
-        for task in Task.query.all():
-            task_dict_list.append(task.to_dict())
-        if task_dict_list != []:
-            response = make_response(jsonify(task_dict_list), 200)
-            return response
-        else:
-            return_obj = {"valid": False, "Reason": "Can't query Task data"}                 
-            return make_response(jsonify(return_obj),500)  
+        return collection_response(Task)
 
     def post(self):
         data=request.get_json()
@@ -353,7 +411,7 @@ class Tasks(Resource):
             db.session.add(new_task)
             db.session.commit()
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
         task_dict = new_task.to_dict()
         response = make_response(jsonify(task_dict), 201) 
         return response 
@@ -361,10 +419,13 @@ class Tasks(Resource):
 api.add_resource(Tasks, '/tasks', endpoint='task')
 
 class TaskById(Resource):
+    @conditional(Task)
     def get(self, id):
-        task = Task.query.filter(Task.id == id).first()
-        if task:
-            task_dict = task.to_dict()
+        try:
+            task_dict = record_by_id(Task, id, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        if task_dict:
             response = make_response(jsonify(task_dict, 200))
             return response
         return make_response(jsonify({"error": "Task Record not found"}), 404)
@@ -379,7 +440,7 @@ class TaskById(Resource):
                 db.session.add(task)
                 db.session.commit()
             except Exception as e:
-                return make_response({"errors": [e.__str__()]}, 422)
+                return make_response({"errors": error_messages(e)}, 422)
             task_dict = task.to_dict()
             response = make_response(jsonify(task_dict), 201)
             return response 
@@ -396,21 +457,38 @@ class TaskById(Resource):
 
 api.add_resource(TaskById, '/tasks/<int:id>', endpoint='taskbyid')
 
+class TasksBulk(BulkResource):
+    model = Task
+
+api.add_resource(TasksBulk, '/tasks/bulk', endpoint='taskbulk')
+
+# GET /tasks/due?from=<date>&to=<date> lists the tasks due in that range in
+# due date order, with the /tasks filters; the cursor for the next page comes
+# back in X-Next-After-Id. See schedule.py.
+
+class TasksDue(Resource):
+    @conditional(Task)
+    def get(self):
+        try:
+            dict_list, next_after_id = tasks_due(request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        response = make_response(jsonify(dict_list), 200)
+        if next_after_id is not None:
+            response.headers['X-Next-After-Id'] = str(next_after_id)
+        return response
+
+api.add_resource(TasksDue, '/tasks/due', endpoint='taskdue')
+
 ##############
 ## CALENDAR ##
 ##############
 
 class Calendars(Resource):
+    @cached(Calendar)
+    @conditional(Calendar)
     def get(self):
-        calendar_dict_list = []
-        for calendar in Calendar.query.all():
-            calendar_dict_list.append(calendar.to_dict())
-        if calendar_dict_list != []:
-            response = make_response(jsonify(calendar_dict_list), 200)
-            return response
-        else:
-            return_obj = {"valid": False, "Reason": "Can't query Calendar data"}                 
-            return make_response(jsonify(return_obj),500)  
+        return collection_response(Calendar)
 
     def post(self):
         data=request.get_json()
@@ -424,7 +502,7 @@ class Calendars(Resource):
             db.session.add(new_calendar)
             db.session.commit()
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
         calendar_dict = new_calendar.to_dict()
         response = make_response(jsonify(calendar_dict), 201) 
         return response 
@@ -432,10 +510,14 @@ class Calendars(Resource):
 api.add_resource(Calendars, '/calendars', endpoint='calendar')
 
 class CalendarById(Resource):
+    @cached(Calendar)
+    @conditional(Calendar)
     def get(self, id):
-        calendar = Calendar.query.filter(Calendar.id == id).first()
-        if calendar:
-            calendar_dict = calendar.to_dict()
+        try:
+            calendar_dict = record_by_id(Calendar, id, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        if calendar_dict:
             response = make_response(jsonify(calendar_dict, 200))
             return response
         return make_response(jsonify({"error": "Calendar Record not found"}), 404)
@@ -450,7 +532,7 @@ class CalendarById(Resource):
                 db.session.add(calendar)
                 db.session.commit()
             except Exception as e:
-                return make_response({"errors": [e.__str__()]}, 422)
+                return make_response({"errors": error_messages(e)}, 422)
             calendar_dict = calendar.to_dict()
             response = make_response(jsonify(calendar_dict), 201)
             return response 
@@ -467,21 +549,38 @@ class CalendarById(Resource):
 
 api.add_resource(CalendarById, '/calendars/<int:id>', endpoint='calendarbyid')
 
+class CalendarsBulk(BulkResource):
+    model = Calendar
+
+api.add_resource(CalendarsBulk, '/calendars/bulk', endpoint='calendarbulk')
+
+# GET /calendars/week?start=<date>&created_by_user_id=<id> lists the events of
+# the seven days from start, a page at a time like /tasks/due. See schedule.py.
+
+class CalendarWeek(Resource):
+    @cached(Calendar)
+    @conditional(Calendar)
+    def get(self):
+        try:
+            dict_list, next_after_id = calendar_week(request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        response = make_response(jsonify(dict_list), 200)
+        if next_after_id is not None:
+            response.headers['X-Next-After-Id'] = str(next_after_id)
+        return response
+
+api.add_resource(CalendarWeek, '/calendars/week', endpoint='calendarweek')
+
 ##########
 ## TEAM ##
 ##########
 
 class Teams(Resource):
+    @cached(Team)
+    @conditional(Team)
     def get(self):
-        team_dict_list = []
-        for team in Team.query.all():
-            team_dict_list.append(team.to_dict())
-        if team_dict_list != []:
-            response = make_response(jsonify(team_dict_list), 200)
-            return response
-        else:
-            return_obj = {"valid": False, "Reason": "Can't query Team data"}                 
-            return make_response(jsonify(return_obj),500)  
+        return collection_response(Team)
 
     def post(self): 
         data=request.get_json() 
@@ -495,7 +594,7 @@ class Teams(Resource):
             db.session.add(new_team)
             db.session.commit()
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
         team_dict = new_team.to_dict()
         response = make_response(jsonify(team_dict), 201) 
         return response 
@@ -503,10 +602,14 @@ class Teams(Resource):
 api.add_resource(Teams, '/teams', endpoint='team')
 
 class TeamById(Resource):
+    @cached(Team)
+    @conditional(Team)
     def get(self, id): 
-        team = Team.query.filter(Team.id == id).first()
-        if team:
-            team_dict = team.to_dict()
+        try:
+            team_dict = record_by_id(Team, id, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        if team_dict:
             response = make_response(jsonify(team_dict, 200))
             return response
         return make_response(jsonify({"error": "Team Record not found"}), 404)
@@ -521,7 +624,7 @@ class TeamById(Resource):
                 db.session.add(team) 
                 db.session.commit() 
             except Exception as e:
-                return make_response({"errors": [e.__str__()]}, 422)
+                return make_response({"errors": error_messages(e)}, 422)
             team_dict = team.to_dict()
             response = make_response(jsonify(team_dict), 201)
             return response 
@@ -538,21 +641,19 @@ class TeamById(Resource):
 
 api.add_resource(TeamById, '/teams/<int:id>', endpoint='teambyid')
 
+class TeamsBulk(BulkResource):
+    model = Team
+
+api.add_resource(TeamsBulk, '/teams/bulk', endpoint='teambulk')
+
 ##################
 ## Chat_Message ##
 ##################
 
 class Chat_Messages(Resource):
-    def get(self):     
-        chat_message_dict = []
-        for chat_message in Chat_Message.query.all():
-            chat_message_dict.append(chat_message.to_dict())
-        if chat_message_dict != []:
-            response = make_response(jsonify(chat_message_dict), 200)
-            return response
-        else:
-            return_obj = {"valid": False, "Reason": "Can't query Chat_Message data"}                 
-            return make_response(jsonify(return_obj),500)  
+    @conditional(Chat_Message)
+    def get(self):
+        return collection_response(Chat_Message)
 
     def post(self):  
         data=request.get_json()
@@ -565,7 +666,7 @@ class Chat_Messages(Resource):
             db.session.add(new_chat_message)
             db.session.commit()
         except Exception as e:
-            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
         chat_message_dict = new_chat_message.to_dict()
         response = make_response(jsonify(chat_message_dict), 201) 
         return response 
@@ -573,10 +674,13 @@ class Chat_Messages(Resource):
 api.add_resource(Chat_Messages, '/chat_messages', endpoint='chat_message')
 
 class Chat_MessageById(Resource):
+    @conditional(Chat_Message)
     def get(self, id):
-        chat_message = Chat_Message.query.filter(Chat_Message.id == id).first()
-        if chat_message:
-            chat_message_dict = chat_message.to_dict()
+        try:
+            chat_message_dict = record_by_id(Chat_Message, id, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        if chat_message_dict:
             response = make_response(jsonify(chat_message_dict, 200))
             return response
         return make_response(jsonify({"error": "Chat_Message Record not found"}), 404)
@@ -591,7 +695,7 @@ class Chat_MessageById(Resource):
                 db.session.add(chat_message)
                 db.session.commit() 
             except Exception as e:
-                return make_response({"errors": [e.__str__()]}, 422)
+                return make_response({"errors": error_messages(e)}, 422)
             chat_message_dict = chat_message.to_dict()
             response = make_response(jsonify(chat_message_dict), 201)
             return response 
@@ -608,5 +712,145 @@ class Chat_MessageById(Resource):
 
 api.add_resource(Chat_MessageById, '/chat_messages/<int:id>', endpoint='chat_messagebyid')
 
+class Chat_MessagesBulk(BulkResource):
+    model = Chat_Message
+
+    def post(self):
+        response = super().post()
+        publish_created(response.get_json())
+        return response
+
+api.add_resource(Chat_MessagesBulk, '/chat_messages/bulk', endpoint='chat_messagebulk')
+
+# Per-user chat, see conversations.py. Threads are paged newest first with
+# ?before_id=, and the cursor for the next page comes back in X-Next-Before-Id.
+
+class Conversations(Resource):
+    def get(self, id):
+        if record_by_id(User, id) is None:
+            return make_response(jsonify({"error": "User Record not found"}), 404)
+        return make_response(jsonify(conversations(id)), 200)
+
+api.add_resource(Conversations, '/users/<int:id>/conversations', endpoint='conversation')
+
+class ConversationThread(Resource):
+    def get(self, id, other_id):
+        try:
+            messages, next_before_id = thread_page(id, other_id, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        response = make_response(jsonify(messages), 200)
+        if next_before_id is not None:
+            response.headers['X-Next-Before-Id'] = str(next_before_id)
+        return response
+
+api.add_resource(ConversationThread, '/users/<int:id>/conversations/<int:other_id>', endpoint='conversationthread')
+
+class ConversationRead(Resource):
+    def post(self, id, other_id):
+        return make_response(jsonify({"marked_read": mark_read(id, other_id)}), 200)
+
+api.add_resource(ConversationRead, '/users/<int:id>/conversations/<int:other_id>/read', endpoint='conversationread')
+
+# Server-Sent Events push of new messages for one user, see chat_events.py.
+# Each open stream holds a request thread, up to SSE_MAX_STREAMS per process,
+# except under asgi.py, which serves idle streams on its event loop.
+
+class ChatEvents(Resource):
+    def get(self, id):
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        if record_by_id(User, id) is None:
+            return make_response(jsonify({"error": "User Record not found"}), 404)
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        try:
+            return event_response(id, last_event_id)
+        except TooManyStreams as e:
+            return make_response(jsonify(e.data), 503, {'Retry-After': str(e.retry_after)})
+
+api.add_resource(ChatEvents, '/users/<int:id>/events', endpoint='chatevents')
+
+    ###########################################
+    ##                 Sync                  ##
+    ###########################################
+
+# GET /sync returns the current cursor; GET /sync?since=<cursor>&limit=<n>
+# returns up to n changes after it, per table, as upserted records and
+# deleted ids. Keep calling with the returned cursor while has_more is true.
+# See sync.py.
+
+class Sync(Resource):
+    def get(self):
+        if not request.args.get('since'):
+            return make_response(jsonify({"cursor": current_cursor()}), 200)
+        try:
+            since = int(request.args['since'])
+            limit = int(request.args.get('limit', app.config['PAGE_SIZE']))
+            if since < 0 or limit < 1:
+                raise ValueError('since and limit must be positive')
+            changes, cursor, has_more = changes_since(since, min(limit, app.config['MAX_PAGE_SIZE']))
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        except LookupError as e:
+            return make_response(jsonify({"errors": [e.__str__()]}), 410)
+        return make_response(jsonify({"cursor": cursor, "has_more": has_more, "changes": changes}), 200)
+
+api.add_resource(Sync, '/sync', endpoint='sync')
+
+    ###########################################
+    ##                Search                 ##
+    ###########################################
+
+# GET /search?q=<words>&types=tasks,projects,files,chat_messages&limit=<n>
+# returns the best matching records first, each as {type, id, score, record};
+# the offset of the next page comes back in X-Next-Offset. See search.py.
+
+class Search(Resource):
+    def get(self):
+        try:
+            hits, next_offset = search(request.args)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+        except IndexMissing as e:
+            return make_response(jsonify(e.data), 503)
+        response = make_response(jsonify(hits), 200)
+        if next_offset is not None:
+            response.headers['X-Next-Offset'] = str(next_offset)
+        return response
+
+api.add_resource(Search, '/search', endpoint='search')
+
+    ###########################################
+    ##                 Stats                 ##
+    ###########################################
+
+# GET /stats returns the dashboard counts: tasks per status and per user,
+# overdue tasks per project (?as_of=, default today) and file totals per
+# project and type. ?sections= picks some of them. See stats.py.
+
+class Stats(Resource):
+    def get(self):
+        try:
+            return make_response(jsonify(stats(request.args)), 200)
+        except ValueError as e:
+            return make_response(jsonify({"errors": error_messages(e)}), 422)
+
+api.add_resource(Stats, '/stats', endpoint='stats')
+
+    ###########################################
+    ##             Response cache            ##
+    ###########################################
+
+# Hit/miss/eviction counts of the response cache in front of the project,
+# team and calendar GETs. See cache.py.
+
+class CacheStats(Resource):
+    def get(self):
+        return make_response(jsonify(response_cache.stats()), 200)
+
+api.add_resource(CacheStats, '/cache/stats', endpoint='cachestats')
+
 if __name__ == '__main__':
     app.run(port=5555, debug=True)
\ No newline at end of file
@@ -0,0 +1,79 @@
+# ASGI entry point, for running the API under an event-loop server:
+#   gunicorn -c server/gunicorn.conf.py                 (with SERVER_MODE=asgi)
+#   uvicorn --app-dir server asgi:asgi_app --port 5555
+# Needs `pip install a2wsgi uvicorn uvicorn-worker`.
+#
+# The event loop owns the sockets, so idle keep-alive connections, slow
+# clients and request bodies in flight cost next to nothing. The Flask app
+# itself is still synchronous: every request runs on one of ASGI_THREADS
+# threads per process, the same way it would on a gthread worker. asgiref's
+# WsgiToAsgi is not used because it runs every request on a single shared
+# thread.
+#
+# Chat event streams are the exception. GET /users/<id>/events still goes
+# through Flask (lookups, CORS, the backlog), but chat_events.py hands the
+# open subscription back under LOOP_HANDOFF, and the live events are sent
+# from the event loop here. An idle stream is then a socket and a queue, not
+# a thread, so one process holds thousands of them.
+import asyncio
+import re
+from a2wsgi import WSGIMiddleware
+from app import app
+from chat_events import LOOP_HANDOFF, live_chunk
+from broker import broker
+
+EVENTS_PATH = re.compile(r'/users/\d+/events')
+
+wsgi_app = WSGIMiddleware(app, workers=app.config['ASGI_THREADS'])
+
+async def disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def live_events(handoff, receive, send):
+    subscription, replayed_up_to = handoff['subscription'], handoff['replayed_up_to']
+    loop = asyncio.get_running_loop()
+    arrived = asyncio.Event()
+    subscription.wakeup = lambda: loop.call_soon_threadsafe(arrived.set)
+    gone = asyncio.ensure_future(disconnect(receive))
+    try:
+        while not subscription.closed and not gone.done():
+            waiting = asyncio.ensure_future(arrived.wait())
+            await asyncio.wait([waiting, gone], timeout=app.config['SSE_HEARTBEAT_SECONDS'],
+                               return_when=asyncio.FIRST_COMPLETED)
+            waiting.cancel()
+            if gone.done():
+                break
+            if arrived.is_set():
+                arrived.clear()     # before draining, so a later message sets it again
+                messages = subscription.pending()
+            else:
+                messages = [None]
+            chunks = [chunk for chunk in (live_chunk(message, replayed_up_to) for message in messages) if chunk]
+            if chunks:
+                await send({'type': 'http.response.body', 'body': ''.join(chunks).encode(), 'more_body': True})
+    finally:
+        gone.cancel()
+        broker.unsubscribe(subscription)
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def asgi_app(scope, receive, send):
+    if scope['type'] != 'http' or not EVENTS_PATH.fullmatch(scope['path']):
+        return await wsgi_app(scope, receive, send)
+    handoff = {}
+    scope = dict(scope, **{LOOP_HANDOFF: handoff})
+
+    async def send_opening(message):
+        # Keep the response open when Flask handed the stream over.
+        if message['type'] == 'http.response.body' and 'subscription' in handoff:
+            message = dict(message, more_body=True)
+        await send(message)
+
+    try:
+        await wsgi_app(scope, receive, send_opening)
+    except BaseException:
+        if 'subscription' in handoff:
+            broker.unsubscribe(handoff['subscription'])
+        raise
+    if 'subscription' in handoff:
+        await live_events(handoff, receive, send)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Runs the endpoint harness (run.py) against every database backend we can
+# reach and lines up the status codes per endpoint, so a model or query that
+# only works on SQLite shows up as a mismatch instead of in production.
+#   python benchmarks/backends.py --sizes 1000 --requests 20
+# Backends:
+#   sqlite    always, a temporary file
+#   postgres  POSTGRES_URI if set (its data is replaced), otherwise a
+#             throwaway cluster when initdb/pg_ctl are on the PATH
+# Postgres also needs a driver for the URI's dialect. A backend that can't
+# run is reported as skipped, with the reason.
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from sqlalchemy.engine import make_url
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def throwaway_postgres():
+    # initdb into a temp directory and start it on a free port. Returns
+    # (uri, stop) or raises RuntimeError with the reason it can't.
+    if not (shutil.which('initdb') and shutil.which('pg_ctl')):
+        raise RuntimeError('POSTGRES_URI not set and initdb/pg_ctl not on PATH')
+    data = tempfile.mkdtemp(prefix='syntax_pg_')
+    port = free_port()
+    subprocess.run(['initdb', '-D', data, '-U', 'bench', '--auth=trust'], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(['pg_ctl', '-D', data, '-o', f'-p {port} -k {data}', '-l', os.path.join(data, 'log'), '-w', 'start'],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    def stop():
+        subprocess.run(['pg_ctl', '-D', data, '-m', 'fast', 'stop'], stdout=subprocess.DEVNULL)
+        shutil.rmtree(data, ignore_errors=True)
+    return f'postgresql://bench@127.0.0.1:{port}/postgres', stop
+
+def postgres():
+    uri = os.environ.get('POSTGRES_URI', 'postgresql://')
+    try:
+        make_url(uri).get_dialect().import_dbapi()
+    except ImportError as e:
+        raise RuntimeError(f'no driver for {make_url(uri).drivername}: {e}')
+    if os.environ.get('POSTGRES_URI'):
+        return uri, lambda: None
+    return throwaway_postgres()
+
+def harness(args, database_uri=None):
+    command = [sys.executable, os.path.join(HERE, 'run.py'), '--sizes', args.sizes, '--requests', str(args.requests)]
+    if database_uri:
+        command += ['--database-uri', database_uri]
+    child = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(child.stdout)
+
+def status_codes(report):
+    return {
+        f"{run['size']} {result['method']} {result['endpoint']}": result['status_codes']
+        for run in report['runs'] for result in run['results']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the endpoint harness on every available backend.')
+    parser.add_argument('--sizes', default='1000')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    backends = {'sqlite': lambda: (None, lambda: None), 'postgres': postgres}
+    reports, skipped = {}, {}
+    for name, start in backends.items():
+        try:
+            uri, stop = start()
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            skipped[name] = str(e)
+            print(f'Skipping {name}: {e}', file=sys.stderr)
+            continue
+        print(f'Running {name}...', file=sys.stderr)
+        try:
+            reports[name] = harness(args, uri)
+        finally:
+            stop()
+
+    codes = {name: status_codes(report) for name, report in reports.items()}
+    keys = sorted(set().union(*codes.values())) if codes else []
+    mismatches = {
+        key: {name: backend.get(key) for name, backend in codes.items()}
+        for key in keys
+        if len({json.dumps(backend.get(key), sort_keys=True) for backend in codes.values()}) > 1
+    }
+    report = json.dumps({'reports': reports, 'skipped': skipped, 'mismatches': mismatches}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# Importing tasks: one POST /tasks per record vs a single POST /tasks/bulk.
+# The per-record rate is measured on a sample and extrapolated.
+#   python benchmarks/bulk_import.py 50000
+import sys
+import json
+import time
+from datetime import date
+
+from common import app, bulk_fill, fresh_database
+from models import User, Team, Project
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+SAMPLE = 500
+
+def task(prefix, n):
+    return {
+        'title': f'{prefix} {n}',
+        'description': 'imported',
+        'status': 'In Progress',
+        'due_date': '2023-05-12',
+        'priority': n % 5 + 1,
+        'assigned_to_user_id': n % 100 + 1,
+        'project_id': n % 10 + 1,
+    }
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, 100, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 1, lambda n: {'name': f'team{n}', 'description': 'seeded', 'created_by_user_id': 1})
+    bulk_fill(Project, 10, lambda n: {'title': f'project{n}', 'description': 'seeded', 'status': 'In Progress',
+                                      'start_date': date(2023, 1, 1), 'end_date': date(2023, 12, 31), 'team_id': 1})
+    client = app.test_client()
+
+    start = time.perf_counter()
+    for n in range(SAMPLE):
+        assert client.post('/tasks', json=task('single', n)).status_code == 201
+    single = (time.perf_counter() - start) / SAMPLE
+
+    start = time.perf_counter()
+    response = client.post('/tasks/bulk', json=[task('bulk', n) for n in range(ROWS)])
+    bulk = time.perf_counter() - start
+    assert response.status_code == 201, response.get_json()[:3]
+
+    print(json.dumps({
+        'rows': ROWS,
+        'single_posts_estimated_seconds': round(single * ROWS, 1),
+        'bulk_seconds': round(bulk, 2),
+        'bulk_rows_per_sec': round(ROWS / bulk),
+    }, indent=2))
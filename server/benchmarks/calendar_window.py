@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Date range reads at growing table sizes, with events and due dates spread
+# over three years: GET /calendars/week pages for everyone and for one user against
+# paging through /calendars?event_date__gte=&event_date__lt= and against a
+# client downloading every event to pick the week out, and GET /tasks/due
+# pages (the first, one halfway through the range, one user's) against the
+# first page of /tasks?due_date__gte=&due_date__lte=.
+#   python benchmarks/calendar_window.py 100000,1000000
+import os
+import sys
+import json
+from datetime import date, timedelta
+
+os.environ.setdefault('RESPONSE_CACHE', 'none')    # time the queries, not cache hits
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User, Task, Calendar, Project
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000').split(',')]
+USERS = 1000
+DAYS = 3 * 365
+REPEAT = 20
+FIRST_DAY = date(2022, 1, 3)
+WEEK_START = FIRST_DAY + timedelta(weeks=60)
+WEEK_END = WEEK_START + timedelta(days=7)
+MONTH = (WEEK_START, WEEK_START + timedelta(days=30))
+
+def day(n):
+    # Spread rows over the days, not in id order, as real data would be.
+    return FIRST_DAY + timedelta(days=n * 7919 % DAYS)
+
+def all_pages(client, url):
+    # The number of records on each page of url.
+    pages, after_id = [], ''
+    while after_id is not None:
+        response = client.get(f'{url}&after_id={after_id}' if after_id else url)
+        pages.append(len(response.get_json()))
+        after_id = response.headers.get('X-Next-After-Id')
+    return pages
+
+def page_after(client, url, pages):
+    # The cursor that many pages into url.
+    after_id = None
+    for n in range(pages):
+        after_id = client.get(f'{url}&after_id={after_id}' if after_id else url).headers['X-Next-After-Id']
+    return after_id
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, USERS, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Project, 10, lambda n: {'title': f'project {n}', 'status': 'Complete', 'start_date': FIRST_DAY,
+                                      'end_date': FIRST_DAY + timedelta(days=DAYS)})
+    client = app.test_client()
+    results = []
+    for size in SIZES:
+        bulk_fill(Calendar, size, lambda n: {'event_name': f'event {n}', 'event_date': day(n),
+                                             'created_by_user_id': n % USERS + 1})
+        bulk_fill(Task, size, lambda n: {'title': f'task {n}', 'status': 'Not Started', 'due_date': day(n),
+                                         'priority': 1, 'assigned_to_user_id': n % USERS + 1, 'project_id': n % 10 + 1})
+        week = f'/calendars/week?start={WEEK_START}'
+        listing = f'/calendars?event_date__gte={WEEK_START}&event_date__lt={WEEK_END}'
+        due = f'/tasks/due?from={MONTH[0]}&to={MONTH[1]}'
+
+        def client_side(n):
+            events = [json.loads(line) for line in client.get('/calendars?stream=1').get_data().splitlines()]
+            [event for event in events if WEEK_START.isoformat() <= event['event_date'] < WEEK_END.isoformat()]
+
+        halfway = len(all_pages(client, due)) // 2
+        deep = page_after(client, due, halfway)
+        results.append({
+            'rows': size,
+            'events_in_week': sum(all_pages(client, week)),
+            'calendar_week_first_page': timed(lambda n: client.get(week), REPEAT),
+            'calendar_week_all_pages': dict(timed(lambda n: all_pages(client, week), 3),
+                                            pages=len(all_pages(client, week))),
+            'calendar_week_one_user': timed(lambda n: client.get(f'{week}&created_by_user_id={n % USERS + 1}'), REPEAT),
+            'calendar_listing_all_pages': dict(timed(lambda n: all_pages(client, listing), 3),
+                                               pages=len(all_pages(client, listing))),
+            'calendar_client_side': timed(client_side, 3),
+            'tasks_due_first_page': timed(lambda n: client.get(due), REPEAT),
+            'tasks_due_halfway_page': dict(timed(lambda n: client.get(f'{due}&after_id={deep}'), REPEAT), page=halfway + 1),
+            'tasks_due_one_user': timed(lambda n: client.get(f'{due}&assigned_to_user_id={n % USERS + 1}'), REPEAT),
+            'tasks_listing_first_page': timed(
+                lambda n: client.get(f'/tasks?due_date__gte={MONTH[0]}&due_date__lte={MONTH[1]}'), REPEAT),
+        })
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# POST /chat_messages latency with a large users table. Sender and receiver
+# are checked with primary key probes, so this should not depend on user count.
+#   python benchmarks/chat_message_post.py 100000
+import sys
+import json
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REPEAT = 500
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, USERS, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    client = app.test_client()
+
+    def post(n):
+        response = client.post('/chat_messages', json={
+            'message_text': f'hello {n}',
+            'sender_user_id': n % USERS + 1,
+            'receiver_user_id': (n * 7919) % USERS + 1,
+        })
+        assert response.status_code == 201, response.get_json()
+
+    print(json.dumps({'users': USERS, **timed(post, REPEAT)}, indent=2))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Load test for the chat push channel (GET /users/<id>/events) against a real
+# gunicorn server, one worker process per SERVER_MODE (see gunicorn.conf.py).
+# Opens SUBSCRIBERS idle event streams over HTTP, times ordinary requests
+# while they stay open, then posts messages to random subscribed users and
+# measures the time from the POST starting to each subscriber receiving the
+# event. Streams turned away with a 503 (SSE_MAX_STREAMS, see chat_events.py)
+# are counted, and memory per connection is the growth in the worker's RSS
+# while the streams are open, divided by their number.
+#   python benchmarks/chat_push.py --modes asgi,gthread --subscribers 2000 --messages 200
+# The asgi mode needs a2wsgi, uvicorn and uvicorn-worker installed.
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+from common import DB_PATH, app, bulk_fill, fresh_database
+from models import User
+from serving_modes import free_port, wait_until_up
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE = os.sysconf('SC_PAGE_SIZE')
+CONNECTING = 200        # streams opened at once
+PROBES = 50             # ordinary requests timed while the streams are open
+
+def worker_rss(master):
+    with open(f'/proc/{master}/task/{master}/children') as children:
+        pids = children.read().split()
+    total = 0
+    for pid in pids:
+        with open(f'/proc/{pid}/statm') as statm:
+            total += int(statm.read().split()[1]) * PAGE
+    return total
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda fraction: round(samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000, 3) if samples else None
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+async def open_stream(port, user_id, gate, received):
+    # Returns the response status once the stream is open (or refused), and
+    # keeps reading it in a task that records when each event id arrives.
+    async with gate:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET /users/{user_id}/events HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+    if status != 200:
+        writer.close()
+        return status, None
+
+    async def read():
+        while line := await reader.readline():
+            if line.startswith(b'id: '):
+                received.setdefault(int(line[4:]), []).append(time.perf_counter())
+    return status, (asyncio.ensure_future(read()), writer)
+
+def timed_get(port, url):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    start = time.perf_counter()
+    connection.request('GET', url)
+    status = connection.getresponse().status
+    connection.close()
+    return time.perf_counter() - start, status
+
+def post_message(port, receiver, n):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    start = time.perf_counter()
+    connection.request('POST', '/chat_messages', json.dumps({'message_text': f'push {n}', 'sender_user_id': 1,
+                                                             'receiver_user_id': receiver}),
+                       {'Content-Type': 'application/json'})
+    id = json.loads(connection.getresponse().read())['id']
+    connection.close()
+    return id, start
+
+async def drive(port, master, args, users):
+    rng = random.Random(1)
+    listeners = [rng.randint(1, users) for n in range(args.subscribers)]
+    baseline = worker_rss(master)
+    gate = asyncio.Semaphore(CONNECTING)
+    received = {}
+    started = time.perf_counter()
+    opened = await asyncio.gather(*[open_stream(port, user_id, gate, received) for user_id in listeners])
+    open_seconds = time.perf_counter() - started
+    streams = [stream for status, stream in opened if stream]
+    streams_per_user = {}
+    for user_id, (status, stream) in zip(listeners, opened):
+        if stream:
+            streams_per_user[user_id] = streams_per_user.get(user_id, 0) + 1
+    await asyncio.sleep(0.5)
+    per_connection = (worker_rss(master) - baseline) / max(len(streams), 1)
+
+    probes = [await asyncio.to_thread(timed_get, port, f'/users/{n % users + 1}') for n in range(PROBES)]
+
+    sent = {}
+    subscribed = list(streams_per_user)
+    for n in range(args.messages if subscribed else 0):
+        receiver = rng.choice(subscribed)
+        id, start = await asyncio.to_thread(post_message, port, receiver, n)
+        sent[id] = (start, streams_per_user[receiver])
+        await asyncio.sleep(0.005)
+    expected = sum(count for start, count in sent.values())
+    deadline = time.time() + 10
+    while time.time() < deadline and sum(len(received.get(id, [])) for id in sent) < expected:
+        await asyncio.sleep(0.05)
+
+    for task, writer in streams:
+        task.cancel()
+        writer.close()
+    latencies = [arrived - start for id, (start, count) in sent.items() for arrived in received.get(id, [])]
+    fanout = percentiles(latencies)
+    return {
+        'streams_opened': len(streams),
+        'streams_refused_503': sum(status == 503 for status, stream in opened),
+        'open_all_seconds': round(open_seconds, 2),
+        'worker_rss_per_stream_kb': round(per_connection / 1024, 1),
+        'other_requests_while_open': dict(percentiles([seconds for seconds, status in probes]),
+                                          failed=sum(status >= 500 for seconds, status in probes)),
+        'messages': len(sent),
+        'deliveries_expected': expected,
+        'deliveries': len(latencies),
+        'fanout_p50_ms': fanout['p50_ms'],
+        'fanout_p95_ms': fanout['p95_ms'],
+        'fanout_p99_ms': fanout['p99_ms'],
+    }
+
+def run(mode, args, users):
+    port = free_port()
+    env = dict(os.environ, SERVER_MODE=mode, PORT=str(port), WEB_CONCURRENCY='1', GUNICORN_THREADS=str(args.threads),
+               GUNICORN_MAX_REQUESTS='0', SSE_HEARTBEAT_SECONDS='3600', DATABASE_URI=f'sqlite:///{DB_PATH}',
+               secret_key='benchmarks')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(SERVER, 'gunicorn.conf.py')],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port, time.time() + 30)
+        return dict(mode=mode, **asyncio.run(drive(port, server.pid, args, users)))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', default='asgi,gthread')
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    users = max(args.subscribers // 2, 2)    # about two open streams (tabs) per user
+    with app.app_context():
+        fresh_database()
+        bulk_fill(User, users, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com',
+                                          '_password_hash': 'x'})
+    print(json.dumps({
+        'subscribers': args.subscribers,
+        'threads': args.threads,
+        'runs': [run(mode, args, users) for mode in args.modes.split(',')],
+    }, indent=2))
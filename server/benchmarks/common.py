@@ -0,0 +1,46 @@
+# Shared setup for the scripts in this folder. Import this before anything from
+# the server package: it points DATABASE_URI at a throwaway SQLite file so the
+# benchmarks never touch instance/db_name.db.
+import os
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='syntax_bench_'), 'bench.db')
+os.environ.setdefault('DATABASE_URI', f'sqlite:///{DB_PATH}')
+os.environ.setdefault('secret_key', 'benchmarks')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert
+
+from app import app
+from models import db
+
+CHUNK = 10000
+
+def fresh_database():
+    db.drop_all()
+    db.create_all()
+
+def bulk_fill(model, target, make_row):
+    # Top a table up to `target` rows with executemany inserts, bypassing the
+    # ORM (and its validators) so building large fixtures stays cheap.
+    count = db.session.query(func.count(model.id)).scalar()
+    while count < target:
+        stop = min(count + CHUNK, target)
+        db.session.execute(insert(model.__table__), [make_row(n) for n in range(count + 1, stop + 1)])
+        count = stop
+    db.session.commit()
+
+def timed(fn, repeat):
+    samples = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        fn(n)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95)] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
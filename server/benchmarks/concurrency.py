@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Mixed read/write load from several processes sharing one SQLite file,
+# once per SQLITE_PROFILE. Reports ops/sec and how many requests failed
+# (mostly "database is locked") for each profile.
+#   python benchmarks/concurrency.py --processes 4 --seconds 10 --write-ratio 0.2
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED = {'users': 1000, 'teams': 20, 'projects': 50, 'tasks': 20000, 'files': 1000, 'chat-messages': 20000}
+
+def load(database, profile, seconds, write_ratio, worker_id, results):
+    os.environ.update(DATABASE_URI=f'sqlite:///{database}', SQLITE_PROFILE=profile, secret_key='benchmarks')
+    sys.path.insert(0, SERVER)
+    from app import app
+
+    rng = random.Random(worker_id)
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    client = app.test_client()
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        if rng.random() < write_ratio:
+            if rng.random() < 0.5:
+                response = client.post('/chat_messages', json={
+                    'message_text': f'load {worker_id} {n}',
+                    'sender_user_id': rng.randint(1, SEED['users']),
+                    'receiver_user_id': rng.randint(1, SEED['users']),
+                })
+            else:
+                response = client.patch(f"/tasks/{rng.randint(1, SEED['tasks'])}",
+                                        json={'status': rng.choice(['In Progress', 'Complete'])})
+            kind = 'writes'
+        else:
+            choice = rng.random()
+            if choice < 0.4:
+                response = client.get(f"/tasks/{rng.randint(1, SEED['tasks'])}")
+            elif choice < 0.7:
+                response = client.get(f"/tasks?limit=50&after_id={rng.randint(0, SEED['tasks'])}")
+            else:
+                response = client.get(f"/chat_messages?limit=50&receiver_user_id={rng.randint(1, SEED['users'])}")
+            kind = 'reads'
+        if response.status_code >= 400:
+            counts['errors'] += 1
+        else:
+            counts[kind] += 1
+    results.put(counts)
+
+def run(profile, args):
+    database = os.path.join(tempfile.mkdtemp(prefix='syntax_bench_'), f'{profile}.db')
+    env = dict(os.environ, SQLITE_PROFILE=profile, secret_key='benchmarks')
+    seed_args = [arg for key, value in SEED.items() for arg in (f'--{key}', str(value))]
+    subprocess.run([sys.executable, 'seed.py', '--database', database, *seed_args],
+                   cwd=SERVER, env=env, check=True, stdout=subprocess.DEVNULL)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=load, args=(database, profile, args.seconds, args.write_ratio, n, results))
+               for n in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    totals = {'reads': 0, 'writes': 0, 'errors': 0}
+    for worker in workers:
+        for key, value in results.get().items():
+            totals[key] += value
+    for worker in workers:
+        worker.join()
+    return {
+        'profile': profile,
+        **totals,
+        'ops_per_sec': round((totals['reads'] + totals['writes']) / args.seconds, 1),
+        'writes_per_sec': round(totals['writes'] / args.seconds, 1),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--profiles', default='default,tuned')
+    args = parser.parse_args()
+    print(json.dumps({
+        'processes': args.processes,
+        'seconds': args.seconds,
+        'write_ratio': args.write_ratio,
+        'runs': [run(profile, args) for profile in args.profiles.split(',')],
+    }, indent=2))
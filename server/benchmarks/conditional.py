@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# A dashboard refresh with and without a cached ETag: the full 200 response
+# against the 304 for a page of tasks and for one task, as the table grows.
+#   python benchmarks/conditional.py 10000,100000
+import sys
+import json
+from datetime import date
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User, Team, Project, Task
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000').split(',')]
+REPEAT = 200
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, 10, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 1, lambda n: {'name': 'team', 'created_by_user_id': 1})
+    bulk_fill(Project, 1, lambda n: {'title': 'project', 'status': 'Complete', 'start_date': date(2023, 1, 1),
+                                     'end_date': date(2023, 12, 31), 'team_id': 1})
+    client = app.test_client()
+    results = []
+    for size in SIZES:
+        bulk_fill(Task, size, lambda n: {'title': f'task {n}', 'status': 'Not Started', 'due_date': date(2023, 5, 12),
+                                         'priority': 1, 'assigned_to_user_id': 1, 'project_id': 1})
+        client.patch('/tasks/1', json={'status': 'Complete'})    # give the table a version
+        result = {'tasks': size}
+        for name, url in (('page_of_1000', '/tasks?limit=1000'), ('one_task', '/tasks/1')):
+            etag = client.get(url).headers['ETag']
+            assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+            result[name] = {
+                '200': timed(lambda n: client.get(url), REPEAT),
+                '304': timed(lambda n: client.get(url, headers={'If-None-Match': etag}), REPEAT),
+            }
+        results.append(result)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# Per-poll cost of the conversation endpoints as the chat_messages table grows,
+# next to the old way of polling (download every message with ?stream=1 and
+# filter client side). The users, and so the messages per user, stay fixed,
+# so the conversation endpoints should stay flat while the full download grows
+# with the table.
+#   python benchmarks/conversations.py 10000,100000,1000000
+import sys
+import json
+from datetime import datetime, timedelta
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User, Chat_Message
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000').split(',')]
+USERS = 1000
+FOCUS = 1000    # messages between users 1 and 2 at every size
+REPEAT = 50
+START = datetime(2023, 1, 1)
+
+def message(n):
+    if n <= FOCUS:
+        sender, receiver = (1, 2) if n % 2 else (2, 1)
+    else:
+        # Everyone else talks among themselves.
+        sender, receiver = n % (USERS - 2) + 3, (n * 7) % (USERS - 2) + 3
+    return {'message_text': f'message {n}', 'sender_user_id': sender, 'receiver_user_id': receiver,
+            'message_date': START + timedelta(seconds=n), 'read_at': None}
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, USERS, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    client = app.test_client()
+    results = []
+    for size in SIZES:
+        bulk_fill(Chat_Message, size, message)
+
+        def full_download(n):
+            lines = client.get('/chat_messages?stream=1').get_data().splitlines()
+            assert len(lines) == size
+
+        results.append({
+            'messages': size,
+            'conversations': timed(lambda n: client.get('/users/1/conversations'), REPEAT),
+            'thread_first_page': timed(lambda n: client.get('/users/1/conversations/2'), REPEAT),
+            'thread_deep_page': timed(lambda n: client.get(f'/users/1/conversations/2?before_id={FOCUS // 2}'), REPEAT),
+            'full_download': timed(full_download, 3),
+        })
+    print(json.dumps(results, indent=2))
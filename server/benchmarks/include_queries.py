@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# Checks that ?include= costs a fixed number of SQL statements however many
+# children the records have: the same URLs are requested with 10, 100 and
+# 1000 tasks/files per project and the X-Query-Count of each has to stay the
+# same. Exits non-zero if any count moves. Also times a page of projects with
+# their tasks against the client-side alternative, one /tasks request per
+# project.
+#   python benchmarks/include_queries.py 10,100,1000
+import os
+import sys
+import json
+from datetime import date
+
+os.environ.setdefault('QUERY_STATS_HEADERS', '1')
+os.environ.setdefault('RESPONSE_CACHE', 'none')     # count the queries, not cache hits
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User, Team, Project, Task, File
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10,100,1000').split(',')]
+PROJECTS = 20
+REPEAT = 20
+URLS = [
+    '/projects/1?include=tasks,files,team',
+    '/projects/1?include=tasks&tasks.limit=20&tasks.after_id=100',
+    '/projects/1?include=team.projects',
+    '/users/1?include=tasks,files',
+    '/projects?include=tasks,files&tasks.limit=10&limit=20',
+    '/teams?include=projects.tasks',
+    '/tasks?include=project.team,user&limit=100',
+]
+
+with app.app_context():
+    client = app.test_client()
+    counts = {url: {} for url in URLS}
+    timings = []
+    for per_project in SIZES:
+        fresh_database()
+        bulk_fill(User, 10, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+        bulk_fill(Team, 2, lambda n: {'name': f'team {n}', 'created_by_user_id': 1})
+        bulk_fill(Project, PROJECTS, lambda n: {'title': f'project {n}', 'status': 'Complete', 'start_date': date(2023, 1, 1),
+                                                'end_date': date(2023, 12, 31), 'team_id': n % 2 + 1})
+        children = PROJECTS * per_project
+        bulk_fill(Task, children, lambda n: {'title': f'task {n}', 'status': 'Not Started', 'due_date': date(2023, 5, 12),
+                                             'priority': 1, 'assigned_to_user_id': n % 10 + 1,
+                                             'project_id': n % PROJECTS + 1})
+        bulk_fill(File, children, lambda n: {'filename': f'file {n}', 'file_type': 'pdf', 'size': 1,
+                                             'uploaded_by_user_id': n % 10 + 1, 'project_id': n % PROJECTS + 1})
+        for url in URLS:
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code, response.get_json())
+            counts[url][per_project] = int(response.headers['X-Query-Count'])
+
+        def one_request_per_project(n):
+            for project in client.get(f'/projects?limit={PROJECTS}').get_json():
+                client.get(f"/tasks?project_id={project['id']}&limit=10")
+        timings.append({
+            'children_per_project': per_project,
+            'include': timed(lambda n: client.get(f'/projects?include=tasks&tasks.limit=10&limit={PROJECTS}'), REPEAT),
+            'request_per_project': timed(one_request_per_project, REPEAT),
+        })
+
+failed = [url for url, by_size in counts.items() if len(set(by_size.values())) > 1]
+print(json.dumps({'query_counts': counts, 'timings': timings, 'failed': failed}, indent=2))
+sys.exit(1 if failed else 0)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# A login storm: CLIENTS threads log in back to back for SECONDS while one
+# more thread keeps reading /users/1, once with every login hashing at the
+# same time (no bound, as before passwords.py) and once through the bounded
+# pool. Reports login throughput, login latency, how many got a 503, and
+# the latency of the reads caught up in the storm.
+#   BCRYPT_LOG_ROUNDS=12 python benchmarks/login_storm.py 32 10
+import os
+import sys
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '10')
+
+from common import app, bulk_fill, fresh_database
+from config import bcrypt
+from models import User
+import passwords
+
+CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda fraction: round(samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000, 1) if samples else None
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+def storm(workers, queue):
+    passwords.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='passwords')
+    passwords.slots = threading.BoundedSemaphore(workers + queue)
+    logins, reads, rejected = [], [], [0]
+    deadline = time.perf_counter() + SECONDS
+
+    def log_in(n):
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = client.post('/login', json={'username': f'user{n}', 'password': 'password'}).status_code
+            if status == 503:
+                rejected[0] += 1
+                time.sleep(1)    # Retry-After
+            else:
+                assert status == 200, status
+                logins.append(time.perf_counter() - start)
+
+    def read():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            client.get('/users/1')
+            reads.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=log_in, args=(n % 100 + 1,)) for n in range(CLIENTS)]
+    threads.append(threading.Thread(target=read))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    passwords.pool.shutdown()
+    return {
+        'password_workers': workers,
+        'password_queue': queue,
+        'logins_per_second': round(len(logins) / SECONDS, 1),
+        'logins': percentiles(logins),
+        'rejected_503': rejected[0],
+        'reads_during_storm': percentiles(reads),
+    }
+
+with app.app_context():
+    fresh_database()
+    shared_hash = bcrypt.generate_password_hash('password').decode('utf-8')
+    bulk_fill(User, 100, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com',
+                                    '_password_hash': shared_hash})
+
+print(json.dumps({
+    'clients': CLIENTS,
+    'seconds': SECONDS,
+    'bcrypt_log_rounds': app.config['BCRYPT_LOG_ROUNDS'],
+    'cpus': os.cpu_count(),
+    'unbounded': storm(CLIENTS, 0),
+    'pool': storm(app.config['PASSWORD_WORKERS'], app.config['PASSWORD_QUEUE']),
+}, indent=2))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Checks that the queries behind the common access patterns still use the
+# secondary indexes declared in models.py, by running EXPLAIN QUERY PLAN on
+# the SQL the app actually generates. Prints each plan with its timing and
+# exits non-zero if any query stops using its index (e.g. after a filter or
+# model change makes SQLite fall back to a full table scan), or if a model's
+# filter_fields lists a column that no index leads with.
+#   python benchmarks/query_plans.py 100000
+import sys
+import json
+import time
+from datetime import date, datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import with_parent
+
+from common import app, bulk_fill, fresh_database
+from listing import apply_filters, column_query
+from conversations import thread_half
+from schedule import due_query, week_query
+from models import db, User, Team, Project, Task, File, Calendar, Chat_Message
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+USERS = max(ROWS // 100, 10)
+PROJECTS = max(ROWS // 1000, 5)
+
+def listing(model, **args):
+    # The collection GET query for ?<args>, first page.
+    fields = model._serialized_fields
+    query = apply_filters(model, column_query(model, fields), args)
+    return query.order_by(model.id).limit(app.config['PAGE_SIZE'])
+
+def dated(build, args):
+    # A /tasks/due or /calendars/week query, first page.
+    return build(args).limit(app.config['PAGE_SIZE'])
+
+def children(attribute, parent_id):
+    # What the lazy load (and the delete cascade) of parent.<relationship> runs.
+    parent = db.session.get(attribute.class_, parent_id)
+    return attribute.property.mapper.class_.query.filter(with_parent(parent, attribute))
+
+# (description, query builder, index the plan must mention, or a tuple of
+# indexes it may mention any of)
+CHECKS = [
+    ('user.tasks', lambda: children(User.tasks, 3), 'ix_tasks_assigned_to_user_id_due_date'),
+    ('user.files', lambda: children(User.files, 3), 'ix_files_uploaded_by_user_id'),
+    ('user.teams', lambda: children(User.teams, 3), 'ix_teams_created_by_user_id'),
+    ('user.calendars', lambda: children(User.calendars, 3), 'ix_calendars_created_by_user_id_event_date'),
+    ('user.sent_messages', lambda: children(User.sent_messages, 3),
+     'ix_chat_messages_sender_user_id_receiver_user_id_message_date'),
+    # Both receiver-led indexes serve this equally well, and SQLite's pick
+    # between them follows the order they were created in, which varies.
+    ('user.received_messages', lambda: children(User.received_messages, 3),
+     ('ix_chat_messages_receiver_user_id_message_date', 'ix_chat_messages_receiver_user_id_read_at')),
+    ('project.tasks', lambda: children(Project.tasks, 2), 'ix_tasks_project_id_status'),
+    ('project.files', lambda: children(Project.files, 2), 'ix_files_project_id'),
+    ('team.projects', lambda: children(Team.projects, 2), 'ix_projects_team_id'),
+    ('GET /tasks?status=', lambda: listing(Task, status='Complete'), 'ix_tasks_status'),
+    ('GET /tasks?due_date__gte=&due_date__lt=', lambda: listing(Task, due_date__gte='2023-05-01',
+                                                                due_date__lt='2023-05-08'), 'ix_tasks_due_date'),
+    ('GET /tasks?project_id=&status=', lambda: listing(Task, project_id='2', status='Complete'),
+     'ix_tasks_project_id_status'),
+    ('GET /projects?status=', lambda: listing(Project, status='Complete'), 'ix_projects_status'),
+    ('GET /calendars?event_date=', lambda: listing(Calendar, event_date='2023-05-12'), 'ix_calendars_event_date'),
+    ('GET /tasks/due?from=&to=', lambda: dated(due_query, {'from': '2023-05-01', 'to': '2023-05-07'}), 'ix_tasks_due_date'),
+    ('GET /tasks/due?from=&to=&after_id=', lambda: dated(due_query, {'from': '2023-05-01', 'to': '2023-05-31',
+                                                                      'after_id': '500'}), 'ix_tasks_due_date'),
+    ('GET /tasks/due?from=&to=&assigned_to_user_id=',
+     lambda: dated(due_query, {'from': '2023-05-01', 'to': '2023-05-31', 'assigned_to_user_id': '3'}),
+     'ix_tasks_assigned_to_user_id_due_date'),
+    ('GET /calendars/week?start=', lambda: dated(week_query, {'start': '2023-05-08'}), 'ix_calendars_event_date'),
+    ('GET /calendars/week?start=&after_id=', lambda: dated(week_query, {'start': '2023-05-08', 'after_id': '500'}),
+     'ix_calendars_event_date'),
+    ('GET /calendars/week?start=&created_by_user_id=',
+     lambda: dated(week_query, {'start': '2023-05-08', 'created_by_user_id': '3'}),
+     'ix_calendars_created_by_user_id_event_date'),
+    ('inbox', lambda: Chat_Message.query.filter(Chat_Message.receiver_user_id == 3)
+                                        .order_by(Chat_Message.message_date.desc()).limit(50),
+     'ix_chat_messages_receiver_user_id_message_date'),
+    ('GET /users/<id>/conversations/<other_id>?before_id=',
+     lambda: thread_half(3, 4, ROWS // 2, app.config['PAGE_SIZE']),
+     'ix_chat_messages_sender_user_id_receiver_user_id_message_date'),
+    ('conversation unread counts', lambda: unread_counts(3), 'ix_chat_messages_receiver_user_id_read_at'),
+]
+
+def populate():
+    fresh_database()
+    bulk_fill(User, USERS, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com',
+                                      '_password_hash': 'x'})
+    bulk_fill(Team, PROJECTS, lambda n: {'name': f'team {n}', 'created_by_user_id': n % USERS + 1})
+    bulk_fill(Project, PROJECTS, lambda n: {'title': f'project {n}', 'status': ['Not Started', 'Complete'][n % 2],
+                                            'start_date': date(2023, 1, 1), 'end_date': date(2023, 12, 31),
+                                            'team_id': n % PROJECTS + 1})
+    bulk_fill(Task, ROWS, lambda n: {'title': f'task {n}', 'status': ['Not Started', 'In Progress', 'Complete'][n % 3],
+                                     'due_date': date(2023, n % 12 + 1, n % 28 + 1), 'priority': n % 10 + 1,
+                                     'assigned_to_user_id': n % USERS + 1, 'project_id': n % PROJECTS + 1})
+    bulk_fill(File, ROWS, lambda n: {'filename': f'file_{n}.txt', 'file_type': 'txt', 'size': n % 500 + 1,
+                                     'uploaded_by_user_id': n % USERS + 1, 'project_id': n % PROJECTS + 1})
+    bulk_fill(Calendar, ROWS // 10, lambda n: {'event_name': f'event {n}', 'event_date': date(2023, 5, n % 28 + 1),
+                                               'created_by_user_id': n % USERS + 1})
+    bulk_fill(Chat_Message, ROWS, lambda n: {'message_text': f'message {n}', 'sender_user_id': n % USERS + 1,
+                                             'receiver_user_id': (n * 7) % USERS + 1,
+                                             'read_at': None if n % 5 else datetime(2023, 6, 1)})
+
+def unread_counts(user_id):
+    return (select(Chat_Message.sender_user_id, func.count())
+            .where(Chat_Message.receiver_user_id == user_id, Chat_Message.read_at.is_(None))
+            .group_by(Chat_Message.sender_user_id))
+
+def unindexed_filters():
+    # filter_fields that no index (or unique constraint) leads with.
+    unindexed = []
+    for mapper in db.Model.registry.mappers:
+        model = mapper.class_
+        table = model.__table__
+        leading = {index.columns[0].key for index in table.indexes}
+        leading |= {column.key for column in table.columns if column.unique or column.primary_key}
+        unindexed += [f'{model.__name__}.{field}' for field in getattr(model, 'filter_fields', ())
+                      if field not in leading]
+    return unindexed
+
+def statement_of(query):
+    return getattr(query, 'statement', query)
+
+def plan(query):
+    statement = statement_of(query).compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {statement}')).all()
+    return [row[-1] for row in rows]
+
+def main():
+    unindexed = unindexed_filters()
+    failures = len(unindexed)
+    results = []
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            raise SystemExit('EXPLAIN QUERY PLAN is SQLite syntax; point DATABASE_URI at a SQLite file')
+        populate()
+        for description, build, index in CHECKS:
+            query = build()
+            steps = plan(query)
+            start = time.perf_counter()
+            db.session.execute(statement_of(query)).all()
+            elapsed = time.perf_counter() - start
+            indexes = index if isinstance(index, tuple) else (index,)
+            ok = any(name in step for step in steps for name in indexes)
+            failures += not ok
+            results.append({'query': description, 'expected_index': index, 'ok': ok,
+                            'ms': round(elapsed * 1000, 3), 'plan': steps})
+    print(json.dumps({'rows': ROWS, 'failures': failures, 'unindexed_filters': unindexed, 'results': results}, indent=2))
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
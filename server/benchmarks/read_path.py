@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Rows/sec and peak Python memory for building response dicts two ways: the
+# old ORM path (Model.query.all() + to_dict()) and the column-only path the
+# read endpoints use now. Run per table for tasks, files and chat messages.
+#   python benchmarks/read_path.py 100000
+import sys
+import json
+import time
+import tracemalloc
+from datetime import date
+
+from common import app, bulk_fill, fresh_database
+from listing import column_query
+from serializer import row_serializer
+from models import db, User, Team, Project, Task, File, Chat_Message
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+def orm_path(model):
+    return [row.to_dict() for row in model.query.all()]
+
+def column_path(model):
+    fields = model._serialized_fields
+    serialize = row_serializer(model, fields)
+    return [serialize(row) for row in column_query(model, fields).all()]
+
+def measure(model, build):
+    db.session.expunge_all()
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = build(model)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert len(records) == ROWS
+    return {'rows_per_sec': round(ROWS / elapsed), 'peak_mb': round(peak / 2**20, 1)}
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, 2, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 1, lambda n: {'name': f'team{n}', 'description': 'seeded', 'created_by_user_id': 1})
+    bulk_fill(Project, 1, lambda n: {'title': f'project{n}', 'description': 'seeded', 'status': 'In Progress',
+                                     'start_date': date(2023, 1, 1), 'end_date': date(2023, 12, 31), 'team_id': 1})
+    bulk_fill(Task, ROWS, lambda n: {'title': f'task{n}', 'description': 'seeded', 'status': 'In Progress',
+                                     'due_date': date(2023, 5, 12), 'priority': 1, 'assigned_to_user_id': 1, 'project_id': 1})
+    bulk_fill(File, ROWS, lambda n: {'filename': f'file{n}.txt', 'description': 'seeded file', 'file_type': 'txt',
+                                     'size': n, 'uploaded_by_user_id': 1, 'project_id': 1})
+    bulk_fill(Chat_Message, ROWS, lambda n: {'message_text': f'message {n}', 'sender_user_id': 1, 'receiver_user_id': 2})
+    results = {'rows': ROWS}
+    for model in (Task, File, Chat_Message):
+        assert orm_path(model)[:50] == column_path(model)[:50]
+        results[model.__tablename__] = {'orm': measure(model, orm_path), 'columns': measure(model, column_path)}
+    print(json.dumps(results, indent=2))
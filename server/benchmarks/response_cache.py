@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# The response cache on the project/team/calendar GETs: a cold read (cache
+# just invalidated) against a cached one, then a 100:1 read/write mix over
+# random pages and records with the hit ratio it ends up with.
+#   python benchmarks/response_cache.py 20000
+import sys
+import json
+import random
+from datetime import date
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User, Team, Project
+from cache import response_cache
+
+PROJECTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+REPEAT = 200
+MIX = 20000
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, 10, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 100, lambda n: {'name': f'team {n}', 'created_by_user_id': 1})
+    bulk_fill(Project, PROJECTS, lambda n: {'title': f'project {n}', 'status': 'Complete', 'start_date': date(2023, 1, 1),
+                                            'end_date': date(2023, 12, 31), 'team_id': n % 100 + 1})
+    client = app.test_client()
+    results = {'projects': PROJECTS}
+    for name, url in (('page_of_100', '/projects?limit=100'), ('page_of_1000', '/projects?limit=1000'),
+                      ('one_project', '/projects/1')):
+        results[name] = {
+            'miss': timed(lambda n: (response_cache.invalidate({'projects', 'projects:1'}), client.get(url)), REPEAT),
+            'hit': timed(lambda n: client.get(url), REPEAT),
+        }
+
+    rng = random.Random(1)
+    before = response_cache.stats()
+    def mixed(n):
+        if n % 101 == 100:
+            client.patch(f'/projects/{rng.randint(1, PROJECTS)}', json={'status': 'In Progress'})
+        elif rng.random() < 0.5:
+            client.get(f'/projects?limit=100&after_id={rng.randint(0, 9) * 100}')
+        else:
+            client.get(f'/projects/{rng.randint(1, 500)}')
+    results['mixed_100_to_1'] = timed(mixed, MIX)
+    after = response_cache.stats()
+    lookups = (after['hits'] - before['hits']) + (after['misses'] - before['misses'])
+    results['mixed_100_to_1']['hit_ratio'] = round((after['hits'] - before['hits']) / lookups, 3)
+    results['cache'] = after
+    print(json.dumps(results, indent=2))
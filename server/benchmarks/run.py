@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# Benchmarks every endpoint registered with api.add_resource at one or more
+# data scales, through Flask's test client. For each (endpoint, method) it
+# reports throughput, p50/p95/p99 latency, SQL statements per request and the
+# status codes seen, as JSON.
+#   python benchmarks/run.py --sizes 1000,100000 --requests 200 --output bench.json
+# Each size is seeded into its own SQLite file with seed.py and measured in a
+# child process, so the numbers for one size don't leak into the next. With
+# --database-uri (e.g. a throwaway Postgres database) every size is seeded
+# into that database instead, replacing whatever it holds.
+# Endpoints without a scenario below are listed under "uncovered", which is
+# the cue to add one when a resource is added.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed_counts(size):
+    return {
+        'users': max(size // 10, 10),
+        'teams': max(size // 100, 5),
+        'projects': max(size // 100, 5),
+        'tasks': size,
+        'files': size,
+        'calendars': max(size // 10, 5),
+        'chat-messages': size,
+    }
+
+###############################################################
+## Scenarios
+###############################################################
+
+# Per resource: collection endpoint name, URL, a payload for a new record
+# (tag keeps unique columns unique across runs) and a partial update.
+def resources(counts):
+    users, teams, projects = counts['users'], counts['teams'], counts['projects']
+    pick = random.randint
+    return {
+        'user': ('/users', 'users',
+                 lambda tag: {'username': f'bench_{tag}', 'email': f'bench_{tag}@example.com', 'password': 'bench'},
+                 lambda: {'email': f'patched{pick(1, 10**9)}@example.com'}),
+        'team': ('/teams', 'teams',
+                 lambda tag: {'name': f'bench team {tag}', 'description': 'bench', 'date_created': None,
+                              'created_by_user_id': pick(1, users)},
+                 lambda: {'description': f'patched {pick(1, 10**9)}'}),
+        'project': ('/projects', 'projects',
+                    lambda tag: {'title': f'bench project {tag}', 'description': 'bench', 'status': 'In Progress',
+                                 'start_date': '2023-01-01', 'end_date': '2023-12-31', 'team_id': pick(1, teams)},
+                    lambda: {'status': random.choice(['In Progress', 'Complete'])}),
+        'task': ('/tasks', 'tasks',
+                 lambda tag: {'title': f'bench task {tag}', 'description': 'bench', 'status': 'In Progress',
+                              'due_date': '2023-05-12', 'priority': pick(1, 10),
+                              'assigned_to_user_id': pick(1, users), 'project_id': pick(1, projects)},
+                 lambda: {'status': random.choice(['In Progress', 'Complete'])}),
+        'file': ('/files', 'files',
+                 lambda tag: {'filename': f'bench_{tag}.txt', 'file_type': 'txt', 'size': pick(1, 500),
+                              'date_uploaded': None, 'uploaded_by_user_id': pick(1, users),
+                              'project_id': pick(1, projects)},
+                 lambda: {'size': pick(1, 500)}),
+        'calendar': ('/calendars', 'calendars',
+                     lambda tag: {'event_name': f'bench event {tag}', 'event_description': 'bench',
+                                  'event_date': '2023-05-12', 'created_by_user_id': pick(1, users)},
+                     lambda: {'event_description': f'patched {pick(1, 10**9)}'}),
+        'chat_message': ('/chat_messages', 'chat-messages',
+                         lambda tag: {'message_text': f'bench {tag}', 'sender_user_id': pick(1, users),
+                                      'receiver_user_id': pick(1, users)},
+                         lambda: {'message_text': f'patched {pick(1, 10**9)}'}),
+    }
+
+BULK_SIZE = 50
+STREAMING = {'chatevents'}    # endpoints that never finish; timed to the first chunk
+SLOW_REPEAT = 10    # bcrypt-bound endpoints (login, signup, user creation)
+SEARCH_WORDS = ('people', 'report', 'team', 'market', 'data*')
+SEEDED_DAYS = (date(2020, 1, 1), date(2024, 12, 31))    # seed.py's DATE_RANGE
+
+def scenarios(counts, repeat):
+    # Ordered list of (endpoint, method, repeat, fn(n) -> (url, json)).
+    # Creates run before deletes, which remove only rows this run created.
+    created = {}
+    plan = [
+        ('home', 'GET', repeat, lambda n: ('/', None)),
+        ('signup', 'POST', SLOW_REPEAT, lambda n: ('/signup', {'username': f'signup_{run_tag}_{n}',
+                                                               'email': 'signup@example.com', 'password': 'bench'})),
+        ('login', 'POST', SLOW_REPEAT, lambda n: ('/login', {'username': 'Admin', 'password': 'Admin'})),
+        ('check_session', 'GET', repeat, lambda n: ('/check_session', None)),
+    ]
+    for name, (url, count_key, new, change) in resources(counts).items():
+        rows = counts[count_key]
+        ids = created.setdefault(name, [])
+        bulk_ids = created.setdefault(f'{name}bulk', [])
+        tag = lambda n, name=name: f'{run_tag}_{name}_{n}'
+        creates = SLOW_REPEAT if name == 'user' else repeat
+        bulk_size = 2 if name == 'user' else BULK_SIZE
+        plan += [
+            (name, 'GET', repeat, lambda n, url=url: (url, None)),
+            (f'{name}byid', 'GET', repeat, lambda n, url=url, rows=rows: (f'{url}/{random.randint(1, rows)}', None)),
+            (name, 'POST', creates, lambda n, url=url, new=new, tag=tag: (url, new(tag(n)))),
+            (f'{name}byid', 'PATCH', repeat,
+             lambda n, url=url, rows=rows, change=change: (f'{url}/{random.randint(1, rows)}', change())),
+            (f'{name}bulk', 'POST', repeat // 10 or 1,
+             lambda n, url=url, new=new, tag=tag, size=bulk_size: (
+                 f'{url}/bulk', [new(tag(f'b{n}_{i}')) for i in range(size)])),
+            (f'{name}bulk', 'PATCH', repeat // 10 or 1,
+             lambda n, url=url, rows=rows, change=change: (
+                 f'{url}/bulk', [dict(change(), id=random.randint(1, rows)) for i in range(BULK_SIZE)])),
+            (f'{name}byid', 'DELETE', creates, lambda n, url=url, ids=ids: (f'{url}/{ids.pop()}', None)),
+            (f'{name}bulk', 'DELETE', repeat // 10 or 1,
+             lambda n, url=url, ids=bulk_ids: (f'{url}/bulk', [ids.pop() for i in range(min(BULK_SIZE, len(ids)))] or [0])),
+        ]
+    users = counts['users']
+    pick = lambda: random.randint(1, users)
+    due_within_month = lambda first: (f'/tasks/due?from={first}&to={first + timedelta(days=30)}', None)
+    day = lambda: SEEDED_DAYS[0] + timedelta(days=random.randint(0, (SEEDED_DAYS[1] - SEEDED_DAYS[0]).days))
+    plan += [
+        ('conversation', 'GET', repeat, lambda n: (f'/users/{pick()}/conversations', None)),
+        ('conversationthread', 'GET', repeat, lambda n: (f'/users/{pick()}/conversations/{pick()}', None)),
+        ('conversationread', 'POST', repeat, lambda n: (f'/users/{pick()}/conversations/{pick()}/read', None)),
+        ('chatevents', 'GET', repeat, lambda n: (f'/users/{pick()}/events', None)),
+        ('sync', 'GET', repeat, lambda n: ('/sync?since=0', None)),
+        ('stats', 'GET', repeat, lambda n: ('/stats', None)),
+        ('taskdue', 'GET', repeat, lambda n: due_within_month(day())),
+        ('calendarweek', 'GET', repeat, lambda n: (f'/calendars/week?start={day()}', None)),
+        ('search', 'GET', repeat, lambda n: (f'/search?q={random.choice(SEARCH_WORDS)}&limit=20', None)),
+        ('cachestats', 'GET', repeat, lambda n: ('/cache/stats', None)),
+        ('logout', 'DELETE', repeat, lambda n: ('/logout', None)),
+        ('clear', 'DELETE', repeat, lambda n: ('/clear', None)),
+    ]
+    return plan, created
+
+run_tag = str(int(time.time()))
+
+###############################################################
+## Worker: runs in a child process against one seeded database
+###############################################################
+
+def percentile(samples, fraction):
+    return round(samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000, 3)
+
+def worker(size, repeat):
+    sys.path.insert(0, SERVER)
+    from sqlalchemy import event
+    from app import app
+    from models import db
+
+    counts = seed_counts(size)
+    random.seed(size)
+    statements = [0]
+    results = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+        client = app.test_client()
+        plan, created = scenarios(counts, repeat)
+        covered = set()
+        for endpoint, method, times, build in plan:
+            covered.add((endpoint, method))
+            latencies, queries, codes = [], [], {}
+            for n in range(times):
+                url, body = build(n)
+                statements[0] = 0
+                start = time.perf_counter()
+                if endpoint in STREAMING:
+                    response = client.open(url, method=method, json=body, buffered=False)
+                    next(iter(response.response))
+                    response.close()
+                else:
+                    response = client.open(url, method=method, json=body)
+                latencies.append(time.perf_counter() - start)
+                queries.append(statements[0])
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+                if method == 'POST' and response.status_code == 201 and endpoint in created:
+                    data = response.get_json()
+                    created[endpoint].extend(item['id'] for item in data) if isinstance(data, list) \
+                        else created[endpoint].append(data['id'])
+            latencies.sort()
+            results.append({
+                'endpoint': endpoint,
+                'method': method,
+                'url': url.split('?')[0],
+                'requests': times,
+                'throughput_rps': round(times / sum(latencies), 1),
+                'p50_ms': percentile(latencies, 0.50),
+                'p95_ms': percentile(latencies, 0.95),
+                'p99_ms': percentile(latencies, 0.99),
+                'sql_statements_mean': round(sum(queries) / times, 2),
+                'sql_statements_max': max(queries),
+                'status_codes': {str(code): count for code, count in sorted(codes.items())},
+            })
+        registered = {
+            (rule.endpoint, method)
+            for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+            for method in rule.methods - {'HEAD', 'OPTIONS'}
+        }
+    return {
+        'size': size,
+        'seed_counts': counts,
+        'results': results,
+        'uncovered': sorted(f'{method} {endpoint}' for endpoint, method in registered - covered),
+    }
+
+###############################################################
+## Driver
+###############################################################
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000', help='comma separated row counts for the big tables')
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint and method')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--database-uri', help='seed and benchmark this database instead of a temporary SQLite file')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(worker(args.worker, args.requests)))
+        return
+
+    runs = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        if args.database_uri:
+            database = None
+            seed_target = ['--create-tables']
+            env = dict(os.environ, DATABASE_URI=args.database_uri, secret_key='benchmarks')
+        else:
+            database = os.path.join(tempfile.mkdtemp(prefix='syntax_bench_'), f'bench_{size}.db')
+            seed_target = ['--database', database]
+            env = dict(os.environ, DATABASE_URI=f'sqlite:///{database}', secret_key='benchmarks')
+        seed_args = [arg for key, value in seed_counts(size).items() for arg in (f'--{key}', str(value))]
+        print(f'Seeding {size}...', file=sys.stderr)
+        subprocess.run([sys.executable, 'seed.py', *seed_target, *seed_args],
+                       cwd=SERVER, env=env, check=True, stdout=subprocess.DEVNULL)
+        print(f'Benchmarking {size}...', file=sys.stderr)
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(size),
+                                '--requests', str(args.requests)],
+                               cwd=SERVER, env=env, check=True, capture_output=True, text=True)
+        runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        if database:
+            os.remove(database)
+
+    report = json.dumps({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'runs': runs}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
+
+if __name__ == '__main__':
+    main()
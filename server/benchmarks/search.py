@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Latency of GET /search at a given number of searchable rows (split across
+# tasks, chat messages, files and projects) for the most frequent word (in
+# most rows, like "the"), a common, a mid and a rare one, two words, a
+# prefix, one type only and a deep page. Next to it: the substring scan other
+# databases fall back to, and what a client does today, downloading /tasks in
+# full to filter it. Also reports the bulk load rate with the index triggers in place and
+# the time `flask rebuild-search` takes.
+#   python benchmarks/search.py 1000000
+import os
+import sys
+import json
+import time
+from itertools import accumulate
+from random import Random
+from datetime import date
+
+os.environ.setdefault('SLOW_QUERY_MS', '10000')    # the common words are slow on purpose
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User, Project, Task, File, Chat_Message
+import search
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REPEAT = 20
+USERS = 1000
+
+# Made-up words drawn with Zipf-like frequencies, so a few words are in a
+# large share of the rows and most are rare, as in real text.
+random = Random(1234)
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'do', 'gre', 'fin', 'tor', 'bel',
+             'qua', 'sim', 'ver', 'mon', 'lux', 'dra', 'pel', 'cor', 'nix', 'ath', 'ulm', 'ory', 'esk']
+VOCABULARY = sorted({''.join(random.choice(SYLLABLES) for n in range(random.randint(2, 3))) for n in range(30000)})
+random.shuffle(VOCABULARY)
+CUMULATIVE_WEIGHTS = list(accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+TOP, COMMON, MID, RARE = VOCABULARY[0], VOCABULARY[10], VOCABULARY[100], VOCABULARY[5000]
+
+def words(low, high):
+    return ' '.join(random.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=random.randint(low, high)))
+
+def loaded(model, target, make_row):
+    started = time.perf_counter()
+    bulk_fill(model, target, make_row)
+    return round(target / (time.perf_counter() - started))
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, USERS, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    projects = max(ROWS // 1000, 10)
+    rows_per_sec = {
+        'projects': loaded(Project, projects, lambda n: {'title': f'{words(2, 4)} {n}', 'description': words(8, 20),
+                                                         'status': 'Complete', 'start_date': date(2023, 1, 1),
+                                                         'end_date': date(2023, 12, 31)}),
+        'files': loaded(File, ROWS // 10, lambda n: {'filename': f'{words(1, 2)}_{n}.pdf', 'description': words(8, 20),
+                                                    'file_type': 'pdf', 'size': 1, 'uploaded_by_user_id': n % USERS + 1,
+                                                    'project_id': n % projects + 1}),
+        'tasks': loaded(Task, ROWS // 2, lambda n: {'title': f'{words(2, 5)} {n}', 'description': words(8, 20),
+                                                   'status': 'Not Started', 'due_date': date(2023, 5, 12), 'priority': 1,
+                                                   'assigned_to_user_id': n % USERS + 1, 'project_id': n % projects + 1}),
+        'chat_messages': loaded(Chat_Message, ROWS * 2 // 5, lambda n: {'message_text': words(4, 25),
+                                                                      'sender_user_id': n % USERS + 1,
+                                                                      'receiver_user_id': (n * 7) % USERS + 1}),
+    }
+    started = time.perf_counter()
+    result = app.test_cli_runner().invoke(args=['rebuild-search'])
+    assert result.exit_code == 0, result.output
+    rebuild_seconds = round(time.perf_counter() - started, 1)
+
+    client = app.test_client()
+    queries = {
+        'top_word': f'q={TOP}',
+        'common_word': f'q={COMMON}',
+        'mid_word': f'q={MID}',
+        'rare_word': f'q={RARE}',
+        'two_words': f'q={COMMON} {MID}',
+        'prefix': f'q={MID[:3]}*',
+        'tasks_only': f'q={MID}&types=tasks',
+        'deep_page': f'q={COMMON}&offset=5000',
+    }
+    latencies = {}
+    for name, query in queries.items():
+        response = client.get(f'/search?{query}&limit=20')
+        assert response.status_code == 200, response.get_json()
+        latencies[name] = dict(timed(lambda n: client.get(f'/search?{query}&limit=20'), REPEAT),
+                               matches_on_page=len(response.get_json()))
+    with app.test_request_context():
+        substring_scan = {name: timed(lambda n: search.substring_hits(list(search.SEARCHED), [word], 20, 0), 3)
+                          for name, word in (('top_word', TOP), ('rare_word', RARE))}
+
+    def full_download(n):
+        client.get('/tasks?stream=1').get_data()
+
+print(json.dumps({
+    'rows': {'tasks': ROWS // 2, 'chat_messages': ROWS * 2 // 5, 'files': ROWS // 10, 'projects': projects},
+    'bulk_load_rows_per_sec': rows_per_sec,
+    'rebuild_seconds': rebuild_seconds,
+    'search': latencies,
+    'substring_scan': substring_scan,
+    'download_tasks_to_filter': timed(full_download, 3),
+}, indent=2))
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# Per-row to_dict() cost: compiled serializer vs sqlalchemy_serializer's
+# SerializerMixin, on the same loaded Task rows. Also checks the two agree.
+#   python benchmarks/serializer.py 20000
+import sys
+import json
+import time
+from datetime import date
+
+from sqlalchemy_serializer import SerializerMixin
+
+from common import app, bulk_fill, fresh_database
+from models import User, Team, Project, Task
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+def per_row_us(fn, rows):
+    start = time.perf_counter()
+    for row in rows:
+        fn(row)
+    return round((time.perf_counter() - start) / len(rows) * 1e6, 2)
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, ROWS, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 1, lambda n: {'name': f'team{n}', 'description': 'seeded', 'created_by_user_id': 1})
+    bulk_fill(Project, 1, lambda n: {'title': f'project{n}', 'description': 'seeded', 'status': 'In Progress',
+                                     'start_date': date(2023, 1, 1), 'end_date': date(2023, 12, 31), 'team_id': 1})
+    bulk_fill(Task, ROWS, lambda n: {'title': f'task{n}', 'description': 'seeded', 'status': 'In Progress',
+                                     'due_date': date(2023, 5, 12), 'priority': 1, 'assigned_to_user_id': 1, 'project_id': 1})
+    results = {'rows': ROWS}
+    for model in (Task, User):
+        rows = model.query.all()
+        for row in rows[:100]:
+            assert row.to_dict() == SerializerMixin.to_dict(row), model.__name__
+        mixin = per_row_us(lambda row: SerializerMixin.to_dict(row), rows)
+        compiled = per_row_us(lambda row: row.to_dict(), rows)
+        results[model.__name__] = {
+            'serializer_mixin_us_per_row': mixin,
+            'compiled_us_per_row': compiled,
+            'speedup': round(mixin / compiled, 1),
+        }
+    print(json.dumps(results, indent=2))
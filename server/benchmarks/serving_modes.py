@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# Serves one seeded SQLite file with gunicorn in each SERVER_MODE (see
+# gunicorn.conf.py) at the same number of processes, and drives it over real
+# HTTP: CLIENTS keep-alive connections issue a mix of record reads, page
+# reads and logins (bcrypt) for SECONDS, while STREAMS chat event streams
+# stay open the whole time, as browser tabs would. Reports throughput,
+# latency percentiles, logins turned away with 503 (see passwords.py) and
+# other failed or timed-out requests per mode.
+#   python benchmarks/serving_modes.py --workers 1 --clients 32 --streams 4 --seconds 15
+# More than one worker needs a shared CHAT_BROKER for gthread and asgi (see
+# gunicorn.conf.py).
+# The asgi mode needs a2wsgi, uvicorn and uvicorn-worker installed.
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED = {'users': 1000, 'teams': 20, 'projects': 50, 'tasks': 20000, 'files': 1000, 'chat-messages': 20000}
+TIMEOUT = 10
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(port, deadline):
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'Server on port {port} did not come up')
+
+def hold_stream(port, user_id):
+    # Opens an event stream and reads it until the server goes away.
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        connection.request('GET', f'/users/{user_id}/events')
+        response = connection.getresponse()
+        while response.read1(1024):
+            pass
+    except (OSError, http.client.HTTPException):
+        pass
+
+def client(port, seconds, worker_id, samples, failures, shed):
+    rng = random.Random(worker_id)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        choice = rng.random()
+        if choice < 0.1:
+            method, url, body = 'POST', '/login', json.dumps({'username': 'Admin', 'password': 'Admin'})
+        elif choice < 0.4:
+            method, url, body = 'GET', f"/tasks?limit=50&after_id={rng.randint(0, SEED['tasks'])}", None
+        else:
+            method, url, body = 'GET', f"/tasks/{rng.randint(1, SEED['tasks'])}", None
+        start = time.perf_counter()
+        try:
+            connection.request(method, url, body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.status == 503:
+                shed.append(url)
+            elif response.status >= 500:
+                failures.append(response.status)
+            else:
+                samples.append(time.perf_counter() - start)
+        except OSError:
+            failures.append('connection error')    # timed out, or dropped by a recycled worker
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT)
+
+def run(mode, database, args):
+    port = free_port()
+    env = dict(os.environ, SERVER_MODE=mode, PORT=str(port), WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads), DATABASE_URI=f'sqlite:///{database}', secret_key='benchmarks')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(SERVER, 'gunicorn.conf.py')],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port, time.time() + 30)
+        streams = [threading.Thread(target=hold_stream, args=(port, n + 1), daemon=True)
+                   for n in range(args.streams)]
+        for stream in streams:
+            stream.start()
+        time.sleep(0.5)
+        samples, failures, shed = [], [], []
+        clients = [threading.Thread(target=client, args=(port, args.seconds, n, samples, failures, shed))
+                   for n in range(args.clients)]
+        started = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    samples.sort()
+    pick = lambda fraction: round(samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000, 1) if samples else None
+    return {
+        'mode': mode,
+        'requests': len(samples),
+        'requests_per_sec': round(len(samples) / elapsed, 1),
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'shed_503': len(shed),
+        'failed': len(failures),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', default='sync,gthread,asgi')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=15)
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(prefix='syntax_bench_'), 'serving.db')
+    seed_args = [arg for key, value in SEED.items() for arg in (f'--{key}', str(value))]
+    subprocess.run([sys.executable, 'seed.py', '--database', database, *seed_args],
+                   cwd=SERVER, env=dict(os.environ, secret_key='benchmarks'), check=True, stdout=subprocess.DEVNULL)
+    print(json.dumps({
+        'workers': args.workers,
+        'threads': args.threads,
+        'clients': args.clients,
+        'open_streams': args.streams,
+        'seconds': args.seconds,
+        'runs': [run(mode, database, args) for mode in args.modes.split(',')],
+    }, indent=2))
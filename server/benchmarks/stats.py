@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# GET /stats from the summary tables against the live GROUP BY queries and
+# against what the dashboard does today (download every task and file with
+# ?stream=1 and count client side), at growing table sizes. Before timing,
+# a mix of API, bulk and Core writes (creates, moves between statuses,
+# users, projects and due dates, deletes) goes through, and the script exits
+# non-zero if the summaries then disagree with the live counts. Also reports
+# the bulk load rate of tasks with and without the summary triggers.
+#   python benchmarks/stats.py 100000,1000000
+import sys
+import json
+import time
+from collections import Counter
+from itertools import count
+from datetime import date, timedelta
+
+from sqlalchemy import delete, text, update
+
+from common import app, bulk_fill, fresh_database, timed
+from models import db, User, Project, Task, File
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000').split(',')]
+USERS = 1000
+REPEAT = 20
+STATUSES = ['Not Started', 'In Progress', 'Complete']
+FILE_TYPES = ['jpeg', 'txt', 'mp4', 'mp3', 'doc', 'js', 'py', 'sql']
+AS_OF = '2024-01-01'
+START = date(2023, 1, 1)
+serial = count(1)    # titles stay unique after deletes shift the fill counts
+
+def task(n):
+    return {'title': f'task {next(serial)}', 'status': STATUSES[n % 3],
+            'due_date': START + timedelta(days=n % 730), 'priority': 1, 'assigned_to_user_id': n % USERS + 1 if n % 50 else None,
+            'project_id': n % projects + 1 if n % 40 else None}
+
+def file(n):
+    return {'filename': f'file {next(serial)}', 'file_type': FILE_TYPES[n % len(FILE_TYPES)], 'size': n % 500 + 1,
+            'uploaded_by_user_id': n % USERS + 1, 'project_id': n % projects + 1 if n % 40 else None}
+
+def write_mix(client, size):
+    created = [client.post('/tasks', json={'title': f'new task {next(serial)}', 'description': 'new', 'priority': 2,
+                                           'status': 'Not Started', 'due_date': '2023-02-01',
+                                           'assigned_to_user_id': 3, 'project_id': 1}).get_json()['id']
+               for n in range(20)]
+    for id in created[:10]:
+        client.patch(f'/tasks/{id}', json={'status': 'Complete', 'project_id': 2, 'assigned_to_user_id': 4})
+    for id in created[10:15]:
+        client.delete(f'/tasks/{id}')
+    client.patch('/tasks/bulk', json=[{'id': id, 'due_date': '2025-01-01', 'status': 'In Progress'}
+                                      for id in range(1, size, size // 50)])
+    client.delete('/tasks/bulk', json=list(range(2, size, size // 20)))
+    client.post('/files', json={'filename': f'new file {next(serial)}', 'description': 'new', 'file_type': 'pdf',
+                                'size': 7, 'date_uploaded': None, 'uploaded_by_user_id': 1, 'project_id': 1})
+    client.patch('/files/1', json={'size': 999, 'file_type': 'txt'})
+    db.session.execute(update(File).where(File.id < 100).values(project_id=3))
+    db.session.execute(delete(File).where(File.id.between(100, 120)))
+    db.session.commit()
+
+def client_side(client):
+    # A lower bound: the dashboard also needs the owners, which the task and
+    # file records don't carry.
+    tasks = [json.loads(line) for line in client.get('/tasks?stream=1').get_data().splitlines()]
+    files = [json.loads(line) for line in client.get('/files?stream=1').get_data().splitlines()]
+    Counter(task['status'] for task in tasks)
+    Counter(task['due_date'] for task in tasks if task['status'] != 'Complete' and task['due_date'] < AS_OF)
+    Counter(file['file_type'] for file in files)
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, USERS, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    projects = max(max(SIZES) // 1000, 10)
+    bulk_fill(Project, projects, lambda n: {'title': f'project {n}', 'status': 'Complete', 'start_date': date(2023, 1, 1),
+                                            'end_date': date(2023, 12, 31)})
+    client = app.test_client()
+    results, mismatches = [], []
+    for size in SIZES:
+        started = time.perf_counter()
+        bulk_fill(Task, size, task)
+        bulk_fill(File, size // 10, file)
+        load_seconds = time.perf_counter() - started
+        write_mix(client, size)
+
+        responses = {}
+        for source in ('summary', 'live'):
+            app.config['STATS_SOURCE'] = source
+            responses[source] = client.get(f'/stats?as_of={AS_OF}').get_json()
+        if responses['summary'] != responses['live']:
+            mismatches.append(size)
+        def dashboard(source):
+            app.config['STATS_SOURCE'] = source
+            return timed(lambda n: client.get(f'/stats?as_of={AS_OF}'), REPEAT)
+        results.append({
+            'tasks': size,
+            'files': size // 10,
+            'load_rows_per_sec': round(size * 1.1 / load_seconds),
+            'summary': dashboard('summary'),
+            'live': dashboard('live'),
+            'client_side': timed(lambda n: client_side(client), 3),
+            'summaries_match_live': responses['summary'] == responses['live'],
+        })
+        app.config['STATS_SOURCE'] = 'summary'
+
+    # Load rate of one more batch of tasks, with and then without the
+    # summary triggers (the search index triggers stay in both).
+    batch = 50000
+    def load_rate():
+        target = db.session.query(db.func.count(Task.id)).scalar() + batch
+        started = time.perf_counter()
+        bulk_fill(Task, target, task)
+        return round(batch / (time.perf_counter() - started))
+    timings = {'with_summary_triggers': load_rate()}
+    for operation in ('insert', 'update', 'delete'):
+        db.session.execute(text(f'DROP TRIGGER tasks_stats_{operation}'))
+    db.session.commit()
+    timings['without_summary_triggers'] = load_rate()
+
+print(json.dumps({'runs': results, 'task_load_rows_per_sec': timings, 'mismatches': mismatches}, indent=2))
+sys.exit(1 if mismatches else 0)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Streams GET /files?stream=1 over a large table and checks peak RSS stays
+# under a fixed ceiling. Exits non-zero if the ceiling is exceeded.
+#   python benchmarks/stream_export.py 500000 [ceiling_mb]
+import sys
+import json
+import time
+import resource
+from datetime import date
+
+from common import app, bulk_fill, fresh_database
+from models import User, Team, Project, File
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+CEILING_MB = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+def rss_mb():
+    # Current (not peak) RSS, so the cost of seeding doesn't hide the export.
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, 1, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 1, lambda n: {'name': f'team{n}', 'description': 'seeded', 'created_by_user_id': 1})
+    bulk_fill(Project, 1, lambda n: {'title': f'project{n}', 'description': 'seeded', 'status': 'In Progress',
+                                     'start_date': date(2023, 1, 1), 'end_date': date(2023, 12, 31), 'team_id': 1})
+    bulk_fill(File, ROWS, lambda n: {'filename': f'file{n}.txt', 'description': 'seeded file', 'file_type': 'txt',
+                                     'size': n, 'uploaded_by_user_id': 1, 'project_id': 1})
+    baseline = rss_mb()
+    peak = baseline
+    client = app.test_client()
+
+    start = time.perf_counter()
+    response = client.get('/files?stream=1', buffered=False)
+    lines = 0
+    for chunk in response.response:
+        lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+        if lines % 10000 == 0:
+            peak = max(peak, rss_mb())
+    elapsed = time.perf_counter() - start
+    growth = peak - baseline
+
+    print(json.dumps({
+        'rows': ROWS,
+        'streamed': lines,
+        'seconds': round(elapsed, 2),
+        'rows_per_sec': round(lines / elapsed),
+        'rss_growth_mb': round(growth, 1),
+        'ceiling_mb': CEILING_MB,
+    }, indent=2))
+    assert lines == ROWS, f'streamed {lines} of {ROWS} rows'
+    sys.exit(0 if growth <= CEILING_MB else 1)
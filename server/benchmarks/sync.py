@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# What a client refresh costs with GET /sync?since= against re-downloading the
+# collection, as the tasks table grows and the number of changes since the
+# client's cursor stays at CHANGES.
+#   python benchmarks/sync.py 10000,100000,1000000
+import sys
+import json
+from datetime import date
+
+from common import app, bulk_fill, fresh_database, timed
+from models import User, Team, Project, Task
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000').split(',')]
+CHANGES = 50
+REPEAT = 20
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, 10, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 1, lambda n: {'name': 'team', 'created_by_user_id': 1})
+    bulk_fill(Project, 1, lambda n: {'title': 'project', 'status': 'Complete', 'start_date': date(2023, 1, 1),
+                                     'end_date': date(2023, 12, 31), 'team_id': 1})
+    client = app.test_client()
+    results = []
+    for size in SIZES:
+        bulk_fill(Task, size, lambda n: {'title': f'task {n}', 'status': 'Not Started', 'due_date': date(2023, 5, 12),
+                                         'priority': 1, 'assigned_to_user_id': 1, 'project_id': 1})
+        cursor = client.get('/sync').get_json()['cursor']
+        for n in range(CHANGES):
+            client.patch(f'/tasks/{n * (size // CHANGES) + 1}', json={'status': 'Complete'})
+        body = client.get(f'/sync?since={cursor}').get_json()
+        assert len(body['changes']['tasks']['upserted']) == CHANGES, body
+        results.append({
+            'tasks': size,
+            'changes': CHANGES,
+            'sync': timed(lambda n: client.get(f'/sync?since={cursor}'), REPEAT),
+            'full_reload': timed(lambda n: client.get('/tasks?stream=1').get_data(), 3),
+        })
+    print(json.dumps(results, indent=2))
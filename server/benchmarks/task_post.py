@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# POST /tasks latency as the tasks table grows. Uniqueness and FK checks should
+# be index probes, so the numbers should stay flat from 1k to 1M rows.
+#   python benchmarks/task_post.py 1000 10000 100000 1000000
+import sys
+import json
+from datetime import date
+
+from common import app, db, fresh_database, bulk_fill, timed
+from models import User, Team, Project, Task
+
+SIZES = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+REPEAT = 200
+
+def task_row(n):
+    return {
+        'title': f'seed task {n}',
+        'description': 'seeded',
+        'status': 'In Progress',
+        'due_date': date(2023, 5, 12),
+        'priority': 1,
+        'assigned_to_user_id': 1,
+        'project_id': 1,
+    }
+
+with app.app_context():
+    fresh_database()
+    bulk_fill(User, 1, lambda n: {'username': f'user{n}', 'email': f'user{n}@example.com', '_password_hash': 'x'})
+    bulk_fill(Team, 1, lambda n: {'name': f'team{n}', 'description': 'seeded', 'created_by_user_id': 1})
+    bulk_fill(Project, 1, lambda n: {'title': f'project{n}', 'description': 'seeded', 'status': 'In Progress',
+                                     'start_date': date(2023, 1, 1), 'end_date': date(2023, 12, 31), 'team_id': 1})
+    client = app.test_client()
+    results = []
+    for size in SIZES:
+        bulk_fill(Task, size, task_row)
+
+        def post(n):
+            response = client.post('/tasks', json={
+                'title': f'bench {size} {n}',
+                'description': 'bench',
+                'status': 'In Progress',
+                'due_date': '2023-05-12',
+                'priority': 1,
+                'assigned_to_user_id': 1,
+                'project_id': 1,
+            })
+            assert response.status_code == 201, response.get_json()
+
+        results.append({'rows': size, **timed(post, REPEAT)})
+        # Drop the benchmark's own rows so the next size starts from `size`.
+        Task.query.filter(Task.title.like('bench %')).delete(synchronize_session=False)
+        db.session.commit()
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,86 @@
+import queue
+import threading
+from config import app
+
+# Publish/subscribe for pushing events to connected clients. Subscribers
+# listen on a named channel ("user:5") and get every message published to it
+# after they subscribed. CHAT_BROKER picks the implementation from BROKERS.
+#
+# LocalBroker only reaches subscribers in the same process, which is fine for
+# one gunicorn worker (with threads) or the dev server. With several worker
+# processes, add a broker that relays through a shared service (Redis pub/sub,
+# Postgres LISTEN/NOTIFY) with the same subscribe/unsubscribe/publish methods
+# and register it in BROKERS.
+
+class Subscription:
+    def __init__(self, channel, queue_size):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.closed = False
+        # Called from the publishing thread after each message (and when the
+        # subscription is closed), for subscribers waiting on an event loop
+        # rather than in get() (see asgi.py).
+        self.wakeup = None
+
+    def get(self, timeout):
+        # Next message, or None if nothing arrived within timeout seconds.
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def pending(self):
+        # Every message queued so far, without waiting.
+        messages = []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+class LocalBroker:
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, self.queue_size)
+        with self.lock:
+            self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.channels.get(subscription.channel, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.channels.pop(subscription.channel, None)
+
+    def publish(self, channel, message):
+        # Returns how many subscribers got the message. A subscriber whose
+        # queue is full has stopped reading; it is closed and dropped rather
+        # than letting it hold messages forever.
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        delivered = 0
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                subscription.closed = True
+                self.unsubscribe(subscription)
+            if subscription.wakeup:
+                subscription.wakeup()
+        return delivered
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.channels.values())
+
+BROKERS = {
+    'local': LocalBroker,
+}
+
+broker = BROKERS[app.config['CHAT_BROKER']](app.config['SSE_QUEUE_SIZE'])
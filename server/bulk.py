@@ -0,0 +1,235 @@
+from flask import request, jsonify, make_response
+from flask_restful import Resource
+from sqlalchemy import bindparam, insert, update, delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from config import app, db
+from validation import prime_unique, prime_existing, claim_unique, integrity_error_message, chunked
+from sync import record_changes, UPSERT, DELETE
+
+# Batch writes for sync workers. Each resource gets /<resource>/bulk with
+#   POST   [{...}, {...}]            create
+#   PATCH  [{"id": 1, ...}, ...]     update
+#   DELETE [1, 2, 3]                 delete
+# The whole batch is checked up front with one IN query per unique column and
+# per referenced table, which primes the request cache in validation.py so the
+# models' own @validates hooks run per item without touching the database.
+# Valid items are written with executemany in a single transaction; the
+# response lists a result per item in payload order. Core writes skip the
+# ORM's change tracking, so they log to the sync change log themselves.
+
+WRITE_ALIASES = {'password': 'password_hash'}
+PENDING = -1    # owner id for unique values claimed earlier in the batch
+
+def unique_columns(model):
+    return [column.key for column in model.__table__.columns if column.unique]
+
+def foreign_key_models(model):
+    models_by_table = {mapper.class_.__tablename__: mapper.class_ for mapper in db.Model.registry.mappers}
+    return {
+        column.key: models_by_table[foreign_key.column.table.name]
+        for column in model.__table__.columns
+        for foreign_key in column.foreign_keys
+    }
+
+def required_columns(model):
+    foreign_keys = foreign_key_models(model)
+    return [
+        column.key for column in model.__table__.columns
+        if not column.primary_key and (column.key in foreign_keys or (
+            not column.nullable and column.default is None and column.server_default is None))
+    ]
+
+def writable_keys(model):
+    keys = set(model.__table__.columns.keys()) - {'id'}
+    return keys | {alias for alias, target in WRITE_ALIASES.items() if target in model.__mapper__.all_orm_descriptors.keys()}
+
+def batch_values(items, key):
+    values = set()
+    for item in items:
+        value = item.get(key) if isinstance(item, dict) else None
+        if isinstance(value, (str, int)) and not isinstance(value, bool):
+            values.add(value)
+    return values
+
+def prime_batch(model, items):
+    for key in unique_columns(model):
+        prime_unique(model, key, batch_values(items, key))
+    for key, target in foreign_key_models(model).items():
+        ids = {value for value in batch_values(items, key) if str(value).isdigit()}
+        prime_existing(target, ids)
+
+def validated_values(model, record, id=None, creating=True):
+    # Runs the record through a throwaway instance so every @validates hook
+    # and hybrid setter applies exactly as in the single-record handlers.
+    if not isinstance(record, dict):
+        raise ValueError(f'{model.__name__} record must be an object')
+    unknown = set(record) - writable_keys(model) - {'id'}
+    if unknown:
+        raise ValueError(f"{model.__name__} has no field(s): {', '.join(sorted(unknown))}")
+    instance = model(id=id)
+    for key, value in record.items():
+        if key != 'id':
+            setattr(instance, WRITE_ALIASES.get(key, key), value)
+    state = instance.__dict__
+    if creating:
+        for key in required_columns(model):
+            if key not in state:
+                setattr(instance, key, None)    # let the validator word the error
+                name = next((alias for alias, target in WRITE_ALIASES.items() if key == f'_{target}'), key)
+                raise ValueError(f'{model.__name__} must have a {name}')
+    return {column.key: state[column.key] for column in model.__table__.columns
+            if column.key in state and column.key != 'id'}
+
+def group_by_keys(rows):
+    # executemany needs the same columns in every parameter set.
+    groups = {}
+    for index, values in rows:
+        groups.setdefault(tuple(sorted(values)), []).append((index, values))
+    return groups.values()
+
+def insert_many(table, rows):
+    # Returns the new ids in row order. SQLite can't promise RETURNING order
+    # for a multi-row insert, so SQLAlchemy would fall back to one INSERT per
+    # row; instead use a plain cursor.executemany and read the ids back. That
+    # is safe because the transaction holds SQLite's write lock from the first
+    # insert, so the newest len(rows) ids are exactly ours, in order.
+    if db.engine.dialect.name != 'sqlite':
+        statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return db.session.execute(statement, rows).scalars().all()
+    db.session.execute(insert(table), rows)
+    newest = select(table.c.id).order_by(table.c.id.desc()).limit(len(rows))
+    return sorted(db.session.execute(newest).scalars().all())
+
+def is_id(value):
+    # JSON true would otherwise pass as id 1.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def cascaded(model):
+    return [relationship for relationship in model.__mapper__.relationships if 'delete' in relationship.cascade]
+
+def cascade_loads(model):
+    # selectinload options for every collection a delete of model cascades
+    # to, nested down the cascade, so the children come in one IN query per
+    # relationship instead of one lazy load per instance.
+    return [selectinload(getattr(model, relationship.key)).options(*cascade_loads(relationship.mapper.class_))
+            for relationship in cascaded(model)]
+
+def payload():
+    items = request.get_json()
+    if not isinstance(items, list) or not items:
+        raise ValueError('Bulk payload must be a non-empty JSON array')
+    if len(items) > app.config['BULK_MAX_ITEMS']:
+        raise ValueError(f"Bulk payload is limited to {app.config['BULK_MAX_ITEMS']} items")
+    return items
+
+def bulk_response(results, success_status):
+    status = success_status if all(result['status'] < 400 for result in results) else 207
+    return make_response(jsonify(results), status)
+
+class BulkResource(Resource):
+    model = None
+
+    def post(self):
+        model = self.model
+        try:
+            items = payload()
+        except ValueError as e:
+            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+        prime_batch(model, items)
+        results = [None] * len(items)
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                values = validated_values(model, item)
+            except (ValueError, TypeError) as e:
+                results[index] = {'index': index, 'status': 422, 'errors': [e.__str__()]}
+                continue
+            for key in unique_columns(model):
+                if key in values:
+                    claim_unique(model, key, values[key], PENDING)
+            rows.append((index, values))
+        table = model.__table__
+        try:
+            for group in group_by_keys(rows):
+                ids = insert_many(table, [values for index, values in group])
+                record_changes(table.name, ids, UPSERT)
+                for (index, values), id in zip(group, ids):
+                    results[index] = {'index': index, 'status': 201, 'id': id}
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": [integrity_error_message(e)]}), 422)
+        return bulk_response(results, 201)
+
+    def patch(self):
+        model = self.model
+        try:
+            items = payload()
+        except ValueError as e:
+            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+        ids = {item.get('id') for item in items if isinstance(item, dict) and is_id(item.get('id'))}
+        found = prime_existing(model, ids)
+        prime_batch(model, items)
+        results = [None] * len(items)
+        rows = []
+        for index, item in enumerate(items):
+            id = item.get('id') if isinstance(item, dict) else None
+            if not is_id(id):
+                results[index] = {'index': index, 'status': 422, 'id': id,
+                                  'errors': [f'{model.__name__} id must be an integer']}
+                continue
+            if id not in found:
+                results[index] = {'index': index, 'status': 404, 'id': id,
+                                  'errors': [f'{model.__name__} Record not found']}
+                continue
+            try:
+                values = validated_values(model, item, id=id, creating=False)
+            except (ValueError, TypeError) as e:
+                results[index] = {'index': index, 'status': 422, 'id': id, 'errors': [e.__str__()]}
+                continue
+            for key in unique_columns(model):
+                if key in values:
+                    claim_unique(model, key, values[key], id)
+            rows.append((index, dict(values, _id=id)))
+        table = model.__table__
+        try:
+            for group in group_by_keys(rows):
+                statement = update(table).where(table.c.id == bindparam('_id'))
+                db.session.execute(statement, [values for index, values in group])
+                record_changes(table.name, [values['_id'] for index, values in group], UPSERT)
+                for index, values in group:
+                    results[index] = {'index': index, 'status': 200, 'id': values['_id']}
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            return make_response(jsonify({"errors": [integrity_error_message(e)]}), 422)
+        return bulk_response(results, 200)
+
+    def delete(self):
+        model = self.model
+        try:
+            items = payload()
+        except ValueError as e:
+            return make_response(jsonify({"errors": [e.__str__()]}), 422)
+        ids = [item.get('id') if isinstance(item, dict) else item for item in items]
+        found = prime_existing(model, {id for id in ids if is_id(id)})
+        if cascaded(model):
+            # Children are removed by the ORM cascades, so load the instances
+            # with their children up front and delete them.
+            for chunk in chunked(found):
+                for instance in model.query.filter(model.id.in_(chunk)).options(*cascade_loads(model)):
+                    db.session.delete(instance)
+        else:
+            for chunk in chunked(found):
+                db.session.execute(delete(model.__table__).where(model.__table__.c.id.in_(chunk)))
+            record_changes(model.__tablename__, found, DELETE)
+        db.session.commit()
+        results = [
+            {'index': index, 'status': 422, 'id': id, 'errors': [f'{model.__name__} id must be an integer']}
+            if not is_id(id) else
+            {'index': index, 'status': 200, 'id': id} if id in found else
+            {'index': index, 'status': 404, 'id': id, 'errors': [f'{model.__name__} Record not found']}
+            for index, id in enumerate(ids)
+        ]
+        return bulk_response(results, 200)
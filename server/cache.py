@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import app
+from sync import CHANGED_ROWS
+from includes import included_models
+from conditional import validators, not_modified
+
+# Response cache for read-mostly GETs. @cached(Model) goes on a Resource's
+# get(self) or get(self, id), outside @conditional(Model), and keeps the
+# finished response, keyed by the endpoint, the URL arguments, the query
+# string and the requested format.
+#
+# Entries are tagged with what they were built from: "<table>" for a
+# collection page and "<table>:<id>" for a record. Whenever a transaction
+# that touched tracked rows commits (the changes sync.py logs, whether from
+# the single-record handlers, the bulk endpoints or mark_read), the tags for
+# the table and for each touched record are invalidated. A collection entry
+# therefore goes on any write to its table, a record entry only on a write
+# to that record. Responses with ?include= are also tagged with every
+# included table. A response computed while an invalidation happened is not
+# stored, so a slow read can't put stale data back.
+#
+# Invalidation only reaches the cache of the process that committed, so a
+# hit is also checked against the change log before it is served: the
+# entry's ETag has to match the one conditional.py builds from the current
+# versions (the same index lookups a 304 costs). One that doesn't was
+# overtaken by a write in another worker; it is dropped and counted as
+# stale, and the request goes on as a miss. A hit that matches answers
+# If-None-Match and If-Modified-Since exactly as conditional.py does.
+#
+# The default backend is an in-process LRU bounded by entry count, total
+# bytes and a TTL, one per worker process; a shared backend (Redis) would
+# implement the same get/set/invalidate/discard_stale/generation/stats
+# methods and go in BACKENDS. Hit, miss, stale, eviction and invalidation
+# counts are served at GET /cache/stats.
+
+class LRUCache:
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()    # key -> (expires, size, tags, value)
+        self.tagged = {}                # tag -> set of keys
+        self.generations = {}           # tag -> invalidation count
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def generation(self, tags):
+        with self.lock:
+            return tuple(self.generations.get(tag, 0) for tag in tags)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counts['misses'] += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.counts['expirations'] += 1
+                self.counts['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counts['hits'] += 1
+            return entry[3]
+
+    def set(self, key, value, size, tags, generation):
+        with self.lock:
+            if tuple(self.generations.get(tag, 0) for tag in tags) != generation or size > self.max_bytes:
+                return
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (time.monotonic() + self.ttl, size, tags, value)
+            self.bytes += size
+            for tag in tags:
+                self.tagged.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.counts['evictions'] += 1
+
+    def invalidate(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+                for key in self.tagged.pop(tag, ()):
+                    if key in self.entries:
+                        self._drop(key)
+                        self.counts['invalidations'] += 1
+
+    def discard_stale(self, key):
+        # A hit that turned out to be out of date: dropped, and a miss after all.
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.counts['stale'] += 1
+            self.counts['hits'] -= 1
+            self.counts['misses'] += 1
+
+    def _drop(self, key):
+        expires, size, tags, value = self.entries.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counts['hits'] + self.counts['misses']
+            return dict(self.counts, entries=len(self.entries), bytes=self.bytes,
+                        hit_ratio=round(self.counts['hits'] / lookups, 4) if lookups else None)
+
+class NullCache:
+    # RESPONSE_CACHE=none: every lookup misses and nothing is kept.
+    def __init__(self, *args):
+        self.misses = 0
+
+    def generation(self, tags):
+        return ()
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value, size, tags, generation):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def discard_stale(self, key):
+        pass
+
+    def stats(self):
+        return {'hits': 0, 'misses': self.misses, 'stale': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0,
+                'entries': 0, 'bytes': 0, 'hit_ratio': None}
+
+BACKENDS = {
+    'lru': LRUCache,
+    'none': NullCache,
+}
+
+# Caches whose "<table>" and "<table>:<id>" tags are invalidated on commit.
+COMMIT_INVALIDATED = []
+
+def invalidated_on_commit(cache):
+    COMMIT_INVALIDATED.append(cache)
+    return cache
+
+response_cache = invalidated_on_commit(BACKENDS[app.config['RESPONSE_CACHE']](
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'], app.config['RESPONSE_CACHE_MAX_BYTES'], app.config['RESPONSE_CACHE_TTL']))
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed(session):
+    changed = session.info.pop(CHANGED_ROWS, None)
+    if changed:
+        tags = {tag for table_name, row_id in changed for tag in (table_name, f'{table_name}:{row_id}')}
+        for cache in COMMIT_INVALIDATED:
+            cache.invalidate(tags)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_rolled_back(session):
+    session.info.pop(CHANGED_ROWS, None)
+
+# Headers that belong to the cached representation; everything else (CORS,
+# query stats) is added per request by the after_request hooks as usual.
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'X-Next-After-Id')
+
+def cached(model):
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, **kwargs):
+            id = kwargs.get('id')
+            tags = (f'{model.__tablename__}:{id}',) if id is not None else (model.__tablename__,)
+            tags += tuple(sorted(included.__tablename__ for included in included_models(model, request.args)))
+            key = (request.endpoint, tuple(sorted(kwargs.items())), request.query_string,
+                   request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']))
+            hit = response_cache.get(key)
+            if hit is not None:
+                status, body, headers = hit
+                etag, last_modified, operation = validators(model, id)
+                if dict(headers).get('ETag') == f'"{etag}"':
+                    if not_modified(etag, last_modified, operation):
+                        return app.response_class(b'', 304, headers=headers)
+                    return app.response_class(body, status, headers=headers)
+                response_cache.discard_stale(key)
+            generation = response_cache.generation(tags)
+            response = get(self, **kwargs)
+            if response.status_code == 200 and not response.is_streamed:
+                body = response.get_data()
+                headers = [(name, value) for name, value in response.headers.items() if name in KEPT_HEADERS]
+                response_cache.set(key, (200, body, headers), len(body), tags, generation)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,154 @@
+import json
+import threading
+from flask import Response, request
+from werkzeug.exceptions import ServiceUnavailable
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from config import app, db
+from models import Chat_Message
+from serializer import row_serializer
+from broker import broker
+from validation import chunked
+
+# Pushes new chat messages to their receiver over Server-Sent Events, so
+# clients don't have to poll. GET /users/<id>/events is a text/event-stream
+# of "chat_message" events, one per message addressed to <id>, with the
+# message id as the SSE event id.
+#
+# Every committed Chat_Message insert is published, whichever handler made
+# it: inserts are collected per session as they flush and only published
+# once the transaction commits (dropped on rollback). Bulk inserts bypass the
+# ORM and call publish_created themselves.
+#
+# A client that reconnects with Last-Event-ID (browsers do this on their own)
+# first gets what it missed from the database, up to MAX_PAGE_SIZE messages;
+# past that it gets an "overflow" event and should reload through the
+# conversation endpoints.
+#
+# A stream served by the WSGI app holds a request thread for as long as it is
+# open, so at most SSE_MAX_STREAMS of them are kept per process (half the
+# request threads under gunicorn.conf.py); past that the request gets
+# TooManyStreams, a 503 with Retry-After, and the other requests keep their
+# threads. Under asgi.py the handler only opens the stream: it stores the
+# subscription under LOOP_HANDOFF in the ASGI scope and returns the opening
+# chunks, and the event loop sends the live events, so an idle stream holds
+# no thread and isn't counted.
+
+PENDING = 'chat_messages_to_publish'
+LOOP_HANDOFF = 'chat_events.handoff'
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+class TooManyStreams(ServiceUnavailable):
+    # flask_restful answers HTTPExceptions with their data as the body.
+    def __init__(self):
+        super().__init__('Too many open event streams, try again shortly', retry_after=5)
+        self.data = {'errors': [self.description]}
+
+stream_slots = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
+
+def channel(user_id):
+    return f'user:{user_id}'
+
+def publish(messages):
+    for message in messages:
+        broker.publish(channel(message['receiver_user_id']), message)
+
+@event.listens_for(Chat_Message, 'after_insert')
+def collect_chat_message(mapper, connection, target):
+    object_session(target).info.setdefault(PENDING, []).append(target.to_dict())
+
+@event.listens_for(Session, 'after_commit')
+def publish_committed(session):
+    publish(session.info.pop(PENDING, []))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_rolled_back(session):
+    session.info.pop(PENDING, None)
+
+def message_rows(query):
+    fields = Chat_Message._serialized_fields
+    serialize = row_serializer(Chat_Message, fields)
+    return [serialize(row) for row in db.session.execute(
+        query.with_only_columns(*[getattr(Chat_Message, field) for field in fields]))]
+
+def publish_created(results):
+    # For the bulk endpoint: publishes the rows its results list as created.
+    ids = [result['id'] for result in results if isinstance(results, list) and result.get('status') == 201]
+    if ids:
+        for chunk in chunked(ids):
+            publish(message_rows(select(Chat_Message.id).where(Chat_Message.id.in_(chunk)).order_by(Chat_Message.id)))
+
+def missed_messages(user_id, last_event_id):
+    query = (select(Chat_Message.id)
+             .where(Chat_Message.receiver_user_id == user_id, Chat_Message.id > last_event_id)
+             .order_by(Chat_Message.id).limit(app.config['MAX_PAGE_SIZE'] + 1))
+    return message_rows(query)
+
+def sse(event_name, data, id=None):
+    lines = [f'id: {id}'] if id is not None else []
+    lines += [f'event: {event_name}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+def live_chunk(message, replayed_up_to):
+    # What a stream sends for one subscription.get() result: a keepalive for
+    # None (the heartbeat ran out), nothing for a message the backlog sent.
+    if message is None:
+        return ': keepalive\n\n'
+    if message['id'] > replayed_up_to:
+        return sse('chat_message', message, message['id'])
+    return None
+
+def event_response(user_id, last_event_id=None):
+    # Subscribes before reading the backlog so nothing published in between
+    # is lost; live messages already sent from the backlog are skipped by
+    # id. The database work happens here, before the response starts, so an
+    # idle stream doesn't hold a pooled connection.
+    handoff = request.environ.get('asgi.scope', {}).get(LOOP_HANDOFF)
+    if handoff is None and not stream_slots.acquire(blocking=False):
+        raise TooManyStreams()
+    subscription = broker.subscribe(channel(user_id))
+    try:
+        missed = missed_messages(user_id, last_event_id) if last_event_id is not None else []
+    except BaseException:
+        broker.unsubscribe(subscription)
+        if handoff is None:
+            stream_slots.release()
+        raise
+    overflow = len(missed) > app.config['MAX_PAGE_SIZE']
+    missed = missed[:app.config['MAX_PAGE_SIZE']]
+    # Servers hold the headers back until the first chunk, so send one
+    # straight away or the client never sees the stream open.
+    opening = [': connected\n\n'] + [sse('chat_message', message, message['id']) for message in missed]
+    replayed_up_to = missed[-1]['id'] if missed else last_event_id or 0
+    if overflow:
+        opening.append(sse('overflow', {'last_event_id': replayed_up_to}))
+    if handoff is not None:
+        handoff.update(subscription=subscription, replayed_up_to=replayed_up_to)
+        # An iterator, not the list, or Werkzeug sets a Content-Length and
+        # the response ends after the opening chunks.
+        return Response(iter(opening), mimetype='text/event-stream', headers=STREAM_HEADERS)
+
+    heartbeat = app.config['SSE_HEARTBEAT_SECONDS']
+    closed = threading.Event()
+
+    def close():
+        broker.unsubscribe(subscription)
+        if not closed.is_set():
+            closed.set()
+            stream_slots.release()
+
+    def generate():
+        try:
+            yield from opening
+            while not subscription.closed:
+                chunk = live_chunk(subscription.get(heartbeat), replayed_up_to)
+                if chunk:
+                    yield chunk
+        finally:
+            close()
+
+    response = Response(generate(), mimetype='text/event-stream', headers=STREAM_HEADERS)
+    # The generator's finally doesn't run if the client goes away before the
+    # first chunk, so the response closes the stream too.
+    response.call_on_close(close)
+    return response
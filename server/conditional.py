@@ -0,0 +1,93 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import request, make_response
+from sqlalchemy import select
+from config import db
+from models import Change
+from sync import DELETE, RESET
+from includes import included_models
+
+# Conditional GETs. Every tracked write lands in the changes table (see
+# sync.py), so the newest change id for a table is that table's version and
+# the newest change id for one record is the record's version. Responses
+# carry a strong ETag built from that version plus, for collections, the
+# query string and requested format, and Last-Modified from the change's
+# timestamp. A request whose If-None-Match (or, without one,
+# If-Modified-Since) still matches gets a 304 after a single index lookup
+# on the changes table, before the record or the page is read.
+#
+# With ?include=, the version also carries the newest change of every
+# included table, so a new task changes the ETag of
+# /projects/1?include=tasks.
+#
+# Versions are change ids, which are never reused (see the Change model),
+# so a version names one state of the data for good. Reseeding logs a reset
+# change, and anything not written through the API since then takes the
+# reset's id as its version; that way a reseed can't hand out the ETag of
+# what was there before. Records nobody has written since the change log
+# started are at version 0 and have no Last-Modified yet.
+
+def newest(query):
+    row = db.session.execute(query.order_by(Change.id.desc()).limit(1)).first()
+    return tuple(row) if row else (0, None, None)
+
+def latest_change(model, id=None):
+    # Returns (version, changed_at, operation) of the newest change, or of
+    # the last reset if that is newer.
+    columns = select(Change.id, Change.changed_at, Change.operation)
+    query = columns.where(Change.table_name == model.__tablename__)
+    if id is not None:
+        query = query.where(Change.row_id == id)
+    reset = newest(columns.where(Change.table_name == Change.__tablename__, Change.operation == RESET))
+    return max(newest(query), reset, key=lambda change: change[0])
+
+def entity_tag(model, version, id=None):
+    if id is not None and not request.query_string:
+        return f'{model.__tablename__}-{id}-v{version}'
+    variant = f"{request.query_string.decode()}|{request.accept_mimetypes}"
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    if id is not None:
+        return f'{model.__tablename__}-{id}-v{version}-{digest}'
+    return f'{model.__tablename__}-v{version}-{digest}'
+
+def is_fresh(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+def validators(model, id=None):
+    # Returns (etag, last_modified, operation) for the current request, from
+    # the change log alone.
+    version, changed_at, operation = latest_change(model, id)
+    for included in sorted(included_models(model, request.args), key=lambda included: included.__tablename__):
+        included_version, included_changed_at, _ = latest_change(included)
+        version = f'{version}.{included_version}'
+        if included_changed_at and (changed_at is None or included_changed_at > changed_at):
+            changed_at = included_changed_at
+    last_modified = changed_at.replace(tzinfo=timezone.utc, microsecond=0) if changed_at else None
+    return entity_tag(model, version, id), last_modified, operation
+
+def not_modified(etag, last_modified, operation):
+    return operation != DELETE and is_fresh(etag, last_modified)
+
+def conditional(model):
+    # Decorator for a Resource's get(self) or get(self, id).
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, id=None, **kwargs):
+            etag, last_modified, operation = validators(model, id)
+            if not_modified(etag, last_modified, operation):
+                response = make_response('', 304)
+            else:
+                response = get(self, **kwargs) if id is None else get(self, id, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
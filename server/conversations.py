@@ -0,0 +1,109 @@
+from sqlalchemy import and_, func, select, tuple_, union_all, update
+from sqlalchemy.orm import aliased
+from config import app, db
+from models import User, Chat_Message
+from serializer import row_serializer
+from validation import chunked
+from sync import record_changes, UPSERT
+
+# Chat is read per conversation (the messages between two users) instead of
+# through GET /chat_messages, which walks every message in the system.
+#
+# Threads come newest first, paged with ?before_id=<last id seen>&limit=<n>.
+# The cursor is (message_date, id), so messages sharing a timestamp are never
+# skipped or repeated. Each direction of a thread is one range read on
+# ix_chat_messages_sender_user_id_receiver_user_id_message_date, stopped after
+# one page, and the two halves are merged in SQL; a page costs the same on a
+# ten-message thread as on a million-message one.
+#
+# The conversation list only reads the user's own messages, through the
+# sender and receiver indexes, and the unread counts only read the user's
+# unread messages (ix_chat_messages_receiver_user_id_read_at).
+
+def message_fields():
+    return Chat_Message._serialized_fields
+
+def thread_half(sender_id, receiver_id, before_id, limit):
+    fields = message_fields()
+    query = select(*[getattr(Chat_Message, field) for field in fields]).where(
+        Chat_Message.sender_user_id == sender_id,
+        Chat_Message.receiver_user_id == receiver_id,
+    )
+    if before_id is not None:
+        cursor = aliased(Chat_Message)
+        query = query.where(tuple_(Chat_Message.message_date, Chat_Message.id) <
+                            select(cursor.message_date, cursor.id).where(cursor.id == before_id).scalar_subquery())
+    return query.order_by(Chat_Message.message_date.desc(), Chat_Message.id.desc()).limit(limit)
+
+def thread_page(user_id, other_id, args):
+    # Returns (messages newest first, next_before_id). next_before_id is None
+    # on the last page.
+    limit = int(args.get('limit', app.config['PAGE_SIZE']))
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    limit = min(limit, app.config['MAX_PAGE_SIZE'])
+    before_id = int(args['before_id']) if args.get('before_id') else None
+    halves = [thread_half(user_id, other_id, before_id, limit)]
+    if other_id != user_id:
+        halves.append(thread_half(other_id, user_id, before_id, limit))
+    merged = union_all(*[half.subquery().select() for half in halves]).subquery()
+    query = select(merged).order_by(merged.c.message_date.desc(), merged.c.id.desc()).limit(limit)
+    rows = db.session.execute(query).all()
+    serialize = row_serializer(Chat_Message, message_fields())
+    messages = [serialize(row) for row in rows]
+    next_before_id = rows[-1].id if len(rows) == limit else None
+    return messages, next_before_id
+
+def conversations(user_id):
+    # One entry per user this user has exchanged messages with, most recent
+    # conversation first: the other user, the last message and how many
+    # messages from them are unread.
+    sent = select(Chat_Message.id, Chat_Message.message_date,
+                  Chat_Message.receiver_user_id.label('other_id')).where(Chat_Message.sender_user_id == user_id)
+    received = select(Chat_Message.id, Chat_Message.message_date,
+                      Chat_Message.sender_user_id.label('other_id')).where(Chat_Message.receiver_user_id == user_id)
+    mine = union_all(sent, received).subquery()
+    ranked = select(mine.c.id, mine.c.other_id, func.row_number().over(
+        partition_by=mine.c.other_id, order_by=(mine.c.message_date.desc(), mine.c.id.desc())).label('rank')).subquery()
+    last_ids = dict(db.session.execute(select(ranked.c.other_id, ranked.c.id).where(ranked.c.rank == 1)).all())
+    if not last_ids:
+        return []
+
+    unread = dict(db.session.execute(
+        select(Chat_Message.sender_user_id, func.count())
+        .where(Chat_Message.receiver_user_id == user_id, Chat_Message.read_at.is_(None))
+        .group_by(Chat_Message.sender_user_id)
+    ).all())
+    fields = message_fields()
+    serialize = row_serializer(Chat_Message, fields)
+    last_messages = {}
+    usernames = {}
+    for chunk in chunked(list(last_ids.values())):
+        for row in db.session.execute(select(*[getattr(Chat_Message, field) for field in fields])
+                                      .where(Chat_Message.id.in_(chunk))):
+            last_messages[row.id] = row
+    for chunk in chunked(list(last_ids)):
+        usernames.update(db.session.execute(select(User.id, User.username).where(User.id.in_(chunk))).all())
+
+    ordered = sorted(last_ids.items(), key=lambda item: (last_messages[item[1]].message_date, item[1]), reverse=True)
+    return [{
+        'user_id': other_id,
+        'username': usernames.get(other_id),
+        'last_message': serialize(last_messages[message_id]),
+        'unread_count': unread.get(other_id, 0),
+    } for other_id, message_id in ordered]
+
+def mark_read(user_id, other_id):
+    # Marks everything other_id has sent user_id as read; returns how many
+    # messages changed.
+    ids = db.session.execute(
+        update(Chat_Message)
+        .where(and_(Chat_Message.receiver_user_id == user_id, Chat_Message.sender_user_id == other_id,
+                    Chat_Message.read_at.is_(None)))
+        .values(read_at=func.now())
+        .returning(Chat_Message.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    record_changes(Chat_Message.__tablename__, ids, UPSERT)
+    db.session.commit()
+    return len(ids)
@@ -0,0 +1,43 @@
+from flask import g, session
+from config import app
+from models import User
+from listing import record_by_id
+from cache import LRUCache, invalidated_on_commit
+from conditional import latest_change
+
+# The logged-in user, for /check_session (called on every page load) and any
+# handler that needs it. current_user() resolves session['user_id'] at most
+# once per request and keeps the result on g (cleared before each request,
+# see config.REQUEST_STATE). Across requests the serialized record comes from
+# a small TTL cache, so a steady stream of session checks costs an index
+# lookup on the changes table rather than loading the user. Any committed
+# write to a user (PATCH or DELETE on /users/<id>, the bulk endpoint, signup)
+# drops that user's entry through the same commit hook as the response
+# cache; a write in another worker process is caught by that lookup, since
+# each entry keeps the user's change log version (see conditional.py) and
+# is only served while it is still current.
+
+user_cache = invalidated_on_commit(LRUCache(app.config['USER_CACHE_SIZE'], float('inf'), app.config['USER_CACHE_TTL']))
+
+def load_user(id):
+    tags = (f'{User.__tablename__}:{id}',)
+    version = latest_change(User, id)[0]
+    hit = user_cache.get(id)
+    if hit is not None:
+        if hit[0] == version:
+            return hit[1]
+        user_cache.discard_stale(id)
+    generation = user_cache.generation(tags)
+    user_dict = record_by_id(User, id)
+    if user_dict is not None:
+        user_cache.set(id, (version, user_dict), 0, tags, generation)    # bounded by count only
+    return user_dict
+
+def current_user():
+    # The serialized user the session belongs to, or None.
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = load_user(user_id) if user_id else None
+        if user_id and g.current_user is None:
+            app.logger.info('Session refers to user %s, who no longer exists', user_id)
+    return g.current_user
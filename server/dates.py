@@ -0,0 +1,77 @@
+from datetime import date, datetime
+from sqlalchemy import String, bindparam, inspect, select, text, type_coerce, update
+from sqlalchemy.types import Date
+from config import app, db
+from models import Project, Task, Calendar
+from validation import chunked
+
+# Project start/end dates, task due dates and calendar event dates used to
+# be free-form strings. They are Date columns now; the API takes and returns
+# "YYYY-MM-DD" as before, and the validators reject anything that isn't a
+# date.
+#
+# `flask migrate-dates` brings a database written before that up to date. It
+# reads every stored value as text, parses the formats that turn up in the
+# old data and rewrites each one as an ISO date, which SQLite compares and
+# indexes correctly as text. On Postgres the columns are then altered to
+# DATE. If any value can't be parsed nothing is changed and the offending
+# rows are listed, to be fixed by hand first.
+
+DATE_COLUMNS = [Project.start_date, Project.end_date, Task.due_date, Calendar.event_date]
+# Tried in order after ISO; day-first formats are left out on purpose, since
+# 03/04/2023 is read month first.
+FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y')
+
+def parse_stored_date(value):
+    # Returns the date a stored value stands for, or None if it can't tell.
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        pass
+    for format in FORMATS:
+        try:
+            return datetime.strptime(value, format).date()
+        except ValueError:
+            pass
+    return None
+
+@app.cli.command('migrate-dates')
+def migrate_dates():
+    rewrites, unparsed = {}, []
+    for column in DATE_COLUMNS:
+        table = column.class_.__table__
+        raw = type_coerce(table.c[column.key], String)
+        changes = []
+        for id, value in db.session.execute(select(table.c.id, raw)):
+            parsed = parse_stored_date(value)
+            if parsed is None:
+                unparsed.append(f'{table.name}.{column.key} id {id}: {value!r}')
+            elif isinstance(value, str) and value != parsed.isoformat():
+                changes.append({'_id': id, 'value': parsed.isoformat()})
+        rewrites[column] = changes
+    if unparsed:
+        print(f'{len(unparsed)} values are not dates; fix them and run again:')
+        print('\n'.join(unparsed[:100]))
+        raise SystemExit(1)
+
+    for column, changes in rewrites.items():
+        table = column.class_.__table__
+        statement = (update(table).where(table.c.id == bindparam('_id'))
+                     .values({column.key: type_coerce(bindparam('value'), String)}))
+        for chunk in chunked(changes):
+            db.session.execute(statement, chunk)
+        print(f'{table.name}.{column.key}: rewrote {len(changes)} values')
+    if db.engine.dialect.name == 'postgresql':
+        for column in DATE_COLUMNS:
+            table_name = column.class_.__tablename__
+            stored = {info['name']: info['type'] for info in inspect(db.session.connection()).get_columns(table_name)}
+            if not isinstance(stored[column.key], Date):
+                db.session.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN {column.key} '
+                                        f'TYPE DATE USING {column.key}::date'))
+                print(f'{table_name}.{column.key}: altered to DATE')
+    db.session.commit()
@@ -0,0 +1,73 @@
+# gunicorn settings. From the repo root:
+#   gunicorn -c server/gunicorn.conf.py
+# SERVER_MODE picks how each worker process serves requests:
+#   gthread  (default) GUNICORN_THREADS threads per process. Slow requests
+#            (bcrypt, a SQLite lock wait, an open event stream) hold a thread,
+#            not the whole process; event streams may take half the threads.
+#   asgi     uvicorn workers running asgi.py: an event loop for the sockets
+#            (idle event streams included) and GUNICORN_THREADS threads for
+#            the Flask app. Needs a2wsgi, uvicorn and uvicorn-worker.
+#   sync     one request at a time per process, like the old
+#            `gunicorn --chdir server app:app`. Chat event streams are turned
+#            away with a 503 here, as each would take a process for good.
+# WEB_CONCURRENCY sets the number of processes and PORT the port, as hosts
+# like Render expect.
+#
+# The default chat broker (CHAT_BROKER=local, see broker.py) only reaches
+# event streams in its own process, so a message POSTed to one worker would
+# never get to the streams another holds. With it, gthread and asgi run a
+# single process (which holds thousands of idle streams under asgi) and a
+# WEB_CONCURRENCY above 1 is refused; sync workers serve no streams, so they
+# keep their count.
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()   # the same .env config.py reads, for CHAT_BROKER
+
+mode = os.environ.get('SERVER_MODE', 'gthread')
+cpus = multiprocessing.cpu_count()
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = f"0.0.0.0:{os.environ.get('PORT', 5555)}"
+wsgi_app = 'app:app'
+
+if mode == 'sync':
+    worker_class = 'sync'
+    workers = 2 * cpus + 1
+    threads = 1
+elif mode == 'gthread':
+    worker_class = 'gthread'
+    workers = cpus + 1
+elif mode == 'asgi':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    workers = cpus + 1
+    wsgi_app = 'asgi:asgi_app'
+    os.environ.setdefault('ASGI_THREADS', str(threads))
+else:
+    raise SystemExit(f"SERVER_MODE must be sync, gthread or asgi, not {mode!r}")
+
+# Every thread may need a database connection at once (see config.py), and
+# event streams held on threads leave the other half for everything else.
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+os.environ.setdefault('SSE_MAX_STREAMS', str(threads // 2))
+
+serves_streams = mode == 'asgi' or int(os.environ['SSE_MAX_STREAMS']) > 0
+if os.environ.get('CHAT_BROKER', 'local') == 'local' and serves_streams:
+    if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+        raise SystemExit('CHAT_BROKER=local only reaches event streams in its own process, so it needs '
+                         'WEB_CONCURRENCY=1; register a broker shared between processes (see broker.py) '
+                         'to run more workers')
+    workers = 1
+workers = int(os.environ.get('WEB_CONCURRENCY', workers))
+
+# Keep idle client connections open for a few seconds, and recycle each
+# worker after a while (jittered so they don't all restart together) to cap
+# slow leaks. Event streams on a recycled worker reconnect with Last-Event-ID.
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')    # e.g. "-" for stdout
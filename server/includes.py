@@ -0,0 +1,126 @@
+from sqlalchemy import func, select
+from config import app, db
+from serializer import row_serializer
+from validation import chunked
+
+# Related records in the same response: ?include=tasks,files,team on a record
+# or collection GET adds them under the relationship's name, and dotted paths
+# go further down (?include=team.projects), up to INCLUDE_MAX_DEPTH levels.
+# Any relationship on the model can be named, e.g. tasks/files on a project,
+# team on a project, tasks on a user, user or project on a task.
+#
+# Each relationship path costs one query however many records it is loaded
+# for (more only past IN_CHUNK parents): the children of every parent on the
+# page come back together, the way selectinload fetches them, but as plain
+# column rows like the rest of the read path. Lists are paged per parent with
+# <path>.limit (default PAGE_SIZE) and <path>.after_id, and each parent gets
+# "<name>_next_after_id" (None on the last page), e.g.
+#   GET /projects/1?include=tasks&tasks.limit=20&tasks.after_id=340
+
+PAGE_ARGS = ('limit', 'after_id')
+
+def include_tree(model, args):
+    # Parses ?include= into {name: {name: ...}}, checking every name against
+    # the relationships of the model it hangs off, and the depth.
+    tree = {}
+    paths = [path.strip() for path in args.get('include', '').split(',') if path.strip()]
+    for path in paths:
+        names = path.split('.')
+        if len(names) > app.config['INCLUDE_MAX_DEPTH']:
+            raise ValueError(f"include {path} is more than {app.config['INCLUDE_MAX_DEPTH']} levels deep")
+        current, node = model, tree
+        for name in names:
+            relationship = current.__mapper__.relationships.get(name)
+            if relationship is None or relationship.mapper.class_._serialized_fields is None:
+                raise ValueError(f'{current.__name__} has no relationship {name} to include')
+            current, node = relationship.mapper.class_, node.setdefault(name, {})
+    included = {prefix for path in paths for prefix in prefixes(path)}
+    for arg in args:
+        path, _, option = arg.rpartition('.')
+        if path and (option not in PAGE_ARGS or path not in included):
+            raise ValueError(f'{arg} does not match an included relationship')
+    return tree
+
+def prefixes(path):
+    names = path.split('.')
+    return ['.'.join(names[:end]) for end in range(1, len(names) + 1)]
+
+def included_models(model, args):
+    # Every model ?include= reads from, for cache keys and ETags; empty when
+    # the include is invalid (the GET itself reports that).
+    try:
+        tree = include_tree(model, args)
+    except ValueError:
+        return set()
+    models = set()
+    def walk(current, node):
+        for name, subtree in node.items():
+            target = current.__mapper__.relationships[name].mapper.class_
+            models.add(target)
+            walk(target, subtree)
+    walk(model, tree)
+    return models
+
+def nested_page(args, path):
+    limit = int(args.get(f'{path}.limit', app.config['PAGE_SIZE']))
+    if limit < 1:
+        raise ValueError(f'{path}.limit must be at least 1')
+    after_id = args.get(f'{path}.after_id')
+    return min(limit, app.config['MAX_PAGE_SIZE']), int(after_id) if after_id else None
+
+def attach_includes(model, records, args, tree=None, prefix=''):
+    # Adds the included relationships to the serialized records in place.
+    if tree is None:
+        tree = include_tree(model, args)
+    if not tree or not records:
+        return records
+    by_id = {record['id']: record for record in records}
+    for name, subtree in tree.items():
+        relationship = model.__mapper__.relationships[name]
+        target = relationship.mapper.class_
+        fields = target._serialized_fields
+        serialize = row_serializer(target, fields)
+        columns = [getattr(target, field) for field in fields] + [model.id.label('include_parent')]
+        path = prefix + name
+        children = []
+        if relationship.uselist:
+            limit, after_id = nested_page(args, path)
+            for record in records:
+                record[name], record[f'{name}_next_after_id'] = [], None
+            for chunk in chunked(by_id):
+                query = select(*columns).select_from(model).join(getattr(model, name)).where(model.id.in_(chunk))
+                if after_id is not None:
+                    query = query.where(target.id > after_id)
+                if len(chunk) == 1:
+                    # One parent: a plain LIMIT reads just the page.
+                    query = query.order_by(target.id).limit(limit + 1)
+                else:
+                    # Several: number each parent's children and keep the
+                    # first limit + 1 of each.
+                    rank = func.row_number().over(partition_by=model.id, order_by=target.id).label('include_rank')
+                    ranked = query.add_columns(rank).subquery()
+                    query = (select(*[column for column in ranked.c if column.name != 'include_rank'])
+                             .where(ranked.c.include_rank <= limit + 1)
+                             .order_by(ranked.c.include_parent, ranked.c.id))
+                for row in db.session.execute(query):
+                    parent = by_id[row.include_parent]
+                    if len(parent[name]) == limit:
+                        parent[f'{name}_next_after_id'] = parent[name][-1]['id']
+                        continue
+                    child = serialize(row)
+                    parent[name].append(child)
+                    children.append(child)
+        else:
+            # Parents sharing a target (projects of one team) share its dict,
+            # so its own includes are loaded once.
+            shared = {}
+            for record in records:
+                record[name] = None
+            for chunk in chunked(by_id):
+                query = select(*columns).select_from(model).join(getattr(model, name)).where(model.id.in_(chunk))
+                for row in db.session.execute(query):
+                    by_id[row.include_parent][name] = shared.setdefault(row.id, serialize(row))
+            children = list(shared.values())
+        if subtree:
+            attach_includes(target, children, args, subtree, path + '.')
+    return records
@@ -0,0 +1,136 @@
+import json
+from datetime import date, datetime
+from config import app, db
+from serializer import row_serializer
+from includes import attach_includes
+
+# Collection GETs are paged by primary key: ?after_id=<last id seen>&limit=<n>.
+# Filters use the column name for equality and a suffix for ranges
+# (?due_date__gte=2023-01-01&due_date__lt=2023-02-01), and only columns listed
+# in a model's filter_fields are accepted. Those are the columns an index
+# leads with: a selective filter on any other column would walk the whole
+# table in id order looking for a page. ?fields=id,title selects just those
+# columns in SQL; id is always selected because it is the cursor.
+#
+# Reads select just the serialized columns and build dicts straight from the
+# Row tuples, so no ORM instances (identity map, validators, backrefs) are
+# created for data that goes straight back out as JSON. Models whose
+# serializer couldn't be compiled fall back to loading instances.
+#
+# Exports skip paging: ?stream=1 (or Accept: application/x-ndjson) walks the
+# whole filtered table in STREAM_BATCH sized fetches and writes one JSON object
+# per line, so memory stays flat however many rows match. Rows come in id
+# order, so an interrupted export resumes with ?after_id=<last id received>.
+#
+# ?include= adds related records to record and page reads (see includes.py);
+# its per-relationship paging arguments are the dotted ones.
+
+RANGE_OPERATORS = {
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+}
+RESERVED_ARGS = ('after_id', 'limit', 'fields', 'stream', 'include')
+STREAM_BATCH = 1000
+
+def coerce(column, value):
+    python_type = column.type.python_type
+    if python_type is bool:
+        if value.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError(f'{column.key} must be true or false')
+        return value.lower() in ('true', '1')
+    if python_type is int:
+        return int(value)
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+def page_size(args):
+    limit = int(args.get('limit', app.config['PAGE_SIZE']))
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, app.config['MAX_PAGE_SIZE'])
+
+def requested_fields(model, args):
+    if not args.get('fields'):
+        return None
+    fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field not in model.serialize_only]
+    if unknown:
+        raise ValueError(f"Unknown fields for {model.__name__}: {', '.join(unknown)}")
+    if args.get('include') and 'id' not in fields:
+        fields.insert(0, 'id')      # included records are matched to their parent by id
+    return fields
+
+def apply_filters(model, query, args):
+    for arg, value in args.items():
+        if arg in RESERVED_ARGS or '.' in arg:
+            continue
+        name, _, operator = arg.partition('__')
+        if name not in model.filter_fields or (operator and operator not in RANGE_OPERATORS):
+            raise ValueError(f'{model.__name__} cannot be filtered by {arg}')
+        column = getattr(model, name)
+        value = coerce(column, value)
+        query = query.filter(RANGE_OPERATORS[operator](column, value) if operator else column == value)
+    return query
+
+def read_fields(model, args):
+    return requested_fields(model, args) or model._serialized_fields
+
+def column_query(model, fields):
+    columns = [model.id] + [getattr(model, field) for field in fields if field != 'id']
+    return db.session.query(*columns)
+
+def record_by_id(model, id, args=None):
+    # Returns the serialized record, or None if there is no such row. args
+    # (the request's) may ask for related records with ?include=.
+    fields = model._serialized_fields
+    if not fields:
+        found = model.query.filter(model.id == id).first()
+        return found.to_dict() if found else None
+    row = column_query(model, fields).filter(model.id == id).first()
+    if not row:
+        return None
+    record = row_serializer(model, fields)(row)
+    if args:
+        attach_includes(model, [record], args)
+    return record
+
+def collection_page(model, args):
+    # Returns (records, next_after_id). next_after_id is None on the last page.
+    limit = page_size(args)
+    fields = read_fields(model, args)
+    query = column_query(model, fields) if fields else model.query
+    query = apply_filters(model, query, args)
+    if args.get('after_id'):
+        query = query.filter(model.id > int(args['after_id']))
+    rows = query.order_by(model.id).limit(limit).all()
+    if fields:
+        serialize = row_serializer(model, tuple(fields))
+        records = [serialize(row) for row in rows]
+    else:
+        records = [row.to_dict() for row in rows]
+    attach_includes(model, records, args)
+    next_after_id = rows[-1].id if len(rows) == limit else None
+    return records, next_after_id
+
+def stream_records(model, args):
+    # Validates up front so bad parameters still get a 422 instead of a
+    # half-written stream; the returned generator does the fetching.
+    if args.get('include'):
+        raise ValueError('include is not supported when streaming')
+    fields = read_fields(model, args) or model.serialize_only
+    query = apply_filters(model, column_query(model, fields), args)
+    if args.get('after_id'):
+        query = query.filter(model.id > int(args['after_id']))
+    query = query.order_by(model.id).execution_options(yield_per=STREAM_BATCH)
+
+    serialize = row_serializer(model, tuple(fields))
+
+    def generate():
+        for row in query:
+            yield json.dumps(serialize(row)) + '\n'
+    return generate()
@@ -1,8 +1,10 @@
 from sqlalchemy.orm import validates, backref, relationship
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy_serializer import SerializerMixin
+from serializer import FastSerializerMixin, compile_serializers
 from sqlalchemy.ext.hybrid import hybrid_property
-from config import bcrypt,db
+from config import db
+from passwords import hash_password, check_password, needs_rehash
+from validation import ensure_unique, ensure_exists, ensure_date
 
 # class SerializerMixin:
 #     def to_dict(self, max_depth=1, current_depth=0):
@@ -22,11 +24,12 @@ from config import bcrypt,db
 
 ###############################################################
 
-class User(db.Model, SerializerMixin):
+class User(db.Model, FastSerializerMixin):
     __tablename__ = 'users'
 
     serialize_only = ('id', 'username', 'email', '_password_hash', 'date_created', 'last_login', 'is_active', 'is_admin')
     serialize_rules = ('-tasks.user', '-files.user', '-teams.user', '-calendars.user', '-sent_messages.user','-recieved_messages.user',)
+    filter_fields = ('username',)
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String, unique=True, nullable=False)
@@ -58,22 +61,22 @@ class User(db.Model, SerializerMixin):
 
     @password_hash.setter
     def password_hash(self, password):
-        password_hash = bcrypt.generate_password_hash(
-            password.encode('utf-8')) 
-        self._password_hash = password_hash.decode('utf-8')
+        self._password_hash = hash_password(password)
 
     def authenticate(self, password):
-        return bcrypt.check_password_hash(
-            self._password_hash, password.encode('utf-8'))
+        # Re-hashes with the current work factor when it has changed; the
+        # caller commits.
+        if not check_password(self._password_hash, password):
+            return False
+        if needs_rehash(self._password_hash):
+            self.password_hash = password
+        return True
 
     @validates('username')
     def validate_username(self, key, username):
-        users = User.query.all()
-        usernames = [user.username for user in users]
         if not username:
             raise ValueError("User must have a username")
-        elif username in usernames:
-            raise ValueError("User Username must be unique")
+        ensure_unique(self, key, username)
         return username
 
     @validates('email')
@@ -89,23 +92,24 @@ class User(db.Model, SerializerMixin):
 
 ###############################################################
 
-class Project(db.Model, SerializerMixin):
+class Project(db.Model, FastSerializerMixin):
     __tablename__ = 'projects'
 
     serialize_only = ('id', 'title', 'description', 'status', 'start_date', 'end_date')
     serialize_rules = ('-tasks.project', '-files.project', '-teams.project', '-created_at', '-updated_at',)
+    filter_fields = ('status', 'team_id')
 
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String, nullable=False)
-    description = db.Column(db.String, db.CheckConstraint('len(description) <= 250', name='max_project_description_length'))
-    status = db.Column(db.String, nullable=False)
-    start_date = db.Column(db.String, nullable=False)
-    end_date = db.Column(db.String, nullable=False)
+    title = db.Column(db.String, unique=True, nullable=False)
+    description = db.Column(db.String, db.CheckConstraint('length(description) <= 250', name='max_project_description_length'))
+    status = db.Column(db.String, nullable=False, index=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
 
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
 
-    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'))
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), index=True)
     
     tasks = db.relationship('Task', backref='project', cascade="all, delete, delete-orphan")
     files = db.relationship('File', backref='project', cascade="all, delete, delete-orphan")
@@ -114,12 +118,9 @@ class Project(db.Model, SerializerMixin):
    
     @validates('title')
     def validate_project_title(self, key, title):
-        projects = Project.query.all()
-        project_titles = [project.title for project in projects]
         if not title:
             raise ValueError("Project must have a Title")
-        elif title in project_titles:
-            raise ValueError("Project Title must be unique")
+        ensure_unique(self, key, title)
         return title
 
     @validates('description')
@@ -140,22 +141,19 @@ class Project(db.Model, SerializerMixin):
     def validate_project_start_date(self, key, start_date):
         if not start_date:
             raise ValueError("Project must have a Start Date")
-        return start_date
+        return ensure_date(start_date, "Project Start Date must be a date (YYYY-MM-DD)")
 
     @validates('end_date')
     def validate_project_end_date(self, key, end_date):
         if not end_date:
             raise ValueError("Project must have an End Date")
-        return end_date
+        return ensure_date(end_date, "Project End Date must be a date (YYYY-MM-DD)")
     
     @validates('team_id')
     def validate_team_id(self, key, team_id):
-        teams = Team.query.all()
-        ids = [team.id for team in teams]
         if not team_id:
             raise ValueError("Project must have a team_id")
-        elif int(team_id) not in ids:
-            raise ValueError('Project Team must exist.')
+        ensure_exists(Team, team_id, 'Project Team must exist.')
         return team_id
     
     def __repr__(self):
@@ -163,17 +161,24 @@ class Project(db.Model, SerializerMixin):
 
 ###############################################################
 
-class Task(db.Model, SerializerMixin): 
+class Task(db.Model, FastSerializerMixin): 
     __tablename__ = 'tasks'
 
     serialize_only = ('id', 'title', 'description', 'status', 'due_date', 'priority')
     serialize_rules = ('-user.tasks', '-project.tasks', '-created_at', '-updated_at', '-user',)
+    filter_fields = ('status', 'due_date', 'assigned_to_user_id', 'project_id')
+    # A user's tasks by due date, a project's tasks by status. The leading
+    # column also covers the foreign key for joins and cascade deletes.
+    __table_args__ = (
+        db.Index('ix_tasks_assigned_to_user_id_due_date', 'assigned_to_user_id', 'due_date'),
+        db.Index('ix_tasks_project_id_status', 'project_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String, nullable=False)
-    description = db.Column(db.String, db.CheckConstraint('len(description) <= 250', name='max_task_description_length'))
-    status = db.Column(db.String, nullable=False)
-    due_date = db.Column(db.String, nullable=False)
+    title = db.Column(db.String, unique=True, nullable=False)
+    description = db.Column(db.String, db.CheckConstraint('length(description) <= 250', name='max_task_description_length'))
+    status = db.Column(db.String, nullable=False, index=True)
+    due_date = db.Column(db.Date, nullable=False, index=True)
     priority = db.Column(db.Integer, db.CheckConstraint('priority > 0', name='positive_priority'), nullable=False)
     
     created_at = db.Column(db.DateTime, server_default=db.func.now())
@@ -184,12 +189,9 @@ class Task(db.Model, SerializerMixin):
 
     @validates('title')
     def validate_task_title(self, key, title):
-        tasks = Task.query.all()
-        task_titles = [task.title for task in tasks]
         if not title:
             raise ValueError("Task must have a Title")
-        elif title in task_titles:
-            raise ValueError("Task Title must be unique")
+        ensure_unique(self, key, title)
         return title
 
     @validates('description')
@@ -210,7 +212,7 @@ class Task(db.Model, SerializerMixin):
     def validate_task_due_date(self, key, due_date):
         if not due_date:
             raise ValueError("Task must have a Due Date")
-        return due_date
+        return ensure_date(due_date, "Task Due Date must be a date (YYYY-MM-DD)")
 
     @validates('priority')
     def validate_task_priority(self, key, priority):
@@ -222,22 +224,16 @@ class Task(db.Model, SerializerMixin):
         
     @validates('assigned_to_user_id')
     def validate_assigned_to_user_id(self, key, assigned_to_user_id):
-        users = User.query.all()
-        ids = [user.id for user in users]
         if not assigned_to_user_id:
             raise ValueError("Task must have an Assigned User")
-        elif int(assigned_to_user_id) not in ids:
-            raise ValueError('Task Assigned User must exist.')
+        ensure_exists(User, assigned_to_user_id, 'Task Assigned User must exist.')
         return assigned_to_user_id
     
     @validates('project_id')
     def validate_project_id(self, key, project_id):
-        projects = Project.query.all()
-        ids = [project.id for project in projects]
         if not project_id:
             raise ValueError("Task must have a Project Id")
-        elif int(project_id) not in ids:
-            raise ValueError('Task Project must exist.')
+        ensure_exists(Project, project_id, 'Task Project must exist.')
         return project_id
 
     def __repr__(self):
@@ -245,32 +241,30 @@ class Task(db.Model, SerializerMixin):
 
 ###############################################################
 
-class File(db.Model, SerializerMixin):
+class File(db.Model, FastSerializerMixin):
     __tablename__ = 'files'
 
     serialize_only = ('id', 'filename', 'description', 'file_type', 'size')
     serialize_rules = ('-user.files', '-project.files', '-updated_at', '-user',)
+    filter_fields = ('uploaded_by_user_id', 'project_id')
 
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String, nullable=False)
-    description = db.Column(db.String, db.CheckConstraint('len(description) <= 250', name='max_file_description_length'))
+    filename = db.Column(db.String, unique=True, nullable=False)
+    description = db.Column(db.String, db.CheckConstraint('length(description) <= 250', name='max_file_description_length'))
     file_type = db.Column(db.String, nullable=False)
     size = db.Column(db.Integer, db.CheckConstraint('size > 0', name='positive_size'), nullable=False)
     
     date_uploaded = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
 
-    uploaded_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'))
+    uploaded_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), index=True)
 
     @validates('filename')
     def validate_file_filename(self, key, filename):
-        files = File.query.all()
-        file_filenames = [file.filename for file in files]
         if not filename:
             raise ValueError("File must have a Filename")
-        elif filename in file_filenames:
-            raise ValueError("File Filename must be unique")
+        ensure_unique(self, key, filename)
         return filename
 
     @validates('description')
@@ -297,22 +291,16 @@ class File(db.Model, SerializerMixin):
         
     @validates('uploaded_by_user_id')
     def validate_file_uploaded_by_user_id(self, key, uploaded_by_user_id):
-        users = User.query.all()
-        ids = [user.id for user in users]
         if not uploaded_by_user_id:
             raise ValueError("File must have an Uploaded by User")
-        elif int(uploaded_by_user_id) not in ids:
-            raise ValueError('File Uploading User must exist.')
+        ensure_exists(User, uploaded_by_user_id, 'File Uploading User must exist.')
         return uploaded_by_user_id
     
     @validates('project_id')
     def validate_project_id(self, key, project_id):
-        projects = Project.query.all()
-        ids = [project.id for project in projects]
         if not project_id:
             raise ValueError("File must have a Project Id")
-        elif int(project_id) not in ids:
-            raise ValueError('File Project must exist.')
+        ensure_exists(Project, project_id, 'File Project must exist.')
         return project_id
 
     def __repr__(self):
@@ -320,31 +308,29 @@ class File(db.Model, SerializerMixin):
 
 ###############################################################
 
-class Team(db.Model, SerializerMixin):
+class Team(db.Model, FastSerializerMixin):
     __tablename__ = 'teams'
 
     serialize_only = ('id', 'name', 'description')
     serialize_rules = ('-user.teams', '-project.teams', '-updated_at','-user',)
+    filter_fields = ('created_by_user_id',)
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    description = db.Column(db.String, db.CheckConstraint('len(description) <= 250', name='max_team_description_length'))
+    name = db.Column(db.String, unique=True, nullable=False)
+    description = db.Column(db.String, db.CheckConstraint('length(description) <= 250', name='max_team_description_length'))
  
     date_created = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now()) 
 
-    created_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
 
     projects = db.relationship('Project', backref='team', cascade="all, delete, delete-orphan")
 
     @validates('name')
     def validate_team_name(self, key, name):
-        teams = Team.query.all()
-        team_names = [team.name for team in teams]
         if not name:
             raise ValueError("Team must have a Name")
-        elif name in team_names:
-            raise ValueError("Team Name must be unique")
+        ensure_unique(self, key, name)
         return name
 
     @validates('description')
@@ -357,12 +343,9 @@ class Team(db.Model, SerializerMixin):
     
     @validates('created_by_user_id')
     def validate_created_by_user_id(self, key, created_by_user_id):
-        users = User.query.all()
-        ids = [user.id for user in users]
         if not created_by_user_id:
             raise ValueError("Team must have a User")
-        elif int(created_by_user_id) not in ids:
-            raise ValueError('Team User must exist.')
+        ensure_exists(User, created_by_user_id, 'Team User must exist.')
         return created_by_user_id
 
     def __repr__(self):
@@ -370,16 +353,21 @@ class Team(db.Model, SerializerMixin):
 
 ###############################################################
 
-class Calendar(db.Model, SerializerMixin):
+class Calendar(db.Model, FastSerializerMixin):
     __tablename__ = 'calendars'
 
     serialize_only = ('id', 'event_name', 'event_description', 'event_date')
     serialize_rules = ('-user.calendars', '-created_at', '-updated_at', '-user',)
+    filter_fields = ('event_date', 'created_by_user_id')
+    # A user's events by date; also covers the foreign key.
+    __table_args__ = (
+        db.Index('ix_calendars_created_by_user_id_event_date', 'created_by_user_id', 'event_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    event_name = db.Column(db.String, nullable=False)
-    event_description = db.Column(db.String, db.CheckConstraint('len(event_description) <= 250', name='max_event_description_length'))
-    event_date = db.Column(db.String, nullable=False)
+    event_name = db.Column(db.String, unique=True, nullable=False)
+    event_description = db.Column(db.String, db.CheckConstraint('length(event_description) <= 250', name='max_event_description_length'))
+    event_date = db.Column(db.Date, nullable=False, index=True)
      
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now()) 
@@ -388,12 +376,9 @@ class Calendar(db.Model, SerializerMixin):
 
     @validates('event_name')
     def validate_event_name(self, key, event_name):
-        calendars = Calendar.query.all()
-        event_names = [calendar.event_name for calendar in calendars]
         if not event_name:
             raise ValueError("Calendar must have an Event Name")
-        elif event_name in event_names:
-            raise ValueError("Calendar Event Name must be unique")
+        ensure_unique(self, key, event_name)
         return event_name
 
     @validates('event_description')
@@ -408,16 +393,13 @@ class Calendar(db.Model, SerializerMixin):
     def validate_event_date(self, key, event_date):
         if not event_date:
             raise ValueError("Calendar must have an Event Date")
-        return event_date
+        return ensure_date(event_date, "Calendar Event Date must be a date (YYYY-MM-DD)")
     
     @validates('created_by_user_id')
     def validate_event_created_by_user_id(self, key, created_by_user_id):
-        users = User.query.all()
-        ids = [user.id for user in users]
         if not created_by_user_id:
             raise ValueError("Calendar must have a User")
-        elif int(created_by_user_id) not in ids:
-            raise ValueError('Calendar User must exist.')
+        ensure_exists(User, created_by_user_id, 'Calendar User must exist.')
         return created_by_user_id
 
     def __repr__(self):
@@ -425,19 +407,30 @@ class Calendar(db.Model, SerializerMixin):
 
 ###############################################################
 
-class Chat_Message(db.Model, SerializerMixin):
+class Chat_Message(db.Model, FastSerializerMixin):
     __tablename__ = 'chat_messages'
 
-    serialize_only = ('id', 'message_text', 'message_date', 'sender_user_id', 'receiver_user_id')
+    serialize_only = ('id', 'message_text', 'message_date', 'read_at', 'sender_user_id', 'receiver_user_id')
     serialize_rules = ('-user.chat_messages', '-updated_at',)
+    filter_fields = ('sender_user_id', 'receiver_user_id')
+    # The inbox newest first, one direction of a conversation newest first
+    # (see conversations.py) and a user's unread messages. The first two
+    # also cover the foreign keys.
+    __table_args__ = (
+        db.Index('ix_chat_messages_receiver_user_id_message_date', 'receiver_user_id', 'message_date'),
+        db.Index('ix_chat_messages_sender_user_id_receiver_user_id_message_date',
+                 'sender_user_id', 'receiver_user_id', 'message_date'),
+        db.Index('ix_chat_messages_receiver_user_id_read_at', 'receiver_user_id', 'read_at'),
+    )
     ## Potentially alternate version if needed ## 
         ## Would also need to switch to the alternate sent_messages and received_messages up in User!
     # serialize_rules = ('-updated_at','-user1','-user2',)
 
     id = db.Column(db.Integer, primary_key=True)
-    message_text = db.Column(db.String, db.CheckConstraint('len(message_text) <= 250', name='max_chat_message_length'))
+    message_text = db.Column(db.String, db.CheckConstraint('length(message_text) <= 250', name='max_chat_message_length'))
      
     message_date = db.Column(db.DateTime, server_default=db.func.now())
+    read_at = db.Column(db.DateTime)
     updated_at = db.Column(db.DateTime, onupdate=db.func.now()) 
 
     sender_user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -453,25 +446,48 @@ class Chat_Message(db.Model, SerializerMixin):
 
     @validates('sender_user_id')
     def validate_sender_user_id(self, key, sender_user_id):
-        users = User.query.all()
-        ids = [user.id for user in users]
         if not sender_user_id:
             raise ValueError("Chat Message must have a Sending User")
-        elif int(sender_user_id) not in ids:
-            raise ValueError('Chat Message Sending User must exist.')
+        ensure_exists(User, sender_user_id, 'Chat Message Sending User must exist.')
         return sender_user_id
     
     @validates('receiver_user_id')
     def validate_receiver_user_id(self, key, receiver_user_id):
-        users = User.query.all()
-        ids = [user.id for user in users]
         if not receiver_user_id:
             raise ValueError("Chat Message must have a Receiving User")
-        elif int(receiver_user_id) not in ids:
-            raise ValueError('Chat Message Receiving User must exist.')
+        ensure_exists(User, receiver_user_id, 'Chat Message Receiving User must exist.')
         return receiver_user_id
 
     def __repr__(self):
         return f'<Chat_Message #{self.id}, Message Text: {self.message_text}, Message Date: {self.message_date}, Sender: {self.sender_user_id.username}, Receiver: {self.receiver_user_id.username}>'
     
-###############################################################
\ No newline at end of file
+###############################################################
+
+# Change log behind GET /sync (see sync.py): one row per insert, update or
+# delete of a tracked record. The id is the sync cursor, so it is declared
+# AUTOINCREMENT on SQLite: a plain INTEGER PRIMARY KEY reuses ids once the
+# newest rows are deleted, and a client's old cursor would then point into
+# different history.
+class Change(db.Model):
+    __tablename__ = 'changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String, nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String, nullable=False)
+    changed_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    # Newest change per table and per record, for conditional GETs
+    # (conditional.py).
+    __table_args__ = (
+        db.Index('ix_changes_table_name_id', 'table_name', 'id'),
+        db.Index('ix_changes_table_name_row_id_id', 'table_name', 'row_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<Change #{self.id}, {self.operation} {self.table_name} #{self.row_id}>'
+
+###############################################################
+
+compile_serializers(db.Model)
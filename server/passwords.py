@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import ServiceUnavailable
+from config import app, bcrypt
+
+# Password hashing and checking run on a small, bounded thread pool instead
+# of on whatever thread is serving the request. bcrypt releases the GIL, so
+# PASSWORD_WORKERS hashes run in parallel while other requests carry on, and
+# a burst of logins can't put more bcrypt work on the CPUs than that. Up to
+# PASSWORD_QUEUE more wait for a worker; past that, callers get Overloaded
+# straight away (a 503 with Retry-After) rather than queueing for seconds.
+#
+# The work factor is BCRYPT_LOG_ROUNDS. Hashes made with a different one
+# still verify, and User.authenticate re-hashes them on the next successful
+# login.
+
+class Overloaded(ServiceUnavailable):
+    # flask_restful answers HTTPExceptions with their data as the body.
+    def __init__(self):
+        super().__init__('Too many logins at once, try again shortly', retry_after=1)
+        self.data = {'errors': [self.description]}
+
+workers = app.config['PASSWORD_WORKERS']
+pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='passwords')
+slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_QUEUE'])
+
+def run(fn, *args):
+    if not slots.acquire(blocking=False):
+        raise Overloaded()
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda future: slots.release())
+    return future.result()
+
+def hash_password(password):
+    return run(bcrypt.generate_password_hash, password.encode('utf-8')).decode('utf-8')
+
+def check_password(password_hash, password):
+    return run(bcrypt.check_password_hash, password_hash, password.encode('utf-8'))
+
+def needs_rehash(password_hash):
+    # bcrypt hashes look like $2b$<rounds>$<salt and hash>.
+    try:
+        return int(password_hash.split('$')[2]) != app.config['BCRYPT_LOG_ROUNDS']
+    except (IndexError, ValueError):
+        return False
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import aliased
+from models import Task, Calendar
+from serializer import row_serializer
+from listing import apply_filters, column_query, page_size, read_fields
+from includes import attach_includes
+
+# Date range reads, answered from the date indexes instead of a walk over
+# the whole table.
+#
+# GET /tasks/due?from=<date>&to=<date> returns the tasks due on those days
+# (both included) in due date order, and takes the same filters, ?fields=
+# and ?include= as /tasks. Pages go by ?after_id=<last id seen>; the cursor
+# is (due_date, id), so tasks sharing a day are never skipped or repeated,
+# and the next one comes back in X-Next-After-Id. The range is one read on
+# ix_tasks_due_date, or on ix_tasks_assigned_to_user_id_due_date with
+# ?assigned_to_user_id=, already in page order.
+#
+# GET /calendars/week?start=<date> returns the events of the seven days from
+# start, by date, with the /calendars filters, ?fields= and ?include=; with
+# ?created_by_user_id= it reads ix_calendars_created_by_user_id_event_date.
+# A busy week can hold any number of events, so it is paged the same way, on
+# an (event_date, id) cursor. start has no default: "this week" would change
+# under a cached response or an ETag without any write to calendars.
+
+WEEK = timedelta(days=7)
+RANGE_ARGS = ('from', 'to', 'start')
+
+def iso_date(args, name):
+    if not args.get(name):
+        raise ValueError(f'{name} is required (YYYY-MM-DD)')
+    try:
+        return date.fromisoformat(args[name])
+    except ValueError:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+
+def filter_args(args):
+    return {arg: value for arg, value in args.items() if arg not in RANGE_ARGS}
+
+def serialized(model, rows, args):
+    serialize = row_serializer(model, tuple(read_fields(model, args)))
+    records = [serialize(row) for row in rows]
+    attach_includes(model, records, args)
+    return records
+
+def due_query(args):
+    # The /tasks/due page query, without the limit.
+    first, last = iso_date(args, 'from'), iso_date(args, 'to')
+    if last < first:
+        raise ValueError('to must not be before from')
+    query = column_query(Task, read_fields(Task, args)).filter(Task.due_date.between(first, last))
+    query = apply_filters(Task, query, filter_args(args))
+    if args.get('after_id'):
+        # The first condition is the same bound on its own, so the index
+        # range starts at the cursor's day instead of at from.
+        cursor = aliased(Task)
+        after = select(cursor.due_date, cursor.id).where(cursor.id == int(args['after_id']))
+        query = query.filter(Task.due_date >= after.with_only_columns(cursor.due_date).scalar_subquery(),
+                             tuple_(Task.due_date, Task.id) > after.scalar_subquery())
+    return query.order_by(Task.due_date, Task.id)
+
+def tasks_due(args):
+    # Returns (tasks, next_after_id). next_after_id is None on the last page.
+    limit = page_size(args)
+    rows = due_query(args).limit(limit).all()
+    next_after_id = rows[-1].id if len(rows) == limit else None
+    return serialized(Task, rows, args), next_after_id
+
+def week_query(args):
+    # The /calendars/week page query, without the limit.
+    start = iso_date(args, 'start')
+    query = column_query(Calendar, read_fields(Calendar, args)).filter(Calendar.event_date >= start,
+                                                                       Calendar.event_date < start + WEEK)
+    query = apply_filters(Calendar, query, filter_args(args))
+    if args.get('after_id'):
+        cursor = aliased(Calendar)
+        after = select(cursor.event_date, cursor.id).where(cursor.id == int(args['after_id']))
+        query = query.filter(Calendar.event_date >= after.with_only_columns(cursor.event_date).scalar_subquery(),
+                             tuple_(Calendar.event_date, Calendar.id) > after.scalar_subquery())
+    return query.order_by(Calendar.event_date, Calendar.id)
+
+def calendar_week(args):
+    # Returns (events, next_after_id). next_after_id is None on the last page.
+    limit = page_size(args)
+    rows = week_query(args).limit(limit).all()
+    next_after_id = rows[-1].id if len(rows) == limit else None
+    return serialized(Calendar, rows, args), next_after_id
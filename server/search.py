@@ -0,0 +1,170 @@
+import re
+import time
+from sqlalchemy import DDL, and_, event, literal, or_, select, text, union_all
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import ServiceUnavailable
+from config import app, db
+from models import Project, Task, File, Chat_Message
+from serializer import row_serializer
+from listing import page_size
+
+# Full-text search: GET /search?q=<words>&types=tasks,files&limit=<n>&offset=<n>
+# over task, project and file titles and descriptions and chat message text.
+#
+# On SQLite each searched table has an FTS5 index, <table>_search, that
+# reads its text from the table itself (external content), so only the index
+# is stored twice, not the text. Triggers on the table keep it current, which
+# covers ORM writes, the Core writes in bulk.py and rows loaded by seed.py
+# alike; updates that don't touch the searched columns (marking messages
+# read) leave it alone. The indexes are created with the tables; for a
+# database made before them, `flask rebuild-search` creates them and indexes
+# what is already there, and also repairs an index after rows were written
+# with the triggers missing.
+#
+# Every word in q has to match (a trailing * matches it as a prefix), words
+# are stemmed (task matches tasks), and results are ordered by bm25 across
+# all the requested types, with a match in the title counting TITLE_WEIGHT
+# times one in the description. Pages go by ?offset=, and the offset of the
+# next page comes back in X-Next-Offset. Other databases get the same
+# endpoint as an unranked case-insensitive substring match, which scans.
+#
+# Databases made with `flask db upgrade` don't get the indexes (migrations
+# leave them out, see config.py); until `flask rebuild-search` has run there,
+# /search answers 503 saying so.
+
+SEARCHED = {
+    'tasks': (Task, ('title', 'description')),
+    'projects': (Project, ('title', 'description')),
+    'files': (File, ('filename', 'description')),
+    'chat_messages': (Chat_Message, ('message_text',)),
+}
+TITLE_WEIGHT = 5.0
+TOKENIZER = 'porter unicode61 remove_diacritics 2'
+
+class IndexMissing(ServiceUnavailable):
+    # flask_restful answers HTTPExceptions with their data as the body.
+    def __init__(self):
+        super().__init__('The search index has not been built; run `flask rebuild-search`')
+        self.data = {'errors': [self.description]}
+
+def index_name(table_name):
+    return f'{table_name}_search'
+
+def index_ddl(table_name):
+    # CREATE statements for one table's index and its triggers.
+    columns = SEARCHED[table_name][1]
+    index = index_name(table_name)
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    add = f'INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new});'
+    remove = f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({names}, content='{table_name}', "
+        f"content_rowid='id', tokenize='{TOKENIZER}')",
+        f'CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table_name} BEGIN {add} END',
+        f'CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table_name} BEGIN {remove} END',
+        f'CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF {names} ON {table_name} '
+        f'BEGIN {remove} {add} END',
+    ]
+
+# The triggers go when their table is dropped; the index has to go too, or a
+# recreated table would inherit a stale one.
+for table_name, (model, columns) in SEARCHED.items():
+    for statement in index_ddl(table_name):
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    event.listen(model.__table__, 'before_drop',
+                 DDL(f'DROP TABLE IF EXISTS {index_name(table_name)}').execute_if(dialect='sqlite'))
+
+def search_types(args):
+    if not args.get('types'):
+        return list(SEARCHED)
+    types = [name.strip() for name in args['types'].split(',') if name.strip()]
+    unknown = [name for name in types if name not in SEARCHED]
+    if unknown:
+        raise ValueError(f"Cannot search {', '.join(unknown)}; types are {', '.join(SEARCHED)}")
+    return types
+
+def search_terms(q):
+    # Words only, so punctuation in q can never be read as FTS5 query syntax.
+    terms = re.findall(r'\w+\*?', q or '')
+    if not terms:
+        raise ValueError('q must contain at least one word')
+    return terms
+
+def match_expression(terms):
+    return ' '.join(f'"{term.rstrip("*")}"' + ('*' if term.endswith('*') else '') for term in terms)
+
+def ranked_hits(types, terms, limit, offset):
+    # One statement for every type: each index is asked for its best
+    # offset + limit + 1 matches, and those are merged by score.
+    selects, params = [], {'q': match_expression(terms), 'n': offset + limit + 1}
+    for table_name in types:
+        index = index_name(table_name)
+        weights = ', '.join([str(TITLE_WEIGHT)] + ['1.0'] * (len(SEARCHED[table_name][1]) - 1))
+        selects.append(f"SELECT * FROM (SELECT '{table_name}' AS type, rowid AS id, bm25({index}, {weights}) AS score "
+                       f'FROM {index} WHERE {index} MATCH :q ORDER BY score LIMIT :n)')
+    statement = ' UNION ALL '.join(selects) + ' ORDER BY score, type, id LIMIT :limit OFFSET :offset'
+    params.update(limit=limit + 1, offset=offset)
+    return [(type, id, -score) for type, id, score in db.session.execute(text(statement), params)]
+
+def substring_hits(types, terms, limit, offset):
+    queries = []
+    for table_name in types:
+        model, columns = SEARCHED[table_name]
+        matches = [or_(*[getattr(model, column).icontains(term.rstrip('*'), autoescape=True) for column in columns])
+                   for term in terms]
+        queries.append(select(literal(table_name).label('type'), model.id.label('id'), literal(0.0).label('score'))
+                       .where(and_(*matches)))
+    statement = union_all(*queries).subquery()
+    return db.session.execute(select(statement).order_by(statement.c.type, statement.c.id)
+                              .limit(limit + 1).offset(offset)).all()
+
+def search(args):
+    # Returns (hits, next offset or None). Each hit is the matching record
+    # with its type and score; the records of a page are read with one query
+    # per type.
+    types = search_types(args)
+    terms = search_terms(args.get('q'))
+    limit = page_size(args)
+    offset = int(args.get('offset', 0))
+    if offset < 0:
+        raise ValueError('offset must not be negative')
+    find = ranked_hits if db.engine.dialect.name == 'sqlite' else substring_hits
+    try:
+        hits = find(types, terms, limit, offset)
+    except OperationalError as e:
+        if 'no such table' not in str(e.orig):
+            raise
+        db.session.rollback()
+        raise IndexMissing()
+    next_offset = offset + limit if len(hits) > limit else None
+    hits = hits[:limit]
+
+    records = {}
+    for table_name in {type for type, id, score in hits}:
+        model = SEARCHED[table_name][0]
+        fields = model._serialized_fields
+        serialize = row_serializer(model, fields)
+        ids = [id for type, id, score in hits if type == table_name]
+        records[table_name] = {row.id: serialize(row) for row in db.session.execute(
+            select(*[getattr(model, field) for field in fields]).where(model.id.in_(ids)))}
+    results = [{'type': type, 'id': id, 'score': round(score, 4), 'record': records[type][id]}
+               for type, id, score in hits if id in records[type]]
+    return results, next_offset
+
+@app.cli.command('rebuild-search')
+def rebuild_search():
+    # Creates any missing search index or trigger and re-indexes every row.
+    if db.engine.dialect.name != 'sqlite':
+        print('Search indexes are only kept on SQLite; nothing to rebuild')
+        return
+    for table_name in SEARCHED:
+        started = time.perf_counter()
+        index = index_name(table_name)
+        for statement in index_ddl(table_name):
+            db.session.execute(text(statement))
+        db.session.execute(text(f"INSERT INTO {index}({index}) VALUES ('rebuild')"))
+        db.session.execute(text(f"INSERT INTO {index}({index}) VALUES ('optimize')"))
+        db.session.commit()
+        print(f'Rebuilt {index} in {time.perf_counter() - started:.1f}s')
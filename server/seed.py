@@ -1,246 +1,169 @@
 #!/usr/bin/env python3
 
-from datetime import datetime
-from random import randint, choice as rc
+# Seeds the database with fake data at any scale.
+#   python seed.py                                  (small demo data set)
+#   python seed.py --users 100000 --tasks 5000000   (production-sized)
+#   python seed.py --database /tmp/big.db ...       (fresh SQLite file)
+#   DATABASE_URI=postgresql://... python seed.py --create-tables
+# Rows go in with chunked executemany inserts rather than one ORM object at a
+# time, so the model validators don't run per row. Foreign keys are checked
+# once at the end instead (PRAGMA foreign_key_check on SQLite); the unique
+# indexes and CHECK constraints still apply as rows are inserted.
+
+import argparse
+import os
+import time
+from datetime import date, datetime
+from random import Random
+
+parser = argparse.ArgumentParser(description='Seed the Syntax Slingers database.')
+parser.add_argument('--users', type=int, default=25)
+parser.add_argument('--teams', type=int, default=25)
+parser.add_argument('--projects', type=int, default=15)
+parser.add_argument('--tasks', type=int, default=400)
+parser.add_argument('--files', type=int, default=400)
+parser.add_argument('--calendars', type=int, default=25)
+parser.add_argument('--chat-messages', type=int, default=150)
+parser.add_argument('--seed', type=int, default=1234, help='Faker/random seed; same seed, same data')
+parser.add_argument('--chunk', type=int, default=10000, help='rows per executemany insert')
+parser.add_argument('--database', help='write to a fresh SQLite file at this path instead of the app database')
+parser.add_argument('--create-tables', action='store_true', help='create missing tables first (no migrations)')
+args = parser.parse_args()
+
+if args.database:
+    if os.path.exists(args.database):
+        os.remove(args.database)
+    os.environ['DATABASE_URI'] = f'sqlite:///{os.path.abspath(args.database)}'
+
 from faker import Faker
-from faker.providers.internet import *
+from sqlalchemy import delete, insert
 from app import app
-from models import db, User, Project, File, Team, Task, Calendar, Chat_Message
+from config import bcrypt
+from models import db, User, Project, File, Team, Task, Calendar, Chat_Message, Change
+from sync import RESET
 
 fake = Faker()
+Faker.seed(args.seed)
+random = Random(args.seed)
+
+STAFF = ['Admin', 'Matthew', 'Chris', 'Dylan', 'Jackie']
+FILE_TYPES = ["jpeg", "txt", "mp4", "mp3", "doc", "js", "py", "sql"]
+STATUSES = ["Not Started", "In Progress", "Complete"]
+
+# Faker is the slow part at scale, so text comes from fixed pools drawn once.
+SENTENCES = [fake.sentence() for n in range(1000)]
+WORDS = [fake.word() for n in range(1000)]
+# Fixed bounds: Faker's defaults end today, which would shift the dates of
+# a given --seed from one day to the next.
+DATE_RANGE = (date(2020, 1, 1), date(2024, 12, 31))
+DATES = [fake.date_between(*DATE_RANGE) for n in range(1000)]
+READ_AT = datetime(2023, 6, 1)
+
+def insert_rows(model, count, make_row):
+    print(f"Creating {model.__name__} data ({count} rows)...")
+    started = time.perf_counter()
+    for start in range(1, count + 1, args.chunk):
+        stop = min(start + args.chunk, count + 1)
+        connection.execute(insert(model.__table__), [make_row(n) for n in range(start, stop)])
+    connection.commit()
+    print(f"    done in {time.perf_counter() - started:.1f}s")
+
+def user_row(n):
+    if n <= len(STAFF):
+        name = STAFF[n - 1]
+        return {'username': name, 'email': f'{name}@flatironschool.com', '_password_hash': staff_hashes[name],
+                'is_active': True, 'is_admin': name == 'Admin'}
+    name = f'{fake.first_name()}{n}'
+    return {'username': name, 'email': f'{name.lower()}@example.com', '_password_hash': shared_hash,
+            'is_active': False, 'is_admin': False}
 
 with app.app_context():
 
-    print("Deleting User data...")
-    User.query.delete()
-    print("Deleting Team data...") 
-    Team.query.delete()
-    print("Deleting Project data...") 
-    Project.query.delete()
-    print("Deleting File data...")
-    File.query.delete()
-    print("Deleting Task data...") 
-    Task.query.delete()
-    print("Deleting Calendar data...") 
-    Calendar.query.delete()
-    print("Deleting Chat_Message data...") 
-    Chat_Message.query.delete()
-
-##########################################################
-
-    print("Creating User data...")
-    new_user_1 = User(username="Admin", email="Admin@flatironschool.com", is_active=True, is_admin=True)
-    new_user_1.password_hash = "Admin"
-    new_user_2 = User(username="Matthew", email="Matthew@flatironschool.com", is_active=False, is_admin=False)
-    new_user_2.password_hash = "Matthew" 
-    new_user_3 = User(username="Chris", email="Chris@flatironschool.com", is_active=False, is_admin=False)
-    new_user_3.password_hash = "Chris"
-    new_user_4 = User(username="Dylan", email="Dylan@flatironschool.com", is_active=False, is_admin=False)
-    new_user_4.password_hash = "Dylan"
-    new_user_5 = User(username="Jackie", email="Jackie@flatironschool.com", is_active=False, is_admin=False)
-    new_user_5.password_hash = "Jackie"
-    users = [new_user_1,new_user_2,new_user_3,new_user_4,new_user_5]
-    usernames = ['Admin', 'Matthew', 'Chris', 'Dylan', 'Jackie']
-    for n in range(20):
-        username=fake.first_name()
-        while username in usernames:
-            username = fake.first_name()
-        usernames.append(username)
-        password = username
-        new_user = User(username=username, email=fake.email(), is_active=False, is_admin=False)
-        new_user.password_hash = password
-        users.append(new_user)
-    print('Adding User objects...')
-    db.session.add_all(users)
-
-##########################################################
-
-    print("Creating Team data...")    
-    team_1 = Team(
-        name="Team 1",
-        description="Team 1 is really awesome and smart",
-        created_by_user_id=1,
-    )
-    team_2 = Team(
-        name="Team 2",
-        description="Team 2 is really awesome and smart",
-        created_by_user_id=2,
-    )
-    team_3 = Team(
-        name="Team 3",
-        description="Team 3 is really awesome and smart",
-        created_by_user_id=3,
-    )
-    team_4 = Team(
-        name="Team 4",
-        description="Team 4 is really awesome and smart",
-        created_by_user_id=4,
-    )
-    team_5 = Team(
-        name="Team 5",
-        description="Team 5 is really awesome and smart",
-        created_by_user_id=5,
-    )
-    teams = [team_1, team_2, team_3, team_4, team_5]
-    for i in range(20):
-        team = Team(
-            name=f"{fake.word()}",
-            description=f"{fake.sentence()}",
-            created_by_user_id=randint(1, 25),
-        )
-        teams.append(team)
-    print('Adding Team objects...')
-    db.session.add_all(teams)
-
-##########################################################
-
-    print("Creating Project data...")
-    # f"{fake.date()}"
-    # start_date_str = "2023-04-23 19:14:25"
-    # datetime_object_1 = datetime.strptime(start_date_str, "%Y-%m-%d %H:%M:%S")
-    # end_date_str = "2023-05-12 19:14:25"
-    # datetime_object_2 = datetime.strptime(end_date_str, "%Y-%m-%d %H:%M:%S")
-    project_1 = Project(
-        title="Project 1",
-        description="Project 1 is super duper extra important!",
-        status="In Progress",
-        start_date = f"{fake.date()}", 
-        end_date=f"{fake.date()}",
-        team_id=1,
-    )
-    project_2 = Project(
-        title="Project 2",
-        description="Project 2 is super duper extra important!",
-        status="In Progress",
-        start_date =f"{fake.date()}", 
-        end_date=f"{fake.date()}",
-        team_id=2,
-    )
-    project_3 = Project(
-        title="Project 3",
-        description="Project 3 is super duper extra important!",
-        status="In Progress",
-        start_date =f"{fake.date()}", 
-        end_date=f"{fake.date()}",
-        team_id=3,
-    )
-    project_4 = Project(
-        title="Project 4",
-        description="Project 4 is super duper extra important!",
-        status="In Progress",
-        start_date =f"{fake.date()}", 
-        end_date=f"{fake.date()}",
-        team_id=4,
-    )
-    project_5 = Project(
-        title="Project 5",
-        description="Project 5 is super duper extra important!",
-        status="In Progress",
-        start_date =f"{fake.date()}", 
-        end_date=f"{fake.date()}",
-        team_id=5,
-    )
-    projects = [project_1, project_2, project_3, project_4, project_5]
-
-    for i in range(10):
-        project = Project(
-            title=f"{fake.word()}",
-            description=f"{fake.sentence()}",
-            status="In Progress",
-            start_date=f"{fake.date()}",
-            end_date=f"{fake.date()}",
-            team=rc(teams),
-        )
-        projects.append(project)
-    print('Adding Project objects...')
-    db.session.add_all(projects)
-
-##########################################################
-
-    print("Creating File data...")
-    files = []
-    file_types = ["jpeg", "txt", "mp4", "mp3", "doc", "js", "py", "sql"]
-    for user in users:
-        for n in range(randint(1, 30)):
-            file = File(
-                filename=f"{fake.word()}",
-                file_type=rc(file_types),
-                size=randint(1,500),
-                uploaded_by_user_id=user.id,
-                project=rc(projects))
-            files.append(file)
-    print('Adding File objects...')
-    db.session.add_all(files)
-
-##########################################################
-
-    print("Creating Task data...")
-    # due_date_str = "2023-05-12 19:14:25"
-    # datetime_object_3 = datetime.strptime(due_date_str, "%Y-%m-%d %H:%M:%S")
-    tasks = []
-    for user in users:
-        for n in range(randint(1, 30)):
-            task = Task(
-                title=f"{fake.word()}",
-                description=f"{fake.sentence()}",
-                status="In Progress",
-                due_date=f"{fake.date()}",
-                priority=randint(1,10),
-                assigned_to_user_id=user.id,
-                project=rc(projects)
-                )
-            tasks.append(task)
-    print('Adding Task objects...')
-    db.session.add_all(tasks)
-
-##########################################################
-
-    print("Creating Calendar) data...")
-    # event_date_str = "2023-05-12 19:14:25"
-    # datetime_object_4 = datetime.strptime(event_date_str, "%Y-%m-%d %H:%M:%S")
-    new_event_1 = Calendar(event_name="Event 1", event_description= f"{fake.sentence()}", event_date=f"{fake.date()}")
-    new_event_2 = Calendar(event_name="Event 2", event_description= f"{fake.sentence()}", event_date=f"{fake.date()}")
-    new_event_3 = Calendar(event_name="Event 3", event_description= f"{fake.sentence()}", event_date=f"{fake.date()}")
-    new_event_4 = Calendar(event_name="Event 4", event_description= f"{fake.sentence()}", event_date=f"{fake.date()}")
-    new_event_5 = Calendar(event_name="Event 5", event_description= f"{fake.sentence()}", event_date=f"{fake.date()}")
-    calendars = [new_event_1,new_event_2,new_event_3,new_event_4,new_event_5]
-    event_names = ['Event 1', 'Event 2', 'Event 3', 'Event 4', 'Event 5']
-    for n in range(20):
-        event_name=f"Event_{fake.first_name()}"
-        while event_name in event_names:
-            event_name = f"Event_{fake.first_name()}"
-        event_names.append(event_name)
-        new_event = Calendar(event_name=event_name, event_description= f"{fake.sentence()}", event_date=f"{fake.date()}")
-        calendars.append(new_event)
-    print('Adding Calendar objects...')
-    db.session.add_all(calendars)
-
-##########################################################
-
-    print("Creating Chat Message data...")
-    chat_messages = []
-    for user in users:
-        for n in range(randint(1, 10)):
-            chat_message = Chat_Message(
-                message_text=f"{fake.sentence()}",
-                sender_user_id=user.id,
-                receiver_user_id=rc(users).id)
-            chat_messages.append(chat_message)
-    print('Adding Chat Message objects...')
-    db.session.add_all(chat_messages)
-
-##########################################################
-
-    print("Just collating Data, as they say...")
-    for project in projects:
-        file= rc(files)
-        project.file = file
-        files.remove(file)
-        task= rc(tasks)
-        project.task = task
-        tasks.remove(task)
-
-    print('Committing Seed...')
-    db.session.commit()
-
-    print("Seeding Complete!")
\ No newline at end of file
+    if args.database or args.create_tables:
+        db.create_all()
+
+    # One connection for the whole load: SQLite's foreign_keys pragma is per
+    # connection and can only change outside a transaction.
+    connection = db.engine.connect()
+    sqlite = db.engine.dialect.name == 'sqlite'
+    if sqlite:
+        connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+
+    # Children first so the foreign keys never point at a deleted row. The
+    # generated foreign keys assume ids start at 1, which a plain DELETE
+    # doesn't reset on Postgres, so there the tables are truncated instead.
+    # Change ids are sync cursors and keep counting up (changes is an
+    # AUTOINCREMENT table on SQLite), and the reset entry makes clients
+    # holding an older cursor reload instead of syncing onto the new data.
+    models = (Chat_Message, Calendar, Task, File, Project, Team, User)
+    if db.engine.dialect.name == 'postgresql':
+        print("Truncating tables...")
+        tables = ', '.join(model.__tablename__ for model in models)
+        connection.exec_driver_sql(f'TRUNCATE {tables} RESTART IDENTITY CASCADE')
+        connection.exec_driver_sql(f'TRUNCATE {Change.__tablename__} CONTINUE IDENTITY')
+    else:
+        for model in (Change, *models):
+            print(f"Deleting {model.__name__} data...")
+            connection.execute(delete(model.__table__))
+    connection.execute(insert(Change.__table__), [{'table_name': Change.__tablename__, 'row_id': 0, 'operation': RESET}])
+    connection.commit()
+
+    # bcrypt is deliberately slow: the staff accounts get their own password
+    # (same as the username), every generated user shares the password "password".
+    staff_hashes = {name: bcrypt.generate_password_hash(name).decode('utf-8') for name in STAFF}
+    shared_hash = bcrypt.generate_password_hash('password').decode('utf-8')
+    users = max(args.users, len(STAFF))
+
+    insert_rows(User, users, user_row)
+    insert_rows(Team, args.teams, lambda n: {
+        'name': f'Team {n}',
+        'description': random.choice(SENTENCES),
+        'created_by_user_id': random.randint(1, users),
+    })
+    insert_rows(Project, args.projects, lambda n: {
+        'title': f'Project {n}',
+        'description': random.choice(SENTENCES),
+        'status': random.choice(STATUSES),
+        'start_date': random.choice(DATES),
+        'end_date': random.choice(DATES),
+        'team_id': random.randint(1, args.teams),
+    })
+    insert_rows(File, args.files, lambda n: {
+        'filename': f'{random.choice(WORDS)}_{n}.{random.choice(FILE_TYPES)}',
+        'description': random.choice(SENTENCES),
+        'file_type': random.choice(FILE_TYPES),
+        'size': random.randint(1, 500),
+        'uploaded_by_user_id': random.randint(1, users),
+        'project_id': random.randint(1, args.projects),
+    })
+    insert_rows(Task, args.tasks, lambda n: {
+        'title': f'{random.choice(WORDS)} {n}',
+        'description': random.choice(SENTENCES),
+        'status': random.choice(STATUSES),
+        'due_date': random.choice(DATES),
+        'priority': random.randint(1, 10),
+        'assigned_to_user_id': random.randint(1, users),
+        'project_id': random.randint(1, args.projects),
+    })
+    insert_rows(Calendar, args.calendars, lambda n: {
+        'event_name': f'Event {n}',
+        'event_description': random.choice(SENTENCES),
+        'event_date': random.choice(DATES),
+        'created_by_user_id': random.randint(1, users),
+    })
+    insert_rows(Chat_Message, args.chat_messages, lambda n: {
+        'message_text': random.choice(SENTENCES),
+        'sender_user_id': random.randint(1, users),
+        'receiver_user_id': random.randint(1, users),
+        'read_at': READ_AT if random.random() < 0.7 else None,
+    })
+
+    if sqlite:
+        print("Checking foreign keys...")
+        violations = connection.exec_driver_sql('PRAGMA foreign_key_check').fetchall()
+        connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+        if violations:
+            raise SystemExit(f"Seed left {len(violations)} dangling foreign keys, e.g. {violations[:5]}")
+    connection.close()
+
+    print("Seeding Complete!")
@@ -0,0 +1,84 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from operator import attrgetter
+from sqlalchemy_serializer import SerializerMixin
+
+# SerializerMixin re-reads serialize_only/serialize_rules and walks the mapper
+# on every to_dict() call. Our models only ever serialize their own columns,
+# so each model's field list is worked out once (compile_serializers, run at
+# the bottom of models.py) and to_dict() becomes an attrgetter plus a few
+# date formats. Anything the compiled path can't express (nested rules,
+# relationship fields, per-call options) still goes through SerializerMixin.
+
+def value_formatter(python_type):
+    if python_type is datetime:
+        return lambda value: None if value is None else value.strftime(SerializerMixin.datetime_format)
+    if python_type is date:
+        return lambda value: None if value is None else value.strftime(SerializerMixin.date_format)
+    if python_type is time:
+        return lambda value: None if value is None else value.strftime(SerializerMixin.time_format)
+    if python_type is Decimal:
+        return lambda value: None if value is None else SerializerMixin.decimal_format.format(value)
+    return None
+
+def column_python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+def compile_fields(model, fields):
+    # Returns fn(obj_or_row) -> dict for the given column names.
+    columns = model.__table__.columns
+    formatters = [(index, value_formatter(column_python_type(columns[field]))) for index, field in enumerate(fields)]
+    formatters = [(index, fmt) for index, fmt in formatters if fmt]
+    fields = tuple(fields)
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        single = getter
+        getter = lambda obj: (single(obj),)
+
+    def serialize(obj):
+        values = getter(obj)
+        if formatters:
+            values = list(values)
+            for index, fmt in formatters:
+                values[index] = fmt(values[index])
+        return dict(zip(fields, values))
+    return serialize
+
+@lru_cache(maxsize=None)
+def row_serializer(model, fields):
+    # Same output for Row tuples from column-only queries (fields is a tuple).
+    return compile_fields(model, fields)
+
+def serialized_fields(model):
+    # serialize_only minus any "-field" rules, or None if the rules ask for
+    # more than plain columns.
+    rules = model.serialize_rules
+    if any(not rule.startswith('-') for rule in rules):
+        return None
+    column_names = set(model.__table__.columns.keys())
+    fields = [field for field in model.serialize_only if f'-{field}' not in rules]
+    if not fields or any(field not in column_names for field in fields):
+        return None
+    return fields
+
+class FastSerializerMixin(SerializerMixin):
+    _compiled_to_dict = None
+    _serialized_fields = None
+
+    def to_dict(self, *args, **kwargs):
+        compiled = type(self)._compiled_to_dict
+        if compiled is None or args or kwargs:
+            return super().to_dict(*args, **kwargs)
+        return compiled(self)
+
+def compile_serializers(base):
+    for mapper in base.registry.mappers:
+        model = mapper.class_
+        if issubclass(model, FastSerializerMixin):
+            fields = serialized_fields(model)
+            model._serialized_fields = tuple(fields) if fields else None
+            model._compiled_to_dict = staticmethod(compile_fields(model, fields)) if fields else None
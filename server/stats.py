@@ -0,0 +1,193 @@
+import re
+import time
+from datetime import date
+from sqlalchemy import DDL, Column, Integer, String, bindparam, event, func, select, text
+from config import app, db
+from models import Task, File
+
+# Dashboard numbers computed in SQL: GET /stats returns tasks per status,
+# tasks per assigned user, overdue tasks per project and the file count and
+# total size per project and file type, instead of clients downloading every
+# task and file to count them. ?sections= picks some of them, and ?as_of=
+# (default today) is the day tasks are overdue against.
+#
+# With STATS_SOURCE=summary (the default) on SQLite the numbers come from
+# small summary tables that triggers on tasks and files keep up to date in
+# the same transaction as the write, so a dashboard load reads a few hundred
+# rows however large the tables get. Overdue depends on the day, so its
+# summary counts open tasks per project and due date, and the ones due
+# before as_of are added up when asked. Like the search indexes the triggers cover
+# ORM, bulk and seed.py writes alike; `flask rebuild-stats` creates the
+# tables and triggers in an older database and recounts everything.
+# STATS_SOURCE=live, and other databases, run the GROUP BY queries on tasks
+# and files themselves. So does a database whose triggers are missing, as
+# after `flask db upgrade` (migrations create the summary tables but not the
+# triggers), until `flask rebuild-stats` has run: the summaries would be
+# empty there, not just behind.
+#
+# A missing user or project is counted under 0 in the summary tables (it is
+# part of their primary key) and reported as null.
+
+DONE = 'Complete'
+
+task_status_counts = db.Table(
+    'task_status_counts', db.metadata,
+    Column('status', String, primary_key=True),
+    Column('tasks', Integer, nullable=False),
+)
+task_user_counts = db.Table(
+    'task_user_counts', db.metadata,
+    Column('user_id', Integer, primary_key=True, autoincrement=False),
+    Column('tasks', Integer, nullable=False),
+)
+task_due_counts = db.Table(
+    'task_due_counts', db.metadata,
+    Column('project_id', Integer, primary_key=True, autoincrement=False),
+    Column('due_date', Task.__table__.c.due_date.type, primary_key=True),
+    Column('open_tasks', Integer, nullable=False),
+)
+file_totals = db.Table(
+    'file_totals', db.metadata,
+    Column('project_id', Integer, primary_key=True, autoincrement=False),
+    Column('file_type', String, primary_key=True),
+    Column('files', Integer, nullable=False),
+    Column('total_size', Integer, nullable=False),
+)
+
+# Per summary table: the table it counts, then its key and measure columns
+# as SQL over one row of that table ({row} is new, old or the table name).
+SUMMARIES = {
+    task_status_counts: (Task, {'status': '{row}.status'}, {'tasks': '1'}),
+    task_user_counts: (Task, {'user_id': 'coalesce({row}.assigned_to_user_id, 0)'}, {'tasks': '1'}),
+    task_due_counts: (Task, {'project_id': 'coalesce({row}.project_id, 0)', 'due_date': '{row}.due_date'},
+                      {'open_tasks': f"{{row}}.status != '{DONE}'"}),
+    file_totals: (File, {'project_id': 'coalesce({row}.project_id, 0)', 'file_type': '{row}.file_type'},
+                  {'files': '1', 'total_size': '{row}.size'}),
+}
+
+def bump(summary, row, sign):
+    # Upsert adding (sign 1) or taking away (sign -1) one row's share.
+    model, keys, measures = SUMMARIES[summary]
+    columns = ', '.join([*keys, *measures])
+    values = ', '.join([template.format(row=row) for template in keys.values()] +
+                       [f'{sign} * ({template.format(row=row)})' for template in measures.values()])
+    updates = ', '.join(f'{measure} = {measure} + excluded.{measure}' for measure in measures)
+    return (f"INSERT INTO {summary.name}({columns}) VALUES ({values}) "
+            f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates};")
+
+def trigger_ddl(model):
+    # CREATE TRIGGER statements keeping every summary of one table current.
+    summaries = [summary for summary, (source, keys, measures) in SUMMARIES.items() if source is model]
+    watched = sorted({column for summary in summaries for template in [*SUMMARIES[summary][1].values(),
+                                                                      *SUMMARIES[summary][2].values()]
+                      for column in re.findall(r'\{row\}\.(\w+)', template)})
+    table_name = model.__tablename__
+    add = ' '.join(bump(summary, 'new', 1) for summary in summaries)
+    remove = ' '.join(bump(summary, 'old', -1) for summary in summaries)
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {table_name}_stats_insert AFTER INSERT ON {table_name} BEGIN {add} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table_name}_stats_delete AFTER DELETE ON {table_name} BEGIN {remove} END',
+        f"CREATE TRIGGER IF NOT EXISTS {table_name}_stats_update AFTER UPDATE OF {', '.join(watched)} "
+        f'ON {table_name} BEGIN {remove} {add} END',
+    ]
+
+for model in (Task, File):
+    for statement in trigger_ddl(model):
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+TRIGGERS = [f'{model.__tablename__}_stats_{operation}'
+            for model in (Task, File) for operation in ('insert', 'delete', 'update')]
+triggers_found = False      # once they exist they stay, so only a miss is looked up again
+
+def has_triggers():
+    global triggers_found
+    if not triggers_found:
+        found = db.session.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN :names")
+                                   .bindparams(bindparam('names', expanding=True)), {'names': TRIGGERS}).scalar()
+        triggers_found = found == len(TRIGGERS)
+    return triggers_found
+
+def uses_summaries():
+    return app.config['STATS_SOURCE'] == 'summary' and db.engine.dialect.name == 'sqlite' and has_triggers()
+
+def stats_sections(args):
+    if not args.get('sections'):
+        return list(SECTIONS)
+    sections = [name.strip() for name in args['sections'].split(',') if name.strip()]
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown stats {', '.join(unknown)}; choose from {', '.join(SECTIONS)}")
+    return sections
+
+def reported_id(id):
+    return id or None
+
+def tasks_by_status(as_of):
+    if uses_summaries():
+        query = select(task_status_counts.c.status, task_status_counts.c.tasks).where(task_status_counts.c.tasks > 0)
+    else:
+        query = select(Task.status, func.count(Task.id)).group_by(Task.status)
+    return {status: tasks for status, tasks in db.session.execute(query.order_by(text('1')))}
+
+def tasks_by_user(as_of):
+    if uses_summaries():
+        query = select(task_user_counts.c.user_id, task_user_counts.c.tasks).where(task_user_counts.c.tasks > 0)
+    else:
+        query = select(Task.assigned_to_user_id, func.count(Task.id)).group_by(Task.assigned_to_user_id)
+    return [{'user_id': reported_id(user_id), 'tasks': tasks}
+            for user_id, tasks in db.session.execute(query.order_by(text('1')))]
+
+def overdue_by_project(as_of):
+    if uses_summaries():
+        counts = task_due_counts.c
+        query = (select(counts.project_id, func.sum(counts.open_tasks)).where(counts.due_date < as_of)
+                 .group_by(counts.project_id).having(func.sum(counts.open_tasks) > 0))
+    else:
+        query = (select(Task.project_id, func.count(Task.id))
+                 .where(Task.due_date < as_of, Task.status != DONE).group_by(Task.project_id))
+    return [{'project_id': reported_id(project_id), 'overdue': overdue}
+            for project_id, overdue in db.session.execute(query.order_by(text('1')))]
+
+def file_size_by_project_type(as_of):
+    if uses_summaries():
+        totals = file_totals.c
+        query = select(totals.project_id, totals.file_type, totals.files, totals.total_size).where(totals.files > 0)
+    else:
+        query = (select(File.project_id, File.file_type, func.count(File.id), func.sum(File.size))
+                 .group_by(File.project_id, File.file_type))
+    return [{'project_id': reported_id(project_id), 'file_type': file_type, 'files': files, 'total_size': total_size}
+            for project_id, file_type, files, total_size in db.session.execute(query.order_by(text('1, 2')))]
+
+SECTIONS = {
+    'tasks_by_status': tasks_by_status,
+    'tasks_by_user': tasks_by_user,
+    'overdue_by_project': overdue_by_project,
+    'file_size_by_project_type': file_size_by_project_type,
+}
+
+def stats(args):
+    sections = stats_sections(args)
+    as_of = date.fromisoformat(args['as_of']) if args.get('as_of') else date.today()
+    return {name: SECTIONS[name](as_of) for name in sections}
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats():
+    # Creates any missing summary table or trigger and recounts every summary.
+    if db.engine.dialect.name != 'sqlite':
+        print('Summary tables are only kept on SQLite; /stats queries the tables directly')
+        return
+    started = time.perf_counter()
+    for summary in SUMMARIES:
+        summary.create(db.session.connection(), checkfirst=True)
+    for model in (Task, File):
+        for statement in trigger_ddl(model):
+            db.session.execute(text(statement))
+    for summary, (model, keys, measures) in SUMMARIES.items():
+        table_name = model.__tablename__
+        groups = ', '.join(template.format(row=table_name) for template in keys.values())
+        totals = ', '.join(f'sum({template.format(row=table_name)})' for template in measures.values())
+        db.session.execute(summary.delete())
+        db.session.execute(text(f"INSERT INTO {summary.name}({', '.join([*keys, *measures])}) "
+                                f'SELECT {groups}, {totals} FROM {table_name} GROUP BY {groups}'))
+    db.session.commit()
+    print(f'Rebuilt {len(SUMMARIES)} summary tables in {time.perf_counter() - started:.1f}s')
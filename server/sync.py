@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, insert, select, delete
+from sqlalchemy.orm import Session
+from config import app, db
+from models import User, Project, Task, File, Team, Calendar, Chat_Message, Change
+from serializer import row_serializer
+from validation import chunked
+
+# Incremental sync: GET /sync?since=<cursor> returns what changed after the
+# cursor instead of whole collections.
+#
+# Every insert, update and delete of a tracked model is written to the
+# changes table in the same transaction as the write itself. ORM writes are
+# picked up by the after_flush hook below (cascaded deletes included); code
+# that writes with Core statements (bulk.py, mark_read) calls record_changes.
+# Rows written straight to the database, like seed.py's, are not tracked, so
+# a client starts with GET /sync (no since) for the current cursor, loads
+# the collections as usual and syncs from that cursor afterwards. Replaying
+# a change the client already has is harmless. seed.py logs a reset entry
+# after wiping the tables, and a cursor from before it gets a 410, as does
+# one past the newest change (a database replaced under the client).
+#
+# The cursor is the change id. SQLite hands ids out under its write lock, so
+# they appear in commit order; on Postgres a transaction can commit after a
+# later id is visible, so keep transactions short there.
+
+TRACKED = {model.__tablename__: model for model in (User, Project, Task, File, Team, Calendar, Chat_Message)}
+UPSERT = 'upsert'
+DELETE = 'delete'
+RESET = 'reset'
+# (table_name, row_id) pairs written in the current transaction, for
+# after_commit listeners (cache.py).
+CHANGED_ROWS = 'changed_rows'
+
+def note_changed(session, rows):
+    session.info.setdefault(CHANGED_ROWS, set()).update((row['table_name'], row['row_id']) for row in rows)
+
+def record_changes(table_name, ids, operation):
+    rows = [{'table_name': table_name, 'row_id': id, 'operation': operation} for id in ids]
+    if rows:
+        db.session.execute(insert(Change.__table__), rows)
+        note_changed(db.session(), rows)
+
+@event.listens_for(Session, 'after_flush')
+def log_flushed_changes(session, flush_context):
+    rows = []
+    for operation, instances in ((UPSERT, session.new), (UPSERT, session.dirty), (DELETE, session.deleted)):
+        for instance in instances:
+            table_name = getattr(instance, '__tablename__', None)
+            if table_name not in TRACKED:
+                continue
+            if instances is session.dirty and not session.is_modified(instance, include_collections=False):
+                continue
+            rows.append({'table_name': table_name, 'row_id': instance.id, 'operation': operation})
+    if rows:
+        session.connection().execute(insert(Change.__table__), rows)
+        note_changed(session, rows)
+
+def current_cursor():
+    return db.session.query(func.max(Change.id)).scalar() or 0
+
+def changes_since(since, limit):
+    # Returns (changes by table, next cursor, has_more). Only the latest
+    # change per record counts: a record updated and then deleted in the
+    # window comes back as a tombstone only.
+    oldest, newest = db.session.query(func.min(Change.id), func.max(Change.id)).one()
+    if oldest is not None and since < oldest - 1:
+        raise LookupError('Changes before this cursor have been pruned; reload the collections and sync again')
+    if since > (newest or 0):
+        raise LookupError('This cursor is ahead of the change log; reload the collections and sync again')
+    entries = db.session.execute(
+        select(Change.id, Change.table_name, Change.row_id, Change.operation)
+        .where(Change.id > since).order_by(Change.id).limit(limit + 1)
+    ).all()
+    if any(entry.operation == RESET for entry in entries):
+        raise LookupError('The data was reloaded after this cursor; reload the collections and sync again')
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for id, table_name, row_id, operation in entries:
+        latest[(table_name, row_id)] = operation
+
+    changes = {}
+    for table_name, model in TRACKED.items():
+        upserted = [row_id for (name, row_id), operation in latest.items() if name == table_name and operation == UPSERT]
+        deleted = [row_id for (name, row_id), operation in latest.items() if name == table_name and operation == DELETE]
+        if not upserted and not deleted:
+            continue
+        fields = model._serialized_fields
+        serialize = row_serializer(model, fields)
+        records = []
+        for chunk in chunked(upserted):
+            # A record that is gone by now gets its tombstone on a later page.
+            records += [serialize(row) for row in db.session.execute(
+                select(*[getattr(model, field) for field in fields]).where(model.id.in_(chunk)).order_by(model.id))]
+        changes[table_name] = {'upserted': records, 'deleted': sorted(deleted)}
+    cursor = entries[-1].id if entries else since
+    return changes, cursor, has_more
+
+@app.cli.command('prune-changes')
+def prune_changes():
+    # Deletes sync changes older than SYNC_RETENTION_DAYS. Clients holding an
+    # older cursor get a 410 and reload. The newest change is always kept so
+    # the pruned range can still be detected.
+    cutoff = datetime.utcnow() - timedelta(days=app.config['SYNC_RETENTION_DAYS'])
+    newest = current_cursor()
+    result = db.session.execute(delete(Change).where(Change.changed_at < cutoff, Change.id < newest))
+    db.session.commit()
+    print(f'Pruned {result.rowcount} changes')
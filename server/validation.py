@@ -0,0 +1,128 @@
+from datetime import date, datetime
+from flask import g, has_request_context
+from config import db
+
+# SQLite builds before 3.32 cap a statement at 999 bound parameters.
+IN_CHUNK = 900
+
+def request_cache(name, factory):
+    # Per-request scratch space on flask.g, cleared before each request (its
+    # name goes in config.REQUEST_STATE); outside a request (seeding, scripts)
+    # every call gets a fresh, throwaway value.
+    return g.setdefault(name, factory()) if has_request_context() else factory()
+
+def chunked(values):
+    values = list(values)
+    for start in range(0, len(values), IN_CHUNK):
+        yield values[start:start + IN_CHUNK]
+
+###############################################################
+## Uniqueness
+###############################################################
+
+# One message per unique column, keyed by "table.column". The @validates hooks
+# and the IntegrityError fallback both read from here, so two requests racing
+# for the same name still get the same 422 message.
+UNIQUE_MESSAGES = {
+    'users.username': "User Username must be unique",
+    'projects.title': "Project Title must be unique",
+    'tasks.title': "Task Title must be unique",
+    'files.filename': "File Filename must be unique",
+    'teams.name': "Team Name must be unique",
+    'calendars.event_name': "Calendar Event Name must be unique",
+}
+
+def value_taken(instance, key, value):
+    # Single probe against the column's unique index instead of loading the table.
+    model = type(instance)
+    owners = request_cache('unique_owners', dict)
+    if (model.__tablename__, key, value) in owners:
+        owner = owners[(model.__tablename__, key, value)]
+        return owner is not None and owner != instance.id
+    column = getattr(model, key)
+    query = db.session.query(model.id).filter(column == value)
+    if instance.id is not None:
+        query = query.filter(model.id != instance.id)
+    with db.session.no_autoflush:
+        return query.first() is not None
+
+def ensure_unique(instance, key, value):
+    if value_taken(instance, key, value):
+        raise ValueError(UNIQUE_MESSAGES[f'{instance.__tablename__}.{key}'])
+
+def prime_unique(model, key, values):
+    # Looks a whole batch of values up at once so ensure_unique answers from
+    # the request cache. Free values are recorded with owner None.
+    owners = request_cache('unique_owners', dict)
+    column = getattr(model, key)
+    values = set(values)
+    for value in values:
+        owners[(model.__tablename__, key, value)] = None
+    for chunk in chunked(values):
+        for id, value in db.session.query(model.id, column).filter(column.in_(chunk)):
+            owners[(model.__tablename__, key, value)] = id
+
+def claim_unique(model, key, value, id):
+    # Marks a value as used by a row earlier in the same batch.
+    request_cache('unique_owners', dict)[(model.__tablename__, key, value)] = id
+
+def integrity_error_message(error):
+    # SQLite reports "UNIQUE constraint failed: tasks.title", other backends
+    # report the constraint name from the naming convention ("uq_tasks_title").
+    text = str(error.orig)
+    for column, message in UNIQUE_MESSAGES.items():
+        if column in text or f"uq_{column.replace('.', '_')}" in text:
+            return message
+    return str(error)
+
+###############################################################
+## Foreign keys
+###############################################################
+
+def ensure_exists(model, id, message):
+    # Primary key probe for the row a foreign key points at. Ids that already
+    # passed are remembered for the rest of the request, so a chat message
+    # sent to yourself or a bulk payload hitting the same project only asks once.
+    id = int(id)
+    checked = request_cache('checked_ids', set)
+    if (model.__tablename__, id) in checked:
+        return
+    if (model.__tablename__, id) in request_cache('missing_ids', set):
+        raise ValueError(message)
+    with db.session.no_autoflush:
+        found = db.session.query(model.id).filter(model.id == id).first()
+    if found is None:
+        raise ValueError(message)
+    checked.add((model.__tablename__, id))
+
+def prime_existing(model, ids):
+    # Batch version of the probe above: one IN query fills both the found and
+    # the missing side of the request cache.
+    checked = request_cache('checked_ids', set)
+    missing = request_cache('missing_ids', set)
+    ids = {int(id) for id in ids}
+    found = set()
+    for chunk in chunked(ids):
+        found.update(id for id, in db.session.query(model.id).filter(model.id.in_(chunk)))
+    checked.update((model.__tablename__, id) for id in found)
+    missing.update((model.__tablename__, id) for id in ids - found)
+    return found
+
+###############################################################
+## Dates
+###############################################################
+
+def ensure_date(value, message):
+    # Date columns take a date or an ISO "YYYY-MM-DD" string (a datetime, or
+    # an ISO timestamp, keeps just its day). The whole string has to parse,
+    # so "2024-01-02garbage" is rejected rather than cut down to its date.
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).date()
+        except ValueError:
+            pass
+    raise ValueError(message)